@@ -1,6 +1,7 @@
 import streamlit as st
 import datetime
 from primepredict import PrimePredict
+from models.trainingqueue import TrainingJobQueue
 import numpy as np
 import locale
 from data.dataloader import DataLoader
@@ -22,6 +23,71 @@ if "btn2_clicked" not in st.session_state:
 if "btn3_clicked" not in st.session_state:
     st.session_state.btn3_clicked = False
 
+
+@st.fragment(run_every=1)
+def training_progress(entity_name="", is_state=None):
+    """training_progress trains the model of an entity in the background TrainingJobQueue and shows the
+    progress of the training. Only this fragment runs again every second to poll the queue, and the
+    whole app runs again once the entity is ready so its forecast is shown.
+
+    Args:
+        entity_name (str, optional): state or category. Defaults to "".
+        is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+    """
+    if PrimePredict().is_ready(entity_name):
+        st.rerun()
+    name = entity_name if entity_name else "overall sales"
+    queue = TrainingJobQueue.shared(st.session_state.data_training)
+    job = queue.submit(entity_name, is_state)
+    if job.status() == "failed":
+        st.error(f"Training the model of {name} failed: {job.error}")
+        if not st.button("Retry training", key=f"retry:{entity_name}"):
+            return
+        job = queue.submit(entity_name, is_state, retry=True)
+    st.progress(
+        queue.progress(job),
+        text=f"Training the model of {name}: {job.status()}, {int(job.elapsed())} s",
+    )
+
+
+def forecast_section(start_date, end_date, entity_name="", is_state=None):
+    """forecast_section shows the forecast of an entity, or the progress of the training of its model
+    if it is not trained, see training_progress.
+
+    Args:
+        start_date (_type_): start date for the forecast
+        end_date (_type_): end date for the forecast
+        entity_name (str, optional): state or category. Defaults to "".
+        is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+    """
+    if not PrimePredict().is_ready(entity_name):
+        training_progress(entity_name, is_state)
+        return
+
+    prediction_df, previous_sales, years = PrimePredict().forcast(
+        start_date,
+        end_date,
+        st.session_state.data_training,
+        entity_name,
+        is_state=is_state,
+    )
+    if prediction_df is not None:
+        print(previous_sales)
+        prediction_df.set_index("dates", inplace=True)
+        col1, col2 = st.columns(2)
+        col1.write("Total Sales")
+        year_string = f"{'Year' if years==0 else 'Years'}"
+        col2.write(f"Last {years+1} {year_string} Sales")
+
+        col1, col2 = st.columns(2)
+        col1.subheader(
+            f"{locale.currency(int(np.sum(prediction_df['Sales Prediction - xbg'])), grouping=True)}"
+        )
+        col2.subheader(f"{locale.currency(int(np.sum(previous_sales)), grouping=True)}")
+
+        st.line_chart(prediction_df)
+
+
 # Set the title of the app
 st.title("Amazon Sales Forecast")
 
@@ -49,24 +115,7 @@ if st.button("Forecast Overall Sales"):
 
 # if forcast button is clicked, call the forcast function
 if st.session_state.btn1_clicked:
-    prediction_df, previous_sales, years = PrimePredict().forcast(
-        start_date, end_date, st.session_state.data_training
-    )
-    if prediction_df is not None:
-        print(previous_sales)
-        prediction_df.set_index("dates", inplace=True)
-        col1, col2 = st.columns(2)
-        col1.write("Total Sales")
-        year_string = f"{'Year' if years==0 else 'Years'}"
-        col2.write(f"Last {years+1} {year_string} Sales")
-
-        col1, col2 = st.columns(2)
-        col1.subheader(
-            f"{locale.currency(int(np.sum(prediction_df['Sales Prediction - xbg'])), grouping=True)}"
-        )
-        col2.subheader(f"{locale.currency(int(np.sum(previous_sales)), grouping=True)}")
-
-        st.line_chart(prediction_df)
+    forecast_section(start_date, end_date)
 
 
 st.header("Forcast by State")
@@ -83,28 +132,7 @@ if st.button("Forecast State Sales"):
 # if forcast by states button is clicked, call the forcast function
 if st.session_state.btn2_clicked:
     print(us_state_selected)
-    prediction_df, previous_sales, years = PrimePredict().forcast(
-        start_date,
-        end_date,
-        st.session_state.data_training,
-        us_state_selected,
-        is_state=True,
-    )
-    if prediction_df is not None:
-        print(previous_sales)
-        prediction_df.set_index("dates", inplace=True)
-        col1, col2 = st.columns(2)
-        col1.write("Total Sales")
-        year_string = f"{'Year' if years==0 else 'Years'}"
-        col2.write(f"Last {years+1} {year_string} Sales")
-
-        col1, col2 = st.columns(2)
-        col1.subheader(
-            f"{locale.currency(int(np.sum(prediction_df['Sales Prediction - xbg'])), grouping=True)}"
-        )
-        col2.subheader(f"{locale.currency(int(np.sum(previous_sales)), grouping=True)}")
-
-        st.line_chart(prediction_df)
+    forecast_section(start_date, end_date, us_state_selected, is_state=True)
 
 
 st.header("Forcast by Product Category")
@@ -119,25 +147,4 @@ if st.button("Forecast Category Sales"):
 # if forcast by category button is clicked, call the forcast function
 if st.session_state.btn3_clicked:
     print(category_selected)
-    prediction_df, previous_sales, years = PrimePredict().forcast(
-        start_date,
-        end_date,
-        st.session_state.data_training,
-        category_selected,
-        is_state=False,
-    )
-    if prediction_df is not None:
-        print(previous_sales)
-        prediction_df.set_index("dates", inplace=True)
-        col1, col2 = st.columns(2)
-        col1.write("Total Sales")
-        year_string = f"{'Year' if years==0 else 'Years'}"
-        col2.write(f"Last {years+1} {year_string} Sales")
-
-        col1, col2 = st.columns(2)
-        col1.subheader(
-            f"{locale.currency(int(np.sum(prediction_df['Sales Prediction - xbg'])), grouping=True)}"
-        )
-        col2.subheader(f"{locale.currency(int(np.sum(previous_sales)), grouping=True)}")
-
-        st.line_chart(prediction_df)
+    forecast_section(start_date, end_date, category_selected, is_state=False)
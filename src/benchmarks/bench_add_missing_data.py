@@ -0,0 +1,150 @@
+"""Benchmark of DataPreprocessor.add_missing_data on synthetic purchases.
+
+It compares the product code lookup against the previous implementation, which merged the
+replacement products into every purchase and filled the nulls through boolean masks.
+Each implementation runs in its own process, once to time it and once to trace the peak
+memory it allocates on top of the input data.
+Both outputs are checked to be identical.
+
+Run from src:
+    python benchmarks/bench_add_missing_data.py --rows 20000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from preproccessing.datapreprocessing import DataPreprocessor
+
+
+def synthetic_data(rows, n_products, seed=101):
+    """synthetic_data returns renamed purchases, products and categories with missing values."""
+    rng = np.random.default_rng(seed)
+    codes = np.array([f"B{i:09d}" for i in range(n_products)], dtype=object)
+    category_names = np.array([f"CATEGORY_{i}" for i in range(300)], dtype=object)
+    purchases = pd.DataFrame(
+        {
+            "Shipping Address State": rng.choice(
+                np.array(["CA", "NY", "TX", "FL", "WA"], dtype=object), rows
+            ),
+            "Category": category_names[rng.integers(0, 300, rows)],
+            "product_code": codes[rng.integers(0, int(n_products * 1.2), rows) % n_products],
+            "Title": codes[rng.integers(0, n_products, rows)],
+            "Purchase Price Per Unit": rng.uniform(1, 100, rows),
+            "Quantity": rng.integers(1, 4, rows).astype(float),
+        }
+    )
+    purchases.loc[rng.random(rows) < 0.05, "Category"] = np.nan
+    purchases.loc[rng.random(rows) < 0.05, "Title"] = np.nan
+    products = pd.DataFrame(
+        {
+            "product_code": codes,
+            "title": np.char.add("title ", codes.astype(str)).astype(object),
+            "category_id": rng.integers(1, 320, n_products),
+        }
+    )
+    categories = pd.DataFrame({"id": np.arange(1, 301), "category_name": category_names})
+    return purchases, products, categories
+
+
+def merge_add_missing_data(purchases, products, categories):
+    """merge_add_missing_data is the previous implementation of add_missing_data."""
+    products = pd.merge(
+        products, categories, how="inner", left_on="category_id", right_on="id"
+    ).drop("id", axis=1)
+    product_codes_category_null = purchases[purchases["Category"].isnull()][
+        "product_code"
+    ]
+    data_replacements = products[
+        products["product_code"].isin(product_codes_category_null.unique())
+    ][["product_code", "title", "category_name"]]
+    purchases = pd.merge(purchases, data_replacements, on="product_code", how="left")
+    purchases.loc[
+        (purchases["Category"].isnull()) & (purchases["category_name"].notnull()),
+        "Category",
+    ] = purchases.loc[
+        (purchases["Category"].isnull()) & (purchases["category_name"].notnull()),
+        "category_name",
+    ]
+    purchases.loc[
+        (purchases["Title"].isnull()) & (purchases["title"].notnull()), "Title"
+    ] = purchases.loc[
+        (purchases["Title"].isnull()) & (purchases["title"].notnull()), "title"
+    ]
+    purchases.drop(["title", "category_name"], axis=1, inplace=True)
+    return purchases
+
+
+def lookup_add_missing_data(purchases, products, categories):
+    """lookup_add_missing_data runs DataPreprocessor.add_missing_data."""
+    preprocessor = DataPreprocessor.__new__(DataPreprocessor)
+    preprocessor.purchases = purchases
+    preprocessor.products = products
+    preprocessor.categories = categories
+    preprocessor.product_lookup = None
+    preprocessor.add_missing_data()
+    return preprocessor.purchases
+
+
+IMPLEMENTATIONS = {"merge": merge_add_missing_data, "lookup": lookup_add_missing_data}
+
+
+def run(name, rows, n_products, trace, queue):
+    """run times one implementation, or traces the peak memory it allocates on top of the input data."""
+    purchases, products, categories = synthetic_data(rows, n_products)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    output = IMPLEMENTATIONS[name](purchases, products, categories)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+    checksum = (
+        pd.util.hash_pandas_object(output[["Category", "Title"]], index=False).sum()
+    )
+    queue.put((seconds, peak / 2**20, checksum))
+
+
+def run_in_process(name, rows, n_products, trace):
+    """run_in_process runs an implementation in a fresh process."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=run, args=(name, rows, n_products, trace, queue)
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000_000)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    purchases, products, categories = synthetic_data(10_000, 2_000)
+    pd.testing.assert_frame_equal(
+        merge_add_missing_data(purchases.copy(), products, categories),
+        lookup_add_missing_data(purchases.copy(), products, categories),
+    )
+
+    print(f"add_missing_data on {args.rows:,} purchases, {args.products:,} products")
+    checksums = set()
+    for name in IMPLEMENTATIONS:
+        seconds, _, checksum = run_in_process(name, args.rows, args.products, False)
+        _, peak_mb, _ = run_in_process(name, args.rows, args.products, True)
+        checksums.add(checksum)
+        print(f"{name:>8}: {seconds:8.2f} s  peak +{peak_mb:8.0f} MB")
+    print("identical output:", len(checksums) == 1)
+
+
+if __name__ == "__main__":
+    main()
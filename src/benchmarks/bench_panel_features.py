@@ -0,0 +1,103 @@
+"""Benchmark of the forecast features of a whole fleet of entities.
+
+It compares building the features of every entity with one FeatureEngineering per entity,
+as a whole fleet refresh did, against one PanelFeatureEngineering pass over all of them.
+Both are built from the same training history with S1, S2 and S3 columns, and the features
+of every entity are checked to be the same.
+
+Run from src:
+    python benchmarks/bench_panel_features.py --entities 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from features.featureengineering import FeatureEngineering
+from features.panelfeatureengineering import PanelFeatureEngineering
+
+
+def history(entities, seed=101):
+    """history returns training features of every entity from 2019 to 2022, indexed by entity and Order Date."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2019-01-01", "2022-12-31", name="Order Date")
+    index = pd.MultiIndex.from_product(
+        [[f"ENTITY_{i}" for i in range(entities)], dates], names=["Category", "Order Date"]
+    )
+    return pd.DataFrame(
+        rng.uniform(0, 100, (len(index), 5)),
+        index=index,
+        columns=["total_sales", "S1", "S2", "S3", "day"],
+    )
+
+
+def calendar():
+    """calendar returns the holidays and Amazon events of the forecast year."""
+    holidays_2021 = pd.DataFrame(
+        {"holiday": True}, index=pd.DatetimeIndex(["2023-01-16", "2023-07-04"])
+    )
+    events = pd.DataFrame(
+        {"Amazon Events": ["Prime Day", "Black Friday"]},
+        index=pd.DatetimeIndex(["2023-07-11", "2023-11-24"], name="Event Date"),
+    )
+    return holidays_2021, events
+
+
+def per_entity(sales, holidays_2021, events):
+    """per_entity builds the features with one FeatureEngineering per entity."""
+    return {
+        entity: FeatureEngineering(
+            sales.xs(entity, level=0),
+            holidays_2021,
+            events,
+            start="2023-01-01",
+            end="2023-12-31",
+            is_train=False,
+        ).output()
+        for entity in sales.index.get_level_values(0).unique()
+    }
+
+
+def panel(sales, holidays_2021, events):
+    """panel builds the features of every entity in one PanelFeatureEngineering pass."""
+    return PanelFeatureEngineering(
+        sales,
+        holidays_2021,
+        events,
+        start="2023-01-01",
+        end="2023-12-31",
+        is_train=False,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=500)
+    args = parser.parse_args()
+
+    sales = history(args.entities)
+    holidays_2021, events = calendar()
+    print(f"Forecast features of {args.entities:,} entities for 365 days")
+
+    start = time.perf_counter()
+    features = per_entity(sales, holidays_2021, events)
+    print(f"per entity: {time.perf_counter() - start:8.2f} s")
+
+    start = time.perf_counter()
+    features_panel = panel(sales, holidays_2021, events)
+    print(f"     panel: {time.perf_counter() - start:8.2f} s")
+
+    for entity, expected in features.items():
+        pd.testing.assert_frame_equal(
+            features_panel.entity(entity), expected, check_dtype=False, check_names=False
+        )
+    print("the features of every entity match")
+
+
+if __name__ == "__main__":
+    main()
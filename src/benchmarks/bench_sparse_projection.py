@@ -0,0 +1,136 @@
+"""Benchmark of the PCA features of a state forecast on a wide category pivot.
+
+It compares the sparse pivot and arpack PCA of SalesProjection against the previous
+implementation, which made a dense days x categories pivot, min max scaled it and ran PCA on it.
+Each implementation runs in its own process, once to time it and once to trace the peak
+memory it allocates on top of the daily sales.
+Both are checked against the S1, S2 and S3 of an exact full SVD PCA, up to their sign.
+At this width the auto solver of the previous implementation is randomised, so it is the
+sparse arpack result that matches the exact components.
+
+Run from src:
+    python benchmarks/bench_sparse_projection.py --categories 10000
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import MinMaxScaler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from features.projection import SalesProjection
+from features.sparsepivot import SparsePivot
+
+
+def daily_sales(days, categories, per_day, seed=101):
+    """daily_sales returns the total sales by day and category of a state, where a few
+    categories sell on most days and most categories sell rarely."""
+    rng = np.random.default_rng(seed)
+    rows = days * per_day
+    dates = pd.date_range("2018-01-01", periods=days, name="Order Date")
+    names = np.array([f"CATEGORY_{i}" for i in range(categories)], dtype=object)
+    sales = pd.DataFrame(
+        {
+            "Order Date": dates[rng.integers(0, days, rows)],
+            "Category": names[(rng.zipf(1.2, rows) - 1) % categories],
+            "total_sales": rng.uniform(1, 100, rows),
+        }
+    )
+    return sales.groupby(["Order Date", "Category"])["total_sales"].sum()
+
+
+def dense_pivot(sales):
+    """dense_pivot is the days x categories pivot of the previous implementation."""
+    return (
+        pd.pivot(
+            sales.reset_index(),
+            index="Order Date",
+            columns="Category",
+            values="total_sales",
+        )
+        .fillna(0)
+    )
+
+
+def dense_projection(sales):
+    """dense_projection is the previous implementation of the PCA features."""
+    scaled = MinMaxScaler().fit_transform(dense_pivot(sales))
+    return PCA(n_components=3, random_state=101).fit_transform(scaled)
+
+
+def exact_projection(sales):
+    """exact_projection is the PCA features computed with a full SVD."""
+    scaled = MinMaxScaler().fit_transform(dense_pivot(sales))
+    return PCA(n_components=3, svd_solver="full").fit_transform(scaled)
+
+
+def sparse_projection(sales):
+    """sparse_projection builds a SparsePivot and fits a SalesProjection on it."""
+    return SalesProjection().transform(SparsePivot.from_sales(sales)).to_numpy()
+
+
+IMPLEMENTATIONS = {"dense": dense_projection, "sparse": sparse_projection}
+
+
+def run(name, days, categories, per_day, trace, queue):
+    """run times one implementation, or traces the peak memory it allocates on top of the daily sales."""
+    sales = daily_sales(days, categories, per_day)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    output = IMPLEMENTATIONS[name](sales)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+    queue.put((seconds, peak / 2**20, np.abs(output)))
+
+
+def run_in_process(name, days, categories, per_day, trace):
+    """run_in_process runs an implementation in a fresh process."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=run, args=(name, days, categories, per_day, trace, queue)
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=1826)
+    parser.add_argument("--categories", type=int, default=10_000)
+    parser.add_argument("--per-day", type=int, default=400)
+    args = parser.parse_args()
+
+    sales = daily_sales(args.days, args.categories, args.per_day)
+    print(
+        f"PCA features of {args.days:,} days x {args.categories:,} categories, "
+        f"{len(sales):,} non zero days and categories "
+        f"({len(sales) / (args.days * args.categories):.1%})"
+    )
+    exact = np.abs(exact_projection(sales))
+    for name in IMPLEMENTATIONS:
+        seconds, _, output = run_in_process(
+            name, args.days, args.categories, args.per_day, False
+        )
+        _, peak_mb, _ = run_in_process(
+            name, args.days, args.categories, args.per_day, True
+        )
+        error = (np.abs(output - exact).max(axis=0) / exact.max(axis=0)).max()
+        print(
+            f"{name:>8}: {seconds:8.2f} s  peak +{peak_mb:8.0f} MB  "
+            f"max error vs full SVD {error:.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,277 +1,296 @@
+import hashlib
 import pandas as pd
 import os
-import kagglehub
+import pyarrow as pa
+import pyarrow.parquet as pq
 import subprocess
+import threading
+
+from data.eventcalendar import EventCalendar
+from utilis.utilities import compact_frame
 
 
 class DataLoader:
     """DataLoader is a class that loads and preprocesses data for sales forecasting.
-    It fetches data from Google Drive and Kaggle, and loads holiday data."""
+    It fetches data from Google Drive, and generates holiday and Amazon event data.
+    Every table is loaded lazily on first access and kept for the lifetime of the loader."""
+
+    # gdown keys and file names of the raw datasets
+    DATASETS = {
+        "purchases": ("1HdJj68eO9NTZlpwZcLYqdtPqrbKs1cxj", "amazon_purchases.csv"),
+        "products": ("1yoaKl-7wctxH315gH_M15fS5WERnFlHe", "amazon_products.csv"),
+        "categories": ("19167R4OV0GWNiCHTh3w9T07616S91enj", "product_categories.csv"),
+    }
+    # columns parsed as datetimes when a raw csv is loaded
+    DATE_COLUMNS = {"amazon_purchases.csv": ["Order Date"]}
+
+    # purchases columns stored as categoricals in compact mode
+    COMPACT_COLUMNS = [
+        "Shipping Address State",
+        "Category",
+        "ASIN/ISBN (Product Code)",
+        "Title",
+    ]
+    # years covered by the holiday and Amazon event calendar
+    CALENDAR_YEARS = (2004, pd.Timestamp.today().year + 10)
+    # tables only available to a training loader
+    TRAINING_TABLES = ("purchases", "products", "categories", "holidays")
+    TABLES = TRAINING_TABLES + ("amazon_events", "holidays_past_2021")
 
-    def __init__(self, is_training=True):
-        """__init__ initializes the DataLoader class and loads the datasets.
-        It fetches the purchases, products, categories, and holidays data from Google Drive and Kaggle.
+    def __init__(self, is_training=True, prefetch=(), compact=False):
+        """__init__ initializes the DataLoader class. Datasets are not loaded here, each one is
+        fetched, parsed and cached on first access, so a loader only pays for the tables it uses.
+        Use prefetch to load tables eagerly.
 
         Args:
-            is_training (bool, optional): if True, fetches training data. Defaults to True.
-            If False, fetches data for testing.
+            is_training (bool, optional): if True, the purchases, products, categories and
+            holidays data are available. Defaults to True. If False, they are None.
+            prefetch (tuple, optional): names of the tables to load right away. Defaults to ().
+            compact (bool, optional): store the purchases text columns as categoricals and downcast
+            its integral columns, see memory_reports for the footprint before and after. Defaults to False.
         """
 
-        self.purchases = None
-        self.products = None
-        self.categories = None
-        if is_training:
-            self.purchases = self.fetch_data(
-                "1HdJj68eO9NTZlpwZcLYqdtPqrbKs1cxj", "amazon_purchases.csv"
-            )
-            self.products = self.fetch_data(
-                "1yoaKl-7wctxH315gH_M15fS5WERnFlHe", "amazon_products.csv"
-            )
-            self.categories = self.fetch_data(
-                "19167R4OV0GWNiCHTh3w9T07616S91enj", "product_categories.csv"
-            )
-            self.holidays = self.load_holidays()
+        self.is_training = is_training
+        self.compact = compact
+        self.memory_reports = {}
+        self.loaded = {}
+        self.lock = threading.RLock()
+        if len(prefetch) > 0:
+            self.prefetch(*prefetch)
+
+    def load(self, name):
+        """load returns a table, fetching and parsing it on first access.
+
+        Args:
+            name (_type_): one of DataLoader.TABLES
+
+        Returns:
+            _type_: DataFrame: the table, or None for training tables of a non-training loader
+        """
+        if name not in self.TABLES:
+            raise ValueError(f"Unknown table: {name}")
+        if name in self.TRAINING_TABLES and not self.is_training:
+            return None
+        if name not in self.loaded:
+            with self.lock:
+                if name not in self.loaded:
+                    if name == "purchases" and self.compact:
+                        purchases, self.memory_reports[name] = compact_frame(
+                            self.fetch_data(*self.DATASETS[name]), self.COMPACT_COLUMNS
+                        )
+                        print(
+                            f"Purchases memory footprint (bytes):\n{self.memory_reports[name]}"
+                        )
+                        self.loaded[name] = purchases
+                    elif name in self.DATASETS:
+                        self.loaded[name] = self.fetch_data(*self.DATASETS[name])
+                    else:
+                        self.loaded[name] = getattr(self, f"load_{name}")()
+        return self.loaded[name]
+
+    def prefetch(self, *names):
+        """prefetch loads the given tables eagerly, or every available table if none are given.
+
+        Returns:
+            _type_: DataLoader: the loader itself
+        """
+        if len(names) == 0:
+            names = [
+                name
+                for name in self.TABLES
+                if self.is_training or name not in self.TRAINING_TABLES
+            ]
+        for name in names:
+            self.load(name)
+        return self
 
-        self.amazon_events = self.load_amazon_events()
-        self.holidays_past_2021 = self.load_holidays_past_2021()
+    def is_loaded(self, name):
+        """is_loaded checks if a table has already been materialised."""
+        return name in self.loaded
 
+    @property
     def purchases(self):
         """purchases returns the purchases data loaded from Google Drive."""
-        return self.purchases
+        return self.load("purchases")
 
+    @property
     def holidays(self):
-        """holidays returns the holidays data loaded from Kaggle."""
-        return self.holidays
+        """holidays returns the federal holidays up to 2021."""
+        return self.load("holidays")
 
+    @property
     def products(self):
         """products returns the products data loaded from Google Drive."""
-        return self.products
+        return self.load("products")
 
+    @property
     def categories(self):
         """categories returns the categories data loaded from Google Drive."""
-        return self.categories
+        return self.load("categories")
 
+    @property
     def amazon_events(self):
         """amazon_events returns the amazon events data loaded locally"""
-        return self.amazon_events
+        return self.load("amazon_events")
 
+    @property
     def holidays_past_2021(self):
         """holidays_past_2021 returns the holidays data for 2022 and beyond."""
-        return self.holidays_past_2021
+        return self.load("holidays_past_2021")
 
-    def download_dataset(self, key, dataset_name):
-        """download_dataset downloads the dataset from Google Drive using gdown.
+    def dataset_path(self, dataset_name):
+        """dataset_path returns the local path of a raw dataset.
 
         Args:
-            key (_type_): _gdown key for the dataset to be downloaded_
-            dataset_name (_type_): _name of the dataset to be downloaded_
+            dataset_name (_type_): _name of the dataset_
 
         Returns:
-            _type_: _path: _path to the downloaded dataset_
+            _type_: _path: _path to the raw dataset_
         """
         path = os.path.join(os.getcwd(), "data", "raw_datasets", dataset_name)
         if not "src" in path:
             path = os.path.join(
                 os.getcwd(), "src", "data", "raw_datasets", dataset_name
             )
+        return path
+
+    def download_dataset(self, key, dataset_name):
+        """download_dataset downloads the dataset from Google Drive using gdown.
+
+        Args:
+            key (_type_): _gdown key for the dataset to be downloaded_
+            dataset_name (_type_): _name of the dataset to be downloaded_
+
+        Returns:
+            _type_: _path: _path to the downloaded dataset_
+        """
+        path = self.dataset_path(dataset_name)
         if not os.path.exists(path):
             cmd = f"gdown --fuzzy {key} -O {path}"
             subprocess.run(cmd, shell=True, check=True)
         print(f"Loading>> {dataset_name} path: {path}")
         return path
 
-    def fetch_data(self, key, filename):
-        # Load the dataset from the given path
+    def cache_path(self, dataset_name):
+        """cache_path returns the path of the parquet cache of a raw dataset."""
+        return os.path.splitext(self.dataset_path(dataset_name))[0] + ".parquet"
+
+    def is_cached(self, dataset_name):
+        """is_cached checks if the parquet cache of a raw dataset exists and is not older than the csv."""
+        path = self.dataset_path(dataset_name)
+        cache_path = self.cache_path(dataset_name)
+        if not os.path.exists(cache_path):
+            return False
+        return not os.path.exists(path) or os.path.getmtime(
+            cache_path
+        ) >= os.path.getmtime(path)
+
+    def data_version(self):
+        """data_version returns a version of the raw purchases, products and categories, taken from
+        the size and modification time of their files, so that it is known without loading them.
+        The compact flag is part of the version, as it changes the values of the loaded purchases.
+
+        Returns:
+            _type_: str: the version, or None while a raw dataset has not been downloaded
+        """
+        stats = [str(self.compact)]
+        for _, filename in self.DATASETS.values():
+            path = self.dataset_path(filename)
+            if not os.path.exists(path):
+                path = self.cache_path(filename)
+            if not os.path.exists(path):
+                return None
+            stat = os.stat(path)
+            stats.append(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1("|".join(stats).encode()).hexdigest()[:16]
+
+    def fetch_data(self, key, filename, use_cache=True):
+        """fetch_data loads a raw dataset. On the first load the csv is parsed and written
+        to a typed parquet file next to it, later loads read the parquet file instead.
+        The cache is rebuilt whenever the csv is newer than it.
+
+        Args:
+            key (_type_): _gdown key for the dataset_
+            filename (_type_): _name of the csv file_
+            use_cache (bool, optional): read and write the parquet cache. Defaults to True.
+
+        Returns:
+            _type_: DataFrame: the loaded dataset
+        """
+        cache_path = self.cache_path(filename)
+        if use_cache and self.is_cached(filename):
+            print(f"Loading>> {filename} cache: {cache_path}")
+            return pd.read_parquet(cache_path)
+
         path = self.download_dataset(key, filename)
-        data = pd.read_csv(path)
+        data = pd.read_csv(
+            path, parse_dates=self.DATE_COLUMNS.get(filename, False), low_memory=False
+        )
+        if use_cache:
+            data = self.normalize_types(data)
+            try:
+                data.to_parquet(cache_path, index=False)
+            except (pa.ArrowException, ValueError) as e:
+                print(f"Error caching {filename}: {e}")
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
         return data
 
-    def load_holidays(self):
-        # Load the dataset from the given path
-        path = kagglehub.dataset_download("donnetew/us-holiday-dates-2004-2021")
-        data = pd.read_csv(os.path.join(path, "US Holiday Dates (2004-2021).csv"))
+    def stream_purchases(self, chunksize=500_000):
+        """stream_purchases yields the raw purchases in chunks of at most chunksize rows,
+        reading the parquet cache when it is present and the csv otherwise.
+
+        Args:
+            chunksize (int, optional): number of rows per chunk. Defaults to 500_000.
+
+        Yields:
+            _type_: DataFrame: a chunk of raw purchases
+        """
+        key, filename = self.DATASETS["purchases"]
+        if self.is_cached(filename):
+            parquet_file = pq.ParquetFile(self.cache_path(filename))
+            for batch in parquet_file.iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+            return
+        path = self.download_dataset(key, filename)
+        yield from pd.read_csv(
+            path,
+            parse_dates=self.DATE_COLUMNS.get(filename, False),
+            chunksize=chunksize,
+        )
+
+    def normalize_types(self, data):
+        """normalize_types stores text columns that mix numbers and strings as strings,
+        so that they can be written to parquet and read back with the same values.
+
+        Args:
+            data (_type_): dataset parsed from csv
+
+        Returns:
+            _type_: DataFrame: dataset with consistent column types
+        """
+        for column in data.columns[data.dtypes == object]:
+            if pd.api.types.infer_dtype(data[column], skipna=True) != "string":
+                values = data[column]
+                data[column] = values.where(values.isnull(), values.astype(str))
         return data
 
+    def calendar(self):
+        """calendar returns the holiday and Amazon event calendar covering CALENDAR_YEARS."""
+        return EventCalendar.cached(*self.CALENDAR_YEARS)
+
+    def load_holidays(self):
+        """load_holidays returns the federal holidays up to 2021, used for training."""
+        holidays = self.calendar().holiday_dates()
+        return holidays[holidays["Date"].dt.year <= 2021].reset_index(drop=True)
+
     def load_amazon_events(self):
-        # Load the dataset from the given path
-        amazon_events = self.add_events(
-            [["2024-03-20", "2024-03-25"], ["2025-03-25", "2025-03-31"]]
-        )
-        spring_sale_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["Big Spring Sale"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events = self.add_events(
-            [
-                ["2018-07-16", "2018-07-17"],
-                ["2019-07-15", "2019-07-16"],
-                ["2020-10-13", "2020-10-14"],
-                ["2021-06-21", "2021-06-22"],
-                ["2022-07-12", "2022-07-13"],
-                ["2023-07-11", "2023-07-12"],
-                ["2024-07-16", "2024-07-17"],
-                ["2025-07-23", "2025-07-24"],
-            ]
-        )
-        prime_day_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["Amazon Prime Day"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events = self.add_events(
-            [
-                ["2022-10-11", "2022-10-12"],  # Prime Early Access Sale
-                ["2023-10-10", "2023-10-11"],  # First official Prime Big Deal Days
-                ["2024-10-08", "2024-10-09"],
-                ["2025-10-14", "2025-10-15"],
-            ]
-        )
-        prime_big_deal_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["Prime Big Deal Days"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events = self.add_events(
-            [
-                ["2018-11-16", "2018-11-23"],
-                ["2019-11-22", "2019-11-29"],
-                ["2020-11-20", "2020-11-27"],
-                ["2021-11-19", "2021-11-26"],
-                ["2022-11-24", "2022-11-25"],
-                ["2023-11-17", "2023-11-24"],
-                ["2024-11-21", "2024-11-29"],
-                ["2025-11-28", "2025-12-01"],
-            ]
-        )
-        black_friday_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["Black Friday"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events = self.add_events(("2018-12-02", "2018-12-13"), is_repeat=True)
-        _12_day_of_deals_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["12 Days of Deals"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events = self.add_events(("2018-12-26", "2018-12-31"), is_repeat=True)
-        year_end_clearance_event_df = pd.DataFrame(
-            {
-                "Event Date": amazon_events,
-                "Amazon Events": ["Year-End Clearance Sale"] * len(amazon_events),
-            }
-        ).set_index("Event Date")
-
-        amazon_events_df = pd.concat(
-            [
-                spring_sale_event_df,
-                prime_day_event_df,
-                prime_big_deal_event_df,
-                black_friday_event_df,
-                _12_day_of_deals_event_df,
-                year_end_clearance_event_df,
-            ],
-            axis=0,
-        ).sort_index()
-
-        return amazon_events_df
+        """load_amazon_events returns the Amazon event days, indexed by Event Date."""
+        return self.calendar().amazon_events(start="2018-01-01")
 
     def load_holidays_past_2021(self):
-        """Load the dataset from the given path"""
-        _2022 = pd.Series(
-            [
-                "2022-12-26",
-                "2022-11-24",
-                "2022-11-11",
-                "2022-10-10",
-                "2022-09-05",
-                "2022-07-04",
-                "2022-06-20",
-                "2022-05-30",
-                "2022-02-21",
-                "2022-01-21",
-                "2023-01-02",
-                "2023-01-16",
-                "2023-02-20",
-            ]
-        )
-
-        _2022 = pd.to_datetime(_2022)
-        dates = pd.Series(
-            [
-                "January 02 2023",
-                "January 16 2023",
-                "February 20 2023",
-                "May 29 2023",
-                "June 19 2023",
-                "July 04 2023",
-                "September 04 2023",
-                "October 09 2023",
-                "November 10 2023",
-                "November 23 2023",
-                "December 25 2023",
-                "January 01 2024",
-                "January 15 2024",
-                "February 19 2024",
-                "May 27 2024",
-                "June 19 2024",
-                "July 04 2024",
-                "September 02 2024",
-                "October 14 2024",
-                "November 11 2024",
-                "November 28 2024",
-                "December 25 2024",
-                "January 01 2025",
-                "January 20 2025",
-                "January 20 2025",
-                "February 17 2025",
-                "May 26 2025",
-                "June 19 2025",
-                "July 04 2025",
-                "September 01 2025",
-                "October 13 2025",
-                "November 11 2025",
-                "November 27 2025",
-                "December 25 2025",
-                "January 01 2026",
-                "January 19 2026",
-                "February 16 2026",
-                "May 25 2026",
-                "June 19 2026",
-                "July 03 2026",
-                "September 07 2025",
-                "October 12 2026",
-                "November 11 2026",
-                "November 26 2026",
-                "December 25 2026",
-            ]
-        )
-        fedral_holidays_2023_plus = pd.to_datetime(dates)
-        fedral_holdidays_22_plus = pd.concat(
-            [_2022, fedral_holidays_2023_plus], axis=0
-        ).sort_values()
-        fedral_holdidays_22_plus = pd.Series(fedral_holdidays_22_plus.unique())
-        fedral_holdidays_22_plus.index = range(len(fedral_holdidays_22_plus))
-        fedral_holdidays_22_plus = pd.DataFrame(fedral_holdidays_22_plus).rename(
-            columns={0: "date"}
-        )
-        fedral_holdidays_22_plus["holiday"] = True
-        fedral_holdidays_22_plus["date"] = pd.to_datetime(
-            fedral_holdidays_22_plus["date"]
-        )
-        fedral_holdidays_22_plus = fedral_holdidays_22_plus.set_index("date")
-        return fedral_holdidays_22_plus
+        """load_holidays_past_2021 returns the federal holidays for 2022 and beyond."""
+        return self.calendar().holidays(start="2022-01-01")
 
     def add_events(self, events_timestamps, is_repeat=False):
         """add_events adds events to the dataframe."""
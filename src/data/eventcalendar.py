@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+
+class EventCalendar:
+    """EventCalendar generates US federal holidays and recurring Amazon events from rules,
+    for any range of years, in one vectorised pass over all the years. The result is a
+    compact day table with a boolean holiday column and a categorical Amazon Events column.
+    """
+
+    HOLIDAYS = [
+        "New Year's Day",
+        "Martin Luther King Jr. Day",
+        "Washington's Birthday",
+        "Memorial Day",
+        "Juneteenth",
+        "Independence Day",
+        "Labor Day",
+        "Columbus Day",
+        "Veterans Day",
+        "Thanksgiving Day",
+        "Christmas Day",
+    ]
+
+    # events in the order they are applied, a later event wins on overlapping days
+    EVENTS = [
+        "Big Spring Sale",
+        "Amazon Prime Day",
+        "Prime Big Deal Days",
+        "Black Friday",
+        "12 Days of Deals",
+        "Year-End Clearance Sale",
+    ]
+
+    # first year each event took place
+    FIRST_YEAR = {
+        "Big Spring Sale": 2024,
+        "Amazon Prime Day": 2015,
+        "Prime Big Deal Days": 2022,
+    }
+
+    # announced event windows, used instead of the rule for the years they cover
+    KNOWN_EVENTS = {
+        "Big Spring Sale": {
+            2024: ("03-20", "03-25"),
+            2025: ("03-25", "03-31"),
+        },
+        "Amazon Prime Day": {
+            2018: ("07-16", "07-17"),
+            2019: ("07-15", "07-16"),
+            2020: ("10-13", "10-14"),
+            2021: ("06-21", "06-22"),
+            2022: ("07-12", "07-13"),
+            2023: ("07-11", "07-12"),
+            2024: ("07-16", "07-17"),
+            2025: ("07-23", "07-24"),
+        },
+        "Black Friday": {
+            2018: ("11-16", "11-23"),
+            2019: ("11-22", "11-29"),
+            2020: ("11-20", "11-27"),
+            2021: ("11-19", "11-26"),
+            2022: ("11-24", "11-25"),
+            2023: ("11-17", "11-24"),
+            2024: ("11-21", "11-29"),
+            2025: ("11-28", "12-01"),
+        },
+    }
+
+    cache = {}
+
+    def __init__(self, start_year, end_year):
+        """__init__ builds the day table for every day from January 1st of start_year
+        to December 31st of end_year.
+
+        Args:
+            start_year (int): first year of the calendar
+            end_year (int): last year of the calendar
+        """
+        self.start_year = start_year
+        self.end_year = end_year
+        self.years = np.arange(start_year, end_year + 1)
+        self.first_day = np.datetime64(f"{start_year}-01-01", "D")
+        self.days = pd.date_range(f"{start_year}-01-01", f"{end_year}-12-31")
+        self.day_table = pd.DataFrame(
+            {
+                "holiday": self.build_holidays(),
+                "Amazon Events": self.build_events(),
+            },
+            index=pd.DatetimeIndex(self.days, name="date"),
+        )
+
+    @classmethod
+    def cached(cls, start_year, end_year):
+        """cached returns the calendar for the given years, building it only once per process.
+
+        Args:
+            start_year (int): first year of the calendar
+            end_year (int): last year of the calendar
+
+        Returns:
+            _type_: EventCalendar: the calendar
+        """
+        key = (start_year, end_year)
+        if key not in cls.cache:
+            cls.cache[key] = cls(start_year, end_year)
+        return cls.cache[key]
+
+    def month_start(self, month, day=1):
+        """month_start returns the given day of a month for every year of the calendar."""
+        return (
+            (self.years - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+            + (month - 1)
+        ).astype("datetime64[D]") + (day - 1)
+
+    def nth_weekday(self, month, weekday, n):
+        """nth_weekday returns the nth weekday (Monday=0) of a month for every year of the calendar.
+        A negative n counts from the end of the month.
+        """
+        if n > 0:
+            first = self.month_start(month)
+            return first + (weekday - self.weekday(first)) % 7 + 7 * (n - 1)
+        last = (
+            (self.years - 1970).astype("datetime64[Y]").astype("datetime64[M]") + month
+        ).astype("datetime64[D]") - 1
+        return last - (self.weekday(last) - weekday) % 7 + 7 * (n + 1)
+
+    def weekday(self, dates):
+        """weekday returns the day of the week (Monday=0) of datetime64[D] values."""
+        # 1970-01-01 was a Thursday
+        return (dates.astype(np.int64) + 3) % 7
+
+    def observed(self, dates):
+        """observed moves holidays falling on a Saturday to Friday and on a Sunday to Monday."""
+        weekday = self.weekday(dates)
+        return dates + np.where(weekday == 5, -1, np.where(weekday == 6, 1, 0))
+
+    def holiday_dates(self):
+        """holiday_dates returns the dates of every federal holiday of the calendar, both the
+        actual date and the observed day off.
+
+        Returns:
+            _type_: DataFrame: Date and Holiday columns
+        """
+        fixed = {
+            "New Year's Day": self.month_start(1, 1),
+            "Juneteenth": self.month_start(6, 19),
+            "Independence Day": self.month_start(7, 4),
+            "Veterans Day": self.month_start(11, 11),
+            "Christmas Day": self.month_start(12, 25),
+        }
+        floating = {
+            "Martin Luther King Jr. Day": self.nth_weekday(1, 0, 3),
+            "Washington's Birthday": self.nth_weekday(2, 0, 3),
+            "Memorial Day": self.nth_weekday(5, 0, -1),
+            "Labor Day": self.nth_weekday(9, 0, 1),
+            "Columbus Day": self.nth_weekday(10, 0, 2),
+            "Thanksgiving Day": self.nth_weekday(11, 3, 4),
+        }
+        dates = []
+        names = []
+        for name in self.HOLIDAYS:
+            if name in fixed:
+                actual = fixed[name]
+                days = np.concatenate([actual, self.observed(actual)])
+                years = np.concatenate([self.years, self.years])
+            else:
+                days = floating[name]
+                years = self.years
+            # Juneteenth is a federal holiday since 2021
+            if name == "Juneteenth":
+                days = days[years >= 2021]
+            dates.append(days)
+            names.extend([name] * len(days))
+        holidays = pd.DataFrame(
+            {"Date": pd.to_datetime(np.concatenate(dates)), "Holiday": names}
+        )
+        return holidays.drop_duplicates("Date").sort_values("Date", ignore_index=True)
+
+    def event_windows(self, event):
+        """event_windows returns the start and end day of an event for every year of the calendar.
+        Announced windows are used where known, otherwise the window follows the event's rule.
+
+        Args:
+            event (_type_): one of EventCalendar.EVENTS
+
+        Returns:
+            _type_: tuple: start and end arrays of datetime64[D]
+        """
+        if event == "Big Spring Sale":
+            # the week ending on the last Monday of March
+            end = self.nth_weekday(3, 0, -1)
+            start = end - 6
+        elif event == "Amazon Prime Day":
+            # the second Tuesday of July and the day after
+            start = self.nth_weekday(7, 1, 2)
+            end = start + 1
+        elif event == "Prime Big Deal Days":
+            # the second Tuesday of October and the day after
+            start = self.nth_weekday(10, 1, 2)
+            end = start + 1
+        elif event == "Black Friday":
+            # the week leading up to Black Friday
+            end = self.nth_weekday(11, 3, 4) + 1
+            start = end - 7
+        elif event == "12 Days of Deals":
+            start = self.month_start(12, 2)
+            end = self.month_start(12, 13)
+        else:
+            start = self.month_start(12, 26)
+            end = self.month_start(12, 31)
+
+        for year, (first, last) in self.KNOWN_EVENTS.get(event, {}).items():
+            if self.start_year <= year <= self.end_year:
+                start[year - self.start_year] = np.datetime64(f"{year}-{first}")
+                end[year - self.start_year] = np.datetime64(f"{year}-{last}")
+
+        active = self.years >= self.FIRST_YEAR.get(event, self.start_year)
+        return start[active], end[active]
+
+    def build_holidays(self):
+        """build_holidays returns a boolean array flagging the holidays of every calendar day."""
+        is_holiday = np.zeros(len(self.days), dtype=bool)
+        holidays = self.holiday_dates()["Date"].to_numpy().astype("datetime64[D]")
+        positions = (holidays - self.first_day).astype(np.int64)
+        # a New Year's Day on a Saturday is observed on the last day of the year before the calendar
+        positions = positions[(positions >= 0) & (positions < len(is_holiday))]
+        is_holiday[positions] = True
+        return is_holiday
+
+    def build_events(self):
+        """build_events returns a categorical array with the Amazon event of every calendar day."""
+        codes = np.full(len(self.days), -1, dtype=np.int8)
+        for code, event in enumerate(self.EVENTS):
+            start, end = self.event_windows(event)
+            lengths = (end - start).astype(np.int64) + 1
+            # expand every window into its days at once
+            offsets = np.arange(lengths.sum()) - np.repeat(
+                np.cumsum(lengths) - lengths, lengths
+            )
+            days = np.repeat(start, lengths) + offsets
+            positions = (days - self.first_day).astype(np.int64)
+            positions = positions[(positions >= 0) & (positions < len(codes))]
+            codes[positions] = code
+        return pd.Categorical.from_codes(codes, categories=self.EVENTS)
+
+    def holidays(self, start=None, end=None):
+        """holidays returns the holidays between start and end, in the layout of holidays_past_2021.
+
+        Returns:
+            _type_: DataFrame: date index and a holiday column set to True
+        """
+        days = self.day_table.loc[start:end]
+        return days.loc[days["holiday"], ["holiday"]]
+
+    def amazon_events(self, start=None, end=None):
+        """amazon_events returns the Amazon event days between start and end.
+
+        Returns:
+            _type_: DataFrame: Event Date index and an Amazon Events column
+        """
+        days = self.day_table.loc[start:end]
+        events = days.loc[days["Amazon Events"].notnull(), ["Amazon Events"]]
+        events["Amazon Events"] = events["Amazon Events"].astype(str)
+        return events.rename_axis("Event Date")
@@ -0,0 +1,286 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from features.sparsepivot import SparsePivot
+from utilis.utilities import TRAINING_CUTOFF
+
+
+class SalesCube:
+    """SalesCube holds the daily sales of every state and category in a coordinate layout: one
+    cell per state, category and day with sales, stored as a NumPy structured array with its index
+    metadata in a json file. It is built once per data version of the SalesStore, in time and space
+    proportional to the cells with sales, so wide category sets do not allocate a dense
+    state x category x day array. The cells are sorted by state and day, and a permutation sorts
+    them by category and day, so the cells of a state or of a category are contiguous runs. The
+    overall, per state and per category series and the pivots used for the PCA features are built
+    from these runs. The daily and daily by state totals are kept in small dense arrays.
+    Processes opening the same cube share it through the page cache.
+    """
+
+    META_FILE = "sales_cube.json"
+    # arrays of the cube: the cells, the permutation sorting them by category and day, and the
+    # daily and daily by state totals. Every build writes them to new files named in the metadata
+    ARRAYS = ["cells", "order", "daily", "states"]
+    LAYOUT = "cells"
+    # files of the dense layout
+    LEGACY_FILES = [
+        "sales_cube.npy",
+        "sales_cube_daily.npy",
+        "sales_cube_states.npy",
+        "sales_cube_categories.npy",
+    ]
+    CELL_DTYPE = np.dtype(
+        [("state", np.int32), ("category", np.int32), ("day", np.int32), ("sales", np.float64)]
+    )
+
+    # times the metadata is read again when a concurrent build removed the files it names
+    OPEN_ATTEMPTS = 3
+
+    def __init__(self, path, meta=None):
+        """__init__ opens a built cube read only. The arrays are memory mapped, so they stay readable
+        when a later build removes their files.
+
+        Args:
+            path (_type_): directory of the cube files
+            meta (_type_, optional): metadata of the cube, read from its json file if None. Defaults to None.
+        """
+        self.path = path
+        for attempt in range(self.OPEN_ATTEMPTS):
+            if meta is None:
+                with open(os.path.join(path, self.META_FILE)) as file:
+                    meta = json.load(file)
+            try:
+                arrays = {
+                    name: np.load(os.path.join(path, file_name), mmap_mode="r")
+                    for name, file_name in meta["files"].items()
+                }
+                break
+            except FileNotFoundError:
+                # a build replaced the cube between reading its metadata and its files
+                if attempt == self.OPEN_ATTEMPTS - 1:
+                    raise
+                meta = None
+        self.meta = meta
+        self.cells = arrays["cells"]
+        self.order = arrays["order"]
+        self.margins = {"daily": arrays["daily"], "states": arrays["states"]}
+        self.dates = pd.date_range(
+            self.meta["start"], periods=self.meta["days"], name="Order Date"
+        )
+        self.states = pd.Index(self.meta["states"], name="Shipping Address State")
+        self.categories = pd.Index(self.meta["categories"], name="Category")
+
+    @property
+    def version(self):
+        """version returns the data version the cube was built from."""
+        return self.meta["version"]
+
+    @classmethod
+    def build(cls, sales, path, version=None):
+        """build writes the cube of the given daily sales. The arrays are written to new files and the
+        metadata naming them replaces the previous one atomically, so a build interrupted at any point
+        leaves the previous cube whole. The files of the previous cube are removed afterwards.
+
+        Args:
+            sales (_type_): daily sales by state and category indexed by Order Date, e.g. SalesStore.read_sales().
+            path (_type_): directory to write the cube files to
+            version (_type_, optional): data version of the sales. Defaults to None.
+
+        Returns:
+            _type_: SalesCube: the built cube
+        """
+        start = sales.index.min().normalize()
+        days = (sales.index.max().normalize() - start).days + 1
+        state_codes, states = pd.factorize(
+            sales["Shipping Address State"].astype(str), sort=True
+        )
+        category_codes, categories = pd.factorize(
+            sales["Category"].astype(str), sort=True
+        )
+        day_codes = (sales.index.normalize() - start).days.to_numpy()
+
+        # sum the sales of every state, day and category, sorted by state, day and category
+        keys, inverse = np.unique(
+            (state_codes.astype(np.int64) * days + day_codes) * len(categories)
+            + category_codes,
+            return_inverse=True,
+        )
+        cells = np.empty(len(keys), dtype=cls.CELL_DTYPE)
+        cells["sales"] = np.bincount(
+            inverse, weights=sales["total_sales"].to_numpy(dtype=np.float64)
+        )
+        cells["category"] = keys % len(categories)
+        cells["day"] = keys // len(categories) % days
+        cells["state"] = keys // len(categories) // days
+        order = np.lexsort((cells["state"], cells["day"], cells["category"]))
+
+        margins = {
+            "daily": np.bincount(cells["day"], weights=cells["sales"], minlength=days),
+            "states": np.bincount(
+                cells["day"].astype(np.int64) * len(states) + cells["state"],
+                weights=cells["sales"],
+                minlength=days * len(states),
+            ).reshape(days, len(states)),
+        }
+        arrays = {"cells": cells, "order": order, **margins}
+        build_id = uuid.uuid4().hex[:12]
+        files = {name: f"sales_cube_{name}.{build_id}.npy" for name in cls.ARRAYS}
+        for name, file_name in files.items():
+            np.save(os.path.join(path, file_name), arrays[name])
+        meta = {
+            "version": version,
+            "layout": cls.LAYOUT,
+            "files": files,
+            "start": start.isoformat(),
+            "days": days,
+            "states": states.tolist(),
+            "categories": categories.tolist(),
+            "state_offsets": np.searchsorted(
+                cells["state"], np.arange(len(states) + 1)
+            ).tolist(),
+            "category_offsets": np.searchsorted(
+                cells["category"][order], np.arange(len(categories) + 1)
+            ).tolist(),
+        }
+        # mapped before the metadata is swapped in, a concurrent build may remove the files after
+        cube = cls(path, meta)
+        temp_path = os.path.join(path, f"{cls.META_FILE}.{build_id}.tmp")
+        with open(temp_path, "w") as file:
+            json.dump(meta, file)
+        meta_path = os.path.join(path, cls.META_FILE)
+        previous = []
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                previous = list(json.load(file).get("files", {}).values())
+        os.replace(temp_path, meta_path)
+        # only the files of the cube this one replaces, a concurrent build may be writing others
+        for file_name in previous + cls.LEGACY_FILES:
+            if file_name not in files.values() and os.path.exists(
+                os.path.join(path, file_name)
+            ):
+                os.remove(os.path.join(path, file_name))
+        return cube
+
+    @classmethod
+    def open(cls, store):
+        """open returns the cube of a SalesStore, building it when it is missing or older than the store.
+
+        Args:
+            store (_type_): SalesStore the cube is built from
+
+        Returns:
+            _type_: SalesCube: the cube
+        """
+        meta_path = os.path.join(store.path, cls.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                meta = json.load(file)
+            # cubes of the dense layout are built again
+            if meta["version"] == store.version and meta.get("layout") == cls.LAYOUT:
+                return cls(store.path)
+        print("Building sales cube...")
+        return cls.build(store.read_sales(cutoff=None), store.path, store.version)
+
+    def entity_cells(self, entity_name, is_state):
+        """entity_cells returns the cells of a state or of a category, sorted by day."""
+        if is_state:
+            position = self.states.get_loc(entity_name)
+            offsets = self.meta["state_offsets"]
+            return self.cells[offsets[position] : offsets[position + 1]]
+        position = self.categories.get_loc(entity_name)
+        offsets = self.meta["category_offsets"]
+        return self.cells[self.order[offsets[position] : offsets[position + 1]]]
+
+    def entity_slice(self, entity_name="", is_state=None):
+        """entity_slice returns the days x columns sales that the PCA features of an entity are built from:
+        by state for the overall sales and for a category, by category for a state.
+
+        Returns:
+            _type_: tuple: dense array of days x states for the overall sales, scipy CSR matrix of
+            days x columns for a state or a category, and the column names
+        """
+        if entity_name == "":
+            return self.margins["states"], self.states
+        cells = self.entity_cells(entity_name, is_state)
+        columns = self.categories if is_state else self.states
+        matrix = sparse.csr_matrix(
+            (
+                cells["sales"],
+                (cells["day"], cells["category"] if is_state else cells["state"]),
+            ),
+            shape=(len(self.dates), len(columns)),
+        )
+        return matrix, columns
+
+    def output(self, entity_name="", is_state=None, cutoff=TRAINING_CUTOFF):
+        """output returns the daily sales of an entity and the pivot of its sales by state or category,
+        restricted to the days with sales before the cutoff.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to '' for the overall sales.
+            is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+            cutoff (_type_, optional): sales from this day on are left out, None keeps them all, e.g.
+            SalesStore.training_cutoff. Defaults to TRAINING_CUTOFF.
+
+        Returns:
+            _type_: tuple: DataFrame with total_sales indexed by Order Date, and the pivot DataFrame,
+            or SparsePivot when there are more columns than SparsePivot.DENSE_COLUMNS
+        """
+        values, columns = self.entity_slice(entity_name, is_state)
+        if entity_name == "":
+            total_sales = np.asarray(self.margins["daily"])
+        elif is_state:
+            total_sales = self.margins["states"][:, self.states.get_loc(entity_name)]
+        else:
+            total_sales = np.asarray(values.sum(axis=1)).ravel()
+        days = total_sales != 0
+        if cutoff is not None:
+            days &= np.asarray(self.dates < pd.Timestamp(cutoff))
+        sales = pd.DataFrame(
+            {"total_sales": total_sales[days]}, index=self.dates[days]
+        )
+        if len(columns) > SparsePivot.DENSE_COLUMNS:
+            if sparse.issparse(values):
+                return sales, SparsePivot(values, self.dates, columns).rows(days)
+            return sales, SparsePivot.from_dense(values, self.dates, columns).rows(days)
+        pivot = values[days].toarray() if sparse.issparse(values) else np.asarray(values[days])
+        used = pivot.any(axis=0)
+        pivot = pd.DataFrame(pivot[:, used], index=sales.index, columns=columns[used])
+        return sales, pivot
+
+    def panel(self, is_state, cutoff=TRAINING_CUTOFF):
+        """panel returns the daily sales of every state or of every category, one row per entity and
+        day with sales, in the layout PanelFeatureEngineering reads.
+
+        Args:
+            is_state (_type_): whether the entities are the states or the categories
+            cutoff (_type_, optional): sales from this day on are left out, None keeps them all, e.g.
+            SalesStore.training_cutoff. Defaults to TRAINING_CUTOFF.
+
+        Returns:
+            _type_: DataFrame: entity and total_sales columns indexed by Order Date
+        """
+        names = self.states if is_state else self.categories
+        if is_state:
+            margins = np.asarray(self.margins["states"])
+            days, entities = np.nonzero(margins)
+            total_sales = margins[days, entities]
+        else:
+            # the cells sorted by category and day, summed over the states of each category and day
+            cells = self.cells[self.order]
+            keys = cells["category"].astype(np.int64) * len(self.dates) + cells["day"]
+            starts = np.flatnonzero(np.r_[True, np.diff(keys) != 0])
+            total_sales = np.add.reduceat(cells["sales"], starts)
+            entities, days = cells["category"][starts], cells["day"][starts]
+        kept = total_sales != 0
+        if cutoff is not None:
+            kept &= np.asarray(self.dates < pd.Timestamp(cutoff))[days]
+        return pd.DataFrame(
+            {names.name: names[entities[kept]], "total_sales": total_sales[kept]},
+            index=self.dates[days[kept]],
+        )
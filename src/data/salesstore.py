@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from utilis.utilities import TRAINING_CUTOFF, frequency_ranking, resolve_path
+
+
+class SalesStore:
+    """SalesStore keeps the preprocessed daily sales, grouped by order date, state and category,
+    in data/processed_datasets. Next to it, it keeps the ingestion state: the Order Date
+    watermark of the newest ingested purchase, a data version that changes with every write,
+    the states and categories ranked by purchase frequency at that version, the training cutoff
+    and the entities whose models are stale.
+    """
+
+    SALES_FILE = "daily_sales.parquet"
+    STATE_FILE = "ingestion_state.json"
+    GROUPS = ["Shipping Address State", "Category"]
+
+    def __init__(self, path=None):
+        """__init__ initializes the store and reads its ingestion state.
+
+        Args:
+            path (_type_, optional): directory of the store. Defaults to data/processed_datasets.
+        """
+        self.path = path if path is not None else resolve_path("data", "processed_datasets")
+        self.state = self.load_state()
+
+    def file_path(self, name):
+        """file_path returns the path of a file of the store."""
+        return os.path.join(self.path, name)
+
+    def load_state(self):
+        """load_state reads the ingestion state, or returns an empty one if there is none."""
+        state = {"watermark": None, "version": None, "frequencies": {}, "stale": {}}
+        if os.path.exists(self.file_path(self.STATE_FILE)):
+            with open(self.file_path(self.STATE_FILE)) as file:
+                state.update(json.load(file))
+        return state
+
+    def save_state(self):
+        """save_state writes the ingestion state."""
+        temp_path = self.file_path(self.STATE_FILE + ".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(self.state, file, indent=2)
+        os.replace(temp_path, self.file_path(self.STATE_FILE))
+
+    def exists(self):
+        """exists checks if the daily sales table has been built."""
+        return os.path.exists(self.file_path(self.SALES_FILE))
+
+    @property
+    def watermark(self):
+        """watermark returns the Order Date of the newest ingested purchase."""
+        if self.state["watermark"] is None:
+            return None
+        return pd.Timestamp(self.state["watermark"])
+
+    @property
+    def training_cutoff(self):
+        """training_cutoff returns the first day left out of the training data, TRAINING_CUTOFF until
+        purchases are ingested, then the day after the newest ingested purchase, see add_sales."""
+        return pd.Timestamp(self.state.get("training_cutoff") or TRAINING_CUTOFF)
+
+    @property
+    def version(self):
+        """version returns the data version, it changes every time the sales are written."""
+        return self.state["version"]
+
+    def frequencies(self, column):
+        """frequencies returns the states or the categories ordered by the number of days before
+        2023 they have sales on, as ranked when the sales were last written.
+
+        Args:
+            column (_type_): Shipping Address State or Category
+
+        Returns:
+            _type_: list: names ordered by frequency, descending
+        """
+        if column not in self.state["frequencies"]:
+            # stores written before the rankings were kept
+            sales = self.read_sales(cutoff=None).reset_index()
+            self.state["frequencies"] = {
+                group: frequency_ranking(sales["Order Date"], sales[group])
+                for group in self.GROUPS
+            }
+            self.save_state()
+        return self.state["frequencies"][column]
+
+    def read_sales(self, entity_name="", is_state=None, cutoff=TRAINING_CUTOFF):
+        """read_sales reads the daily sales in the layout of DataPreprocessor.output().
+
+        Args:
+            entity_name (str, optional): state or category to read. Defaults to '' for every entity.
+            is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+            cutoff (_type_, optional): sales from this day on are left out, None keeps them all. Defaults to TRAINING_CUTOFF.
+
+        Returns:
+            _type_: DataFrame: daily sales by state and category indexed by Order Date
+        """
+        filters = []
+        if not entity_name == "":
+            column = "Shipping Address State" if is_state else "Category"
+            filters.append((column, "==", entity_name))
+        if cutoff is not None:
+            filters.append(("Order Date", "<", pd.Timestamp(cutoff)))
+        sales = pd.read_parquet(
+            self.file_path(self.SALES_FILE), filters=filters if filters else None
+        )
+        return sales.set_index("Order Date")
+
+    def write_sales(self, sales, watermark):
+        """write_sales replaces the daily sales, moves the watermark and the data version
+        and ranks the states and categories by frequency.
+
+        Args:
+            sales (_type_): daily sales indexed by Order Date, e.g. StreamingPreprocessor.output().
+            watermark (_type_): Order Date of the newest purchase the sales include.
+        """
+        sales = (
+            sales.reset_index()
+            .sort_values(["Order Date"] + self.GROUPS)
+            .reset_index(drop=True)
+        )
+        temp_path = self.file_path(self.SALES_FILE + ".tmp")
+        sales.to_parquet(temp_path, index=False)
+        os.replace(temp_path, self.file_path(self.SALES_FILE))
+        watermark = pd.Timestamp(watermark).isoformat()
+        self.state["version"] = hashlib.sha1(
+            f"{self.version}|{watermark}|{len(sales)}|{sales['total_sales'].sum()}".encode()
+        ).hexdigest()[:16]
+        self.state["watermark"] = watermark
+        self.state["frequencies"] = {
+            column: frequency_ranking(sales["Order Date"], sales[column])
+            for column in self.GROUPS
+        }
+        self.save_state()
+
+    def add_sales(self, sales, watermark, replace_days=()):
+        """add_sales adds the daily sales of newly ingested purchases into the table. The stored sales of
+        the replaced days are dropped first, so a delta re-issuing a whole day replaces it instead of
+        being counted twice. The table is left as it is when the sales do not change it. The training
+        cutoff moves past the watermark, so the models are trained on the ingested days.
+
+        Args:
+            sales (_type_): daily sales of the new purchases indexed by Order Date.
+            watermark (_type_): Order Date of the newest purchase ingested so far.
+            replace_days (tuple, optional): days whose stored sales the new sales replace. Defaults to ().
+
+        Returns:
+            _type_: tuple: lists of the states and the categories the new sales touched, empty when
+            the table is unchanged
+        """
+        stored = self.read_sales(cutoff=None).astype(
+            {column: str for column in self.GROUPS}
+        )
+        replaced = stored.index.normalize().isin(pd.DatetimeIndex(replace_days).normalize())
+        touched = pd.concat([stored[replaced], sales])
+        table = pd.concat(
+            [stored[~replaced].reset_index(), sales.reset_index()],
+            ignore_index=True,
+        ).astype({column: str for column in self.GROUPS})
+        table = (
+            table.groupby(["Order Date"] + self.GROUPS)["total_sales"]
+            .sum()
+            .reset_index(level=self.GROUPS)
+        )
+        columns = ["Order Date"] + self.GROUPS + ["total_sales"]
+        if table.reset_index()[columns].equals(
+            stored.reset_index()[columns]
+            .sort_values(columns[:-1])
+            .reset_index(drop=True)
+        ):
+            return [], []
+        self.state["training_cutoff"] = max(
+            self.training_cutoff,
+            pd.Timestamp(watermark).normalize() + pd.Timedelta(days=1),
+        ).isoformat()
+        self.write_sales(table, watermark)
+        states = sorted(touched["Shipping Address State"].astype(str).unique())
+        categories = sorted(touched["Category"].astype(str).unique())
+        return states, categories
+
+    def mark_stale(self, states=(), categories=(), overall=True):
+        """mark_stale marks the models of the given entities as stale.
+
+        Args:
+            states (tuple, optional): states whose models are stale. Defaults to ().
+            categories (tuple, optional): categories whose models are stale. Defaults to ().
+            overall (bool, optional): whether the overall model is stale. Defaults to True.
+        """
+        if overall:
+            self.state["stale"][""] = "overall"
+        for state in states:
+            self.state["stale"][state] = "state"
+        for category in categories:
+            self.state["stale"][category] = "category"
+        self.save_state()
+
+    def is_stale(self, entity_name):
+        """is_stale checks if the model of an entity has to be retrained on newer data, '' is the overall model."""
+        return entity_name in self.state["stale"]
+
+    def clear_stale(self, entity_name):
+        """clear_stale marks the model of an entity as up to date."""
+        if self.is_stale(entity_name):
+            del self.state["stale"][entity_name]
+            self.save_state()
+
+    def stale_entities(self):
+        """stale_entities returns the entities whose models are stale.
+
+        Returns:
+            _type_: dict: entity name to 'overall', 'state' or 'category'
+        """
+        return dict(self.state["stale"])
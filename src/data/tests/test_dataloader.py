@@ -1,6 +1,10 @@
 import unittest
 import os
 import sys
+import tempfile
+from unittest import mock
+
+import pandas as pd
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from data.dataloader import DataLoader
@@ -15,8 +19,38 @@ class TestDataLoader(unittest.TestCase):
             [["2024-03-20", "2024-03-25"], ["2025-03-25", "2025-03-31"]]
         )
         self.assertEqual(len(event_dates), 13)
-        
-    
+
+    def test_lazy_loading(self):
+        loaded_data = DataLoader()
+        self.assertFalse(any(loaded_data.is_loaded(name) for name in DataLoader.TABLES))
+        self.assertIn("Amazon Events", loaded_data.amazon_events.columns)
+        self.assertTrue(loaded_data.is_loaded("amazon_events"))
+        self.assertFalse(loaded_data.is_loaded("purchases"))
+        self.assertIsNone(DataLoader(is_training=False).purchases)
+
+    def test_fetch_data_parquet_cache(self):
+        loaded_data = DataLoader(is_training=False)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, "amazon_purchases.csv")
+            pd.DataFrame(
+                {
+                    "Order Date": ["2018-01-01", "2018-01-02"],
+                    "Survey ResponseID": ["R1", 2],
+                    "Quantity": [1.0, 2.0],
+                }
+            ).to_csv(csv_path, index=False)
+            with mock.patch.object(
+                DataLoader, "dataset_path", return_value=csv_path
+            ):
+                first = loaded_data.fetch_data("key", "amazon_purchases.csv")
+                self.assertTrue(
+                    os.path.exists(os.path.join(tmp_dir, "amazon_purchases.parquet"))
+                )
+                os.remove(csv_path)
+                cached = loaded_data.fetch_data("key", "amazon_purchases.csv")
+        pd.testing.assert_frame_equal(first, cached)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(cached["Order Date"]))
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from data.eventcalendar import EventCalendar
+
+
+class TestEventCalendar(unittest.TestCase):
+    """TestEventCalendar is a test case for the EventCalendar class."""
+
+    def test_federal_holidays(self):
+        calendar = EventCalendar(2023, 2031)
+        holidays = calendar.holidays("2023-01-01", "2023-12-31").index
+        for date in ["2023-01-02", "2023-01-16", "2023-05-29", "2023-11-10", "2023-11-23"]:
+            self.assertIn(pd.Timestamp(date), holidays)
+        # Thanksgiving is the fourth Thursday of November
+        self.assertIn(pd.Timestamp("2031-11-27"), calendar.holidays().index)
+        self.assertEqual(calendar.day_table["holiday"].dtype, bool)
+
+    def test_observed_before_calendar(self):
+        # Jan 1 2022 is a Saturday, observed on Dec 31 2021 which is before the calendar
+        for start_year, end_year in [(2022, 2030), (2011, 2012)]:
+            calendar = EventCalendar(start_year, end_year)
+            self.assertFalse(calendar.day_table["holiday"].iloc[-1])
+            self.assertNotIn(pd.Timestamp(f"{end_year}-12-31"), calendar.holidays().index)
+        self.assertIn(
+            pd.Timestamp("2022-12-26"), EventCalendar(2022, 2030).holidays().index
+        )
+
+    def test_amazon_events(self):
+        calendar = EventCalendar(2018, 2030)
+        events = calendar.amazon_events()["Amazon Events"]
+        self.assertEqual(events["2020-10-13"], "Amazon Prime Day")
+        self.assertEqual(events["2024-03-25"], "Big Spring Sale")
+        self.assertEqual(len(events["2019-12-02":"2019-12-13"]), 12)
+        # Black Friday 2030 is on November 29th
+        self.assertEqual(
+            list(events["2030-11-22":"2030-11-29"].unique()), ["Black Friday"]
+        )
+        self.assertNotIn("Prime Big Deal Days", set(events[:"2021-12-31"]))
+        self.assertIs(EventCalendar.cached(2018, 2030), EventCalendar.cached(2018, 2030))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
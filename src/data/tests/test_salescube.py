@@ -0,0 +1,160 @@
+import unittest
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from data.salescube import SalesCube
+from features.sparsepivot import SparsePivot
+
+
+class TestSalesCube(unittest.TestCase):
+    """TestSalesCube checks that cube slices match grouping the daily sales with pandas."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        size = 400
+        self.sales = pd.DataFrame(
+            {
+                "Shipping Address State": rng.choice(["CA", "NY", "TX"], size),
+                "Category": rng.choice(["A", "B", "C", "D"], size),
+                "total_sales": rng.uniform(1, 100, size),
+            },
+            index=pd.DatetimeIndex(
+                rng.choice(pd.date_range("2021-06-01", "2023-02-01"), size),
+                name="Order Date",
+            ),
+        )
+
+    def test_entity_slices(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cube = SalesCube.build(self.sales, tmp_dir, version="v1")
+            sales = self.sales[self.sales.index.year < 2023]
+            for entity_name, is_state, pivot_by in [
+                ("", None, "Shipping Address State"),
+                ("CA", True, "Category"),
+                ("B", False, "Shipping Address State"),
+            ]:
+                entity_sales = sales
+                if is_state is not None:
+                    column = "Shipping Address State" if is_state else "Category"
+                    entity_sales = sales[sales[column] == entity_name]
+                expected = entity_sales.groupby(level=0)["total_sales"].sum()
+                expected_pivot = (
+                    entity_sales.groupby([entity_sales.index, pivot_by])["total_sales"]
+                    .sum()
+                    .unstack(fill_value=0)
+                )
+
+                daily_sales, pivot = cube.output(entity_name, is_state)
+
+                np.testing.assert_allclose(daily_sales["total_sales"], expected)
+                self.assertTrue(daily_sales.index.equals(expected.index))
+                np.testing.assert_allclose(pivot, expected_pivot)
+                self.assertEqual(list(pivot.columns), list(expected_pivot.columns))
+            self.assertEqual(SalesCube(tmp_dir).version, "v1")
+            daily_sales, _ = cube.output("CA", True, cutoff="2023-01-15")
+            ca_sales = self.sales[self.sales["Shipping Address State"] == "CA"]
+            self.assertTrue(
+                daily_sales.index.equals(
+                    ca_sales.index[ca_sales.index < "2023-01-15"].unique().sort_values()
+                )
+            )
+
+    def test_panel(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cube = SalesCube.build(self.sales, tmp_dir, version="v1")
+            sales = self.sales[self.sales.index.year < 2023]
+            for is_state, column in [(True, "Shipping Address State"), (False, "Category")]:
+                expected = sales.groupby([column, sales.index])["total_sales"].sum()
+                panel = cube.panel(is_state).groupby([column, "Order Date"])[
+                    "total_sales"
+                ].sum()
+                pd.testing.assert_series_equal(panel, expected)
+
+    def test_wide_categories(self):
+        rng = np.random.default_rng(15)
+        size = 2000
+        sales = pd.DataFrame(
+            {
+                "Shipping Address State": rng.choice(["CA", "NY", "TX"], size),
+                "Category": [f"C{code:04d}" for code in rng.integers(0, 900, size)],
+                "total_sales": rng.uniform(1, 100, size),
+            },
+            index=pd.DatetimeIndex(
+                rng.choice(pd.date_range("2020-01-01", "2022-12-31"), size),
+                name="Order Date",
+            ),
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cube = SalesCube.build(sales, tmp_dir)
+            # one cell per state, category and day with sales, not the dense cube
+            self.assertEqual(
+                len(cube.cells),
+                len(sales.groupby([sales.index, "Shipping Address State", "Category"])),
+            )
+            daily_sales, pivot = cube.output("CA", True)
+            self.assertIsInstance(pivot, SparsePivot)
+            ca_sales = sales[sales["Shipping Address State"] == "CA"]
+            expected_pivot = (
+                ca_sales.groupby([ca_sales.index, "Category"])["total_sales"]
+                .sum()
+                .unstack(fill_value=0)
+                .reindex(columns=cube.categories, fill_value=0)
+            )
+            np.testing.assert_allclose(pivot.matrix.toarray(), expected_pivot)
+            self.assertTrue(pivot.index.equals(daily_sales.index))
+
+    def test_interrupted_build(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SimpleNamespace(
+                path=tmp_dir, version="v1", read_sales=lambda cutoff: self.sales
+            )
+            expected = SalesCube.open(store).output("CA", True)[0]
+            changed = self.sales.assign(total_sales=self.sales["total_sales"] * 2)
+            with mock.patch("json.dump", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    SalesCube.build(changed, tmp_dir, version="v2")
+            # the cube of v1 is whole, its metadata names the files it was built with
+            cube = SalesCube.open(store)
+            self.assertEqual(cube.version, "v1")
+            pd.testing.assert_frame_equal(cube.output("CA", True)[0], expected)
+
+            # the files of v1 are removed once the cube of v2 replaces it
+            v1_files = list(cube.meta["files"].values())
+            cube = SalesCube.build(changed, tmp_dir, version="v2")
+            for file_name in v1_files:
+                self.assertFalse(os.path.exists(os.path.join(tmp_dir, file_name)))
+            for file_name in cube.meta["files"].values():
+                self.assertTrue(os.path.exists(os.path.join(tmp_dir, file_name)))
+
+    def test_concurrent_builds(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first = SalesCube.build(self.sales, tmp_dir, version="v1")
+            expected = first.output("CA", True)[0]
+            changed = self.sales.assign(total_sales=self.sales["total_sales"] * 2)
+            SalesCube.build(changed, tmp_dir, version="v2")
+            # the first cube is mapped, it is read whole after its files are removed
+            pd.testing.assert_frame_equal(first.output("CA", True)[0], expected)
+            # a reader of the metadata of the first cube opens the second one
+            self.assertEqual(SalesCube(tmp_dir, first.meta).version, "v2")
+
+    def test_dense_layout_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, SalesCube.META_FILE), "w") as file:
+                file.write('{"version": "v1"}')
+            np.save(os.path.join(tmp_dir, "sales_cube.npy"), np.zeros((3, 4, 5)))
+            store = SimpleNamespace(
+                path=tmp_dir, version="v1", read_sales=lambda cutoff: self.sales
+            )
+            self.assertEqual(SalesCube.open(store).meta["layout"], SalesCube.LAYOUT)
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "sales_cube.npy")))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
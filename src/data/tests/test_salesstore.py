@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from data.salesstore import SalesStore
+
+
+def daily_sales(dates, states, categories, total_sales):
+    """daily_sales returns daily sales in the layout of StreamingPreprocessor.output()."""
+    return pd.DataFrame(
+        {
+            "Shipping Address State": states,
+            "Category": categories,
+            "total_sales": total_sales,
+        },
+        index=pd.DatetimeIndex(pd.to_datetime(dates), name="Order Date"),
+    )
+
+
+class TestSalesStore(unittest.TestCase):
+    """TestSalesStore is a test case for the SalesStore class."""
+
+    def test_add_sales_and_stale_entities(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SalesStore(tmp_dir)
+            store.write_sales(
+                daily_sales(
+                    ["2022-12-30", "2022-12-31"], ["CA", "NY"], ["A", "B"], [10.0, 20.0]
+                ),
+                "2022-12-31",
+            )
+            version = store.version
+            self.assertEqual(store.training_cutoff, pd.Timestamp("2023-01-01"))
+            states, categories = store.add_sales(
+                daily_sales(
+                    ["2022-12-31", "2023-01-01"], ["CA", "CA"], ["A", "C"], [5.0, 7.0]
+                ),
+                "2023-01-01",
+            )
+            store.mark_stale(states, categories)
+
+            self.assertEqual(states, ["CA"])
+            self.assertEqual(categories, ["A", "C"])
+            self.assertNotEqual(store.version, version)
+            self.assertEqual(store.watermark, pd.Timestamp("2023-01-01"))
+            # the ingested days are trained on
+            self.assertEqual(store.training_cutoff, pd.Timestamp("2023-01-02"))
+            self.assertEqual(
+                list(store.read_sales("CA", True, cutoff=store.training_cutoff)["total_sales"]),
+                [10.0, 5.0, 7.0],
+            )
+
+            store = SalesStore(tmp_dir)
+            self.assertTrue(store.is_stale("CA"))
+            self.assertTrue(store.is_stale(""))
+            self.assertFalse(store.is_stale("NY"))
+            self.assertEqual(
+                list(store.read_sales("CA", is_state=True)["total_sales"]), [10.0, 5.0]
+            )
+            self.assertEqual(len(store.read_sales(cutoff=None)), 4)
+            self.assertEqual(store.frequencies("Shipping Address State"), ["CA", "NY"])
+            self.assertEqual(store.frequencies("Category"), ["A", "B"])
+            store.clear_stale("CA")
+            self.assertFalse(SalesStore(tmp_dir).is_stale("CA"))
+
+    def test_replace_days(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = SalesStore(tmp_dir)
+            store.write_sales(
+                daily_sales(
+                    ["2022-12-30", "2022-12-31"], ["CA", "NY"], ["A", "B"], [10.0, 20.0]
+                ),
+                "2022-12-31",
+            )
+            # the whole of 2022-12-31 again, with a late purchase of CA
+            late = daily_sales(
+                ["2022-12-31", "2022-12-31"], ["CA", "NY"], ["C", "B"], [4.0, 20.0]
+            )
+            states, categories = store.add_sales(
+                late, "2022-12-31", replace_days=["2022-12-31"]
+            )
+            self.assertEqual(states, ["CA", "NY"])
+            self.assertEqual(categories, ["B", "C"])
+            self.assertEqual(
+                list(store.read_sales("NY", is_state=True)["total_sales"]), [20.0]
+            )
+            self.assertEqual(
+                list(store.read_sales("CA", is_state=True)["total_sales"]), [10.0, 4.0]
+            )
+
+            version = store.version
+            self.assertEqual(
+                store.add_sales(late, "2022-12-31", replace_days=["2022-12-31"]),
+                ([], []),
+            )
+            self.assertEqual(store.version, version)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
@@ -0,0 +1,86 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+
+class CalendarFeatures:
+    """CalendarFeatures builds the calendar features of FeatureEngineering, such as day, month,
+    year, day_of_week and is_month_end, from the datetime64 values of the dates in one NumPy
+    pass, with compact dtypes. The features of a date range are memoised, so repeated forecasts
+    over the same window reuse them.
+    """
+
+    # columns in the order FeatureEngineering has always added them
+    COLUMNS = [
+        "day",
+        "month",
+        "year",
+        "is_weekend",
+        "day_of_week",
+        "day_of_year",
+        "quarter",
+        "is_month_start",
+        "is_month_end",
+        "is_year_start",
+        "is_year_end",
+    ]
+
+    @staticmethod
+    def build(dates):
+        """build returns the calendar features of the given dates.
+
+        Args:
+            dates (_type_): dates to build the features of
+
+        Returns:
+            _type_: DataFrame: calendar features indexed by Order Date
+        """
+        index = pd.DatetimeIndex(dates, name="Order Date")
+        days = index.to_numpy().astype("datetime64[D]")
+        months = days.astype("datetime64[M]")
+        years = days.astype("datetime64[Y]")
+        month = (months.astype(np.int64) % 12 + 1).astype(np.int8)
+        day = ((days - months).astype(np.int64) + 1).astype(np.int8)
+        day_of_year = ((days - years).astype(np.int64) + 1).astype(np.int16)
+        # 1970-01-01 was a Thursday, weekdays count from Monday = 0
+        day_of_week = ((days.astype(np.int64) + 3) % 7).astype(np.int8)
+        return pd.DataFrame(
+            {
+                "day": day,
+                "month": month,
+                "year": (years.astype(np.int64) + 1970).astype(np.int16),
+                # only Sundays, as the features the saved models were trained on
+                "is_weekend": day_of_week > 5,
+                "day_of_week": day_of_week,
+                "day_of_year": day_of_year,
+                "quarter": ((month - 1) // 3 + 1).astype(np.int8),
+                "is_month_start": day == 1,
+                "is_month_end": (days + 1).astype("datetime64[M]") != months,
+                "is_year_start": day_of_year == 1,
+                "is_year_end": (month == 12) & (day == 31),
+            },
+            index=index,
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def date_range_features(start, end):
+        """date_range_features returns the memoised calendar features of every day from start to end."""
+        return CalendarFeatures.build(pd.date_range(start, end))
+
+    @classmethod
+    def cached(cls, start, end):
+        """cached returns the calendar features of every day from start to end, building them only
+        once per date range.
+
+        Args:
+            start (_type_): first day
+            end (_type_): last day
+
+        Returns:
+            _type_: DataFrame: a copy of the calendar features indexed by Order Date
+        """
+        return cls.date_range_features(
+            pd.Timestamp(start).isoformat(), pd.Timestamp(end).isoformat()
+        ).copy()
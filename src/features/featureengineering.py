@@ -1,14 +1,30 @@
+import functools
+import os
+
 import pandas as pd
-import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.decomposition import PCA
+
+from features.calendarfeatures import CalendarFeatures
+from features.featureregistry import FeatureRegistry
+from features.featurestore import FeatureStore
+from features.lags import LagEngine
+from features.lagtable import LagTable
+from features.projection import SalesProjection
+from features.rolling import RollingSales
+from features.sparsepivot import SparsePivot
+from utilis.utilities import TRAINING_CUTOFF
 
 
 class FeatureEngineering:
     """FeatureEngineering is a class that handles the feature engineering process for sales forecasting.
     It generates time features, adds holidays, Amazon events, and previous sales data to the dataset.
+    Forecast features are built by the producers of FEATURES, only those of the features the models use.
     """
 
+    # years the sales and PCA lag features look back
+    LAG_YEARS = (1, 2, 3)
+    # producers of the forecast features
+    FEATURES = FeatureRegistry()
+
     def __init__(
         self,
         data,
@@ -19,36 +35,159 @@ class FeatureEngineering:
         start=None,
         end=None,
         is_train=True,
+        pivot=None,
+        projection=None,
+        feature_columns=None,
+        rolling=None,
+        cutoff=TRAINING_CUTOFF,
     ):
+        """__init__ builds the features of the given sales.
+
+        Args:
+            data (_type_): preprocessed sales indexed by Order Date. For forecasting, the LagTable of the
+            trained entity, or its training features.
+            holidays_2021 (_type_): holidays for 2022 and beyond
+            events (_type_): Amazon event days
+            holidays (_type_, optional): holidays up to 2021, used for training. Defaults to None.
+            state_forcast (_type_, optional): whether the sales are of a state. Defaults to None.
+            start (_type_, optional): start date of the forecast. Defaults to None.
+            end (_type_, optional): end date of the forecast. Defaults to None.
+            is_train (bool, optional): build training features, forecast features otherwise. Defaults to True.
+            pivot (_type_, optional): daily sales by state (or by category for a state) the PCA features
+            are built from, e.g. from SalesCube.output(). Computed from data if None. Defaults to None.
+            projection (_type_, optional): saved SalesProjection of the entity, updated with the new days
+            of the pivot. A new projection is fitted if None, see self.projection. Defaults to None.
+            feature_columns (_type_, optional): features of the forecast, e.g. SalesForecaster.feature_names(),
+            all the features of the LagTable if None. Defaults to None.
+            rolling (_type_, optional): saved RollingSales of the entity, advanced by the new days of the sales.
+            A new one is computed if None, see self.rolling. Defaults to None.
+            cutoff (_type_, optional): first day left out of the training features, e.g.
+            SalesStore.training_cutoff. Defaults to TRAINING_CUTOFF.
+        """
         self.data = data
+        self.pivot = pivot
+        self.projection = projection
+        self.rolling = rolling
         self.holidays = holidays
         self.holidays_2021 = holidays_2021
         self.events = events
         self.is_train = is_train
         self.state_forcast = state_forcast
+        self.cutoff = pd.Timestamp(cutoff)
         if is_train:
             self.df = data.groupby(data.index)["total_sales"].sum()
+            self.generate_time_features()
+            self.add_amazon_events()
+            self.add_holidays()
+            self.add_previous_sales()
         else:
-            self.df = pd.DataFrame(pd.date_range(start, end), columns=["Order Date"])
+            self.lag_table = data if isinstance(data, LagTable) else None
+            self.dates = pd.date_range(start, end, name="Order Date")
+            if feature_columns is None:
+                self.forcast_lag_table()
+                feature_columns = self.lag_table.feature_columns
+            self.feature_columns = list(feature_columns)
+            self.df = pd.DataFrame(index=self.dates)
+            self.feature_producers = self.FEATURES.build(self, self.feature_columns)
+            self.df = self.df.reindex(self.feature_columns, axis=1)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def code_version():
+        """code_version returns a hash of the source of the features package."""
+        return FeatureStore.code_version(os.path.dirname(os.path.abspath(__file__)))
+
+    @classmethod
+    def feature_key(
+        cls,
+        data_version,
+        entity_name,
+        holidays_2021,
+        events,
+        holidays=None,
+        state_forcast=None,
+        start=None,
+        end=None,
+        is_train=True,
+        feature_columns=None,
+        cutoff=TRAINING_CUTOFF,
+    ):
+        """feature_key returns the FeatureStore key of the features built with the given arguments.
 
-        self.generate_time_features()
-        self.add_amazon_events()
-        self.add_holidays()
-        self.add_previous_sales()
+        Args:
+            data_version (_type_): version of the sales data, for a forecast the key of the training features
+            entity_name (_type_): state or category, '' for the overall sales
 
-    def add_holidays(self):
-        """add_holidays adds holiday information to the dataset."""
-        if self.is_train:
-            self.holidays["Date"] = pd.to_datetime(self.holidays["Date"])
-            self.holidays["is_holiday"] = True
-            self.df = pd.merge(
-                self.df,
-                self.holidays[["Date", "is_holiday"]].set_index("Date"),
-                how="left",
-                left_index=True,
-                right_index=True,
-            )
+        Returns:
+            _type_: str: the key
+        """
+        return FeatureStore.key(
+            kind="train" if is_train else "forecast",
+            data=data_version,
+            entity=entity_name,
+            state_forcast=state_forcast,
+            start=None if start is None else pd.Timestamp(start).isoformat(),
+            end=None if end is None else pd.Timestamp(end).isoformat(),
+            calendar=FeatureStore.frame_version(holidays_2021, events, holidays),
+            code=cls.code_version(),
+            features=None if feature_columns is None else list(feature_columns),
+            cutoff=pd.Timestamp(cutoff).isoformat() if is_train else None,
+        )
+
+    @classmethod
+    def cached(
+        cls, feature_store, data_version, entity_name, data, holidays_2021, events, **kwargs
+    ):
+        """cached returns the features stored for the arguments, building and storing them if there are none.
 
+        Args:
+            feature_store (_type_): FeatureStore to read and write the features
+            data_version (_type_): version of the sales data, for a forecast the key of the training features
+            entity_name (_type_): state or category, '' for the overall sales
+            data, holidays_2021, events, kwargs: arguments of FeatureEngineering
+
+        Returns:
+            _type_: tuple: DataFrame of the features and its key
+        """
+        key = cls.feature_key(
+            data_version,
+            entity_name,
+            holidays_2021,
+            events,
+            **{
+                name: value
+                for name, value in kwargs.items()
+                if name
+                in (
+                    "holidays",
+                    "state_forcast",
+                    "start",
+                    "end",
+                    "is_train",
+                    "feature_columns",
+                    "cutoff",
+                )
+            },
+        )
+        features = feature_store.get(key)
+        if features is None:
+            features = cls(data, holidays_2021, events, **kwargs).output()
+            feature_store.put(key, features)
+        return features, key
+
+    def add_holidays(self):
+        """add_holidays adds holiday information to the dataset.
+        The holidays are read from a copy, the frame of the DataLoader is hashed into the feature keys."""
+        holidays = self.holidays.assign(
+            Date=pd.to_datetime(self.holidays["Date"]), is_holiday=True
+        )
+        self.df = pd.merge(
+            self.df,
+            holidays[["Date", "is_holiday"]].set_index("Date"),
+            how="left",
+            left_index=True,
+            right_index=True,
+        )
         self.df = pd.merge(
             self.df,
             self.holidays_2021,
@@ -56,104 +195,52 @@ class FeatureEngineering:
             left_index=True,
             right_index=True,
         )
-        if self.is_train:
-            self.df["fedral_holiday"] = self.df["is_holiday"].fillna(False) + self.df[
-                "holiday"
-            ].fillna(False)
+        self.df["fedral_holiday"] = self.df["is_holiday"].fillna(False) + self.df[
+            "holiday"
+        ].fillna(False)
 
-            self.df = self.df.drop(["is_holiday", "holiday"], axis=1)
-        else:
-            self.df.rename(columns={"holiday": "fedral_holiday"}, inplace=True)
-            self.df["fedral_holiday"] = self.df["fedral_holiday"].fillna(False)
+        self.df = self.df.drop(["is_holiday", "holiday"], axis=1)
 
     def get_feature_columns(self):
         """get_feature_columns returns the list of feature columns in the dataset."""
-        salesdf_columns = list(self.df.columns)
-        if not self.is_train:
-            salesdf_columns = list(self.data.columns)
-            [
-                salesdf_columns.remove(column)
-                for column in ["total_sales", "S1", "S2", "S3"]
-            ]
-        return sorted(salesdf_columns)
+        return sorted(self.df.columns)
 
     def add_previous_sales(self):
         """_summary__ adds previous sales data to the dataset.
         It creates lag features for the sales data based on the previous years.
         It also adds PCA features for the sales data based on the previous years.
-        It uses the assign_historic_sales method to create lag features for the
-        sales data.
-        It uses the processed dataset to create PCA features for the sales data
-        incase of forecasting.
+        The lags are the values on the same calendar day 1, 2 and 3 years earlier, see LagEngine.
         """
 
-        if self.is_train:
-            self.df["Sales 1YA"] = self.assign_historic_sales(self.df, year_till=2021)
-            self.df["Sales 2YA"] = self.assign_historic_sales(self.df, year_till=2020)
-            self.df["Sales 3YA"] = self.assign_historic_sales(self.df, year_till=2019)
-            self.add_lags_pca()
-        else:
-            combined_df = self.data.copy()
-            self.df["forcasting"] = True
-            combined_df["forcasting"] = False
-
-            combined_df = pd.concat([combined_df, self.df], axis=0)
-
-            combined_df["Sales 1YA"] = self.assign_historic_sales(
-                combined_df, year_till=2022
-            )
-            combined_df["Sales 2YA"] = self.assign_historic_sales(
-                combined_df, year_till=2021
-            )
-            combined_df["Sales 3YA"] = self.assign_historic_sales(
-                combined_df, year_till=2020
-            )
-
-            combined_df[["S1 1YA", "S2 1YA", "S3 1YA"]] = combined_df[
-                ["S1", "S2", "S3"]
-            ].shift(self.get_shift_value(2022, is_forcast=True))
-            combined_df[["S1 2YA", "S2 2YA", "S3 2YA"]] = combined_df[
-                ["S1", "S2", "S3"]
-            ].shift(self.get_shift_value(2021, is_forcast=True))
-            combined_df[["S1 3YA", "S2 3YA", "S3 3YA"]] = combined_df[
-                ["S1", "S2", "S3"]
-            ].shift(self.get_shift_value(2020, is_forcast=True))
-
-            self.df[
-                [
-                    "Sales 1YA",
-                    "Sales 2YA",
-                    "Sales 3YA",
-                    "S1 1YA",
-                    "S2 1YA",
-                    "S3 1YA",
-                    "S1 2YA",
-                    "S2 2YA",
-                    "S3 2YA",
-                    "S1 3YA",
-                    "S2 3YA",
-                    "S3 3YA",
-                ]
-            ] = combined_df[combined_df["forcasting"] == True][
-                [
-                    "Sales 1YA",
-                    "Sales 2YA",
-                    "Sales 3YA",
-                    "S1 1YA",
-                    "S2 1YA",
-                    "S3 1YA",
-                    "S1 2YA",
-                    "S2 2YA",
-                    "S3 2YA",
-                    "S1 3YA",
-                    "S2 3YA",
-                    "S3 3YA",
-                ]
-            ]
-
-            self.df = self.df.drop("forcasting", axis=1)
+        self.df = pd.concat(
+            [
+                self.df,
+                LagEngine(self.df, ["total_sales"]).lags(self.df.index, self.LAG_YEARS),
+            ],
+            axis=1,
+        )
+        self.add_lags_pca()
+        self.add_rolling_sales()
         self.df = self.df.reindex(self.get_feature_columns(), axis=1)
 
+    def add_rolling_sales(self):
+        """add_rolling_sales adds the 7, 28 and 91 day means and sums, and the exponentially weighted
+        means, of the sales one year earlier, see RollingSales. Features known on the day they are
+        forecast have to be a year old, as the Sales 1YA lag.
+        """
+        if self.rolling is None:
+            self.rolling = RollingSales()
+        self.rolling.update(self.df["total_sales"])
+        self.df = pd.concat(
+            [
+                self.df,
+                LagEngine(self.rolling.features, RollingSales.COLUMNS).lags(
+                    self.df.index, (1,)
+                ),
+            ],
+            axis=1,
+        )
+
     def add_amazon_events(self):
         self.df = pd.merge(
             self.df, self.events, left_index=True, right_index=True, how="left"
@@ -161,133 +248,112 @@ class FeatureEngineering:
         self.df["Amazon Events"] = self.df["Amazon Events"].fillna("No Events")
         self.df = pd.get_dummies(self.df, drop_first=True)
 
-    def assign_historic_sales(self, df, year_till=2022):
-        """assign_historic_sales assigns historic sales data to the dataset.
-
-        Args:
-            df (_type_): dataframe to assign historic sales data to.
-            year_till (int, optional): compute lags till this year. Defaults to 2022.
-            it computes the sales till the specified year and shifts its down so that the
-            upper data is NaN, procviding context to the model that there was no previous
-            sales for that specific date.
-
-        Returns:
-            _type_: _description_
-        """
-        df = df.reset_index()
-        sales = df[["Order Date", "total_sales"]]
-        sales = sales.set_index("Order Date")
-        past_sales = list(sales[sales.index.year <= year_till]["total_sales"])
-        lag = [np.nan] * (len(sales) - len(past_sales))
-        lag.extend(past_sales)
-        lag = pd.Series(lag, index=sales.index)
-        df = df.set_index("Order Date")
-        return lag
-
     def generate_time_features(self):
         """generate_time_features generates time features for the dataset.
         It creates features such as day, month, year, is_weekend, day_of_week, day_of_year,etc;
+        The features are built in one pass by CalendarFeatures. Days from the cutoff on are left out.
         """
-        
-        df = self.df.reset_index()
-        df.loc[:, "day"] = df["Order Date"].dt.day
-        df.loc[:, "month"] = df["Order Date"].dt.month
-        df.loc[:, "year"] = df["Order Date"].dt.year
-        df.loc[:, "is_weekend"] = df["Order Date"].dt.weekday > 5
-        df.loc[:, "day_of_week"] = df["Order Date"].dt.day_of_week
-        df.loc[:, "day_of_year"] = df["Order Date"].dt.day_of_year
-        df.loc[:, "quarter"] = df["Order Date"].dt.quarter
-        df.loc[:, "is_month_start"] = df["Order Date"].dt.is_month_start
-        df.loc[:, "is_month_end"] = df["Order Date"].dt.is_month_end
-        df.loc[:, "is_year_start"] = df["Order Date"].dt.is_year_start
-        df.loc[:, "is_year_end"] = df["Order Date"].dt.is_year_end
-        df = df.set_index("Order Date")
-        if self.is_train:
-            self.df = df[df["year"] < 2023]
-        else:
-            self.df = df
 
-    def get_shift_value(self, year, is_forcast=False):
+        features = CalendarFeatures.build(self.df.index)
+        df = pd.concat([self.df.to_frame(), features], axis=1)
+        self.df = df[df.index < self.cutoff]
+
+    @FEATURES.register("calendar", CalendarFeatures.COLUMNS)
+    def forcast_time_features(self):
+        """forcast_time_features returns the calendar features of the forecast, memoised per forecast window."""
+        return CalendarFeatures.cached(self.dates[0], self.dates[-1])
+
+    @FEATURES.register("amazon_events", ["Amazon Events_*"])
+    def forcast_amazon_events(self):
+        """forcast_amazon_events returns the Amazon event dummies of the forecast."""
+        events = pd.merge(
+            pd.DataFrame(index=self.dates),
+            self.events,
+            left_index=True,
+            right_index=True,
+            how="left",
+        )
+        events["Amazon Events"] = events["Amazon Events"].fillna("No Events")
+        return pd.get_dummies(events, drop_first=True)
+
+    @FEATURES.register("holidays", ["fedral_holiday"])
+    def forcast_holidays(self):
+        """forcast_holidays returns the federal holidays of the forecast."""
+        holidays = pd.merge(
+            pd.DataFrame(index=self.dates),
+            self.holidays_2021,
+            how="left",
+            left_index=True,
+            right_index=True,
+        ).rename(columns={"holiday": "fedral_holiday"})
+        holidays["fedral_holiday"] = holidays["fedral_holiday"].fillna(False)
+        return holidays
+
+    @FEATURES.register("lag_table", [])
+    def forcast_lag_table(self):
+        """forcast_lag_table lays out the history of the entity in its LagTable, read by the lag and
+        rolling producers. It is built from the training features only when those producers run,
+        and builds no columns itself."""
+        if self.lag_table is None:
+            self.lag_table = LagTable.from_features(self.data)
+        return pd.DataFrame(index=self.dates)
+
+    @FEATURES.register(
+        "lags", ["Sales [0-9]YA", "S[0-9] [0-9]YA"], depends_on=("lag_table",)
+    )
+    def forcast_previous_sales(self):
+        """forcast_previous_sales returns the sales and PCA lags of the forecast, looked up in the LagTable
+        of the entity at the offsets of their dates, looking back from the last year of its history."""
+        return self.lag_table.lags(
+            self.dates,
+            self.LAG_YEARS,
+            anchored=True,
+            columns=[
+                column
+                for column in LagTable.TARGETS
+                if column in self.lag_table.columns
+            ],
+        )
 
-        if not is_forcast:
-            return (
-                self.df[self.df.index.year < 2023].index[-1]
-                - self.df[self.df.index.year <= year].index[-1]
-            ).days - 10
-        else:
-            return (
-                self.df.index[-1] - self.data[self.data.index.year <= year].index[-1]
-            ).days - 10
+    @FEATURES.register(
+        "rolling",
+        ["Sales Mean *D 1YA", "Sales Sum *D 1YA", "Sales EWM *D 1YA"],
+        depends_on=("lag_table",),
+    )
+    def forcast_rolling_sales(self):
+        """forcast_rolling_sales returns the rolling sales features of the forecast, a year old, from the LagTable."""
+        return self.lag_table.lags(
+            self.dates, (1,), anchored=True, columns=RollingSales.COLUMNS
+        )
 
     def add_lags_pca(self):
         """add_lags_pca adds PCA features to the dataset.
         It uses the PCA algorithm to reduce the dimensionality of the sales data and creates lag features for the PCA components.
         For state forecasting, it uses the Product Category columns to create features.
         For category and overall sales forecasting, it uses the Shipping Address State columns to create features.
+        Pivots wider than SparsePivot.DENSE_COLUMNS are built and reduced as sparse matrices.
         """
 
-        temp_df = self.data[
-            ["Shipping Address State", "Category", "total_sales"]
-        ].copy()
-        features = None
-        if not self.state_forcast:
-            temp_df = pd.DataFrame(
-                temp_df.groupby([temp_df.index, "Shipping Address State"])[
-                    "total_sales"
-                ].sum()
-            ).reset_index()
-            features = (
-                pd.pivot(
-                    temp_df[["Order Date", "Shipping Address State", "total_sales"]],
-                    index="Order Date",
-                    columns="Shipping Address State",
-                    values="total_sales",
-                )
-                .reset_index()
-                .fillna(0)
-            )
-        else:
-            temp_df = pd.DataFrame(
-                temp_df.groupby([temp_df.index, "Category"])["total_sales"].sum()
-            ).reset_index()
-            features = (
-                pd.pivot(
-                    temp_df[["Order Date", "Category", "total_sales"]],
-                    index="Order Date",
-                    columns="Category",
-                    values="total_sales",
-                )
-                .reset_index()
-                .fillna(0)
-            )
-
-        features = features.set_index("Order Date")
-
-        scaler = MinMaxScaler()
-
-        scaled_data = scaler.fit_transform(features)
-
-        pca = PCA(n_components=3, random_state=101)
-
-        pca_features = pca.fit_transform(scaled_data)
-
-        sales_reduced = pd.DataFrame(pca_features)
-
-        sales_reduced.rename(columns={0: "S1", 1: "S2", 2: "S3"}, inplace=True)
-
-        sales_reduced.set_index(self.df.index, inplace=True)
+        features = self.pivot
+        if features is None:
+            column = "Category" if self.state_forcast else "Shipping Address State"
+            sales = self.data.groupby([self.data.index, column], observed=True)[
+                "total_sales"
+            ].sum()
+            if sales.index.get_level_values(1).nunique() > SparsePivot.DENSE_COLUMNS:
+                features = SparsePivot.from_sales(sales)
+            else:
+                features = sales.unstack(fill_value=0)
+
+        if self.projection is None:
+            self.projection = SalesProjection()
+        sales_reduced = self.projection.transform(features)
 
         lag_features = pd.concat(
             [
                 sales_reduced,
-                sales_reduced.shift(self.get_shift_value(2021)).rename(
-                    columns={"S1": "S1 1YA", "S2": "S2 1YA", "S3": "S3 1YA"}
-                ),
-                sales_reduced.shift(self.get_shift_value(2020)).rename(
-                    columns={"S1": "S1 2YA", "S2": "S2 2YA", "S3": "S3 2YA"}
-                ),
-                sales_reduced.shift(self.get_shift_value(2019)).rename(
-                    columns={"S1": "S1 3YA", "S2": "S2 3YA", "S3": "S3 3YA"}
+                LagEngine(sales_reduced, ["S1", "S2", "S3"]).lags(
+                    sales_reduced.index, self.LAG_YEARS
                 ),
             ],
             axis=1,
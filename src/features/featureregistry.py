@@ -0,0 +1,101 @@
+import fnmatch
+import graphlib
+
+import pandas as pd
+
+
+class FeatureProducer:
+    """FeatureProducer is a named group of features built together, such as the calendar features
+    or the sales lags, with the patterns of the columns it builds and the producers it reads from.
+    """
+
+    def __init__(self, name, columns, build, depends_on=()):
+        """__init__ initializes the producer.
+
+        Args:
+            name (_type_): name of the producer
+            columns (_type_): names or fnmatch patterns of the columns it builds, e.g. "Sales *YA"
+            build (_type_): function of the owner of the features, returning a DataFrame of the columns
+            depends_on (tuple, optional): names of the producers whose columns it reads. Defaults to ().
+        """
+        self.name = name
+        self.columns = list(columns)
+        self.build = build
+        self.depends_on = tuple(depends_on)
+
+    def builds(self, column):
+        """builds returns whether the producer builds the given column."""
+        return any(fnmatch.fnmatchcase(column, pattern) for pattern in self.columns)
+
+
+class FeatureRegistry:
+    """FeatureRegistry keeps the producers of the features of FeatureEngineering, so only the
+    producers of the features a model was trained on are run, in the order of their dependencies.
+    """
+
+    def __init__(self):
+        """__init__ initializes an empty registry."""
+        self.producers = {}
+
+    def register(self, name, columns, depends_on=()):
+        """register is a decorator registering a function as the producer of some columns.
+
+        Args:
+            name (_type_): name of the producer
+            columns (_type_): names or fnmatch patterns of the columns it builds
+            depends_on (tuple, optional): names of the producers whose columns it reads. Defaults to ().
+
+        Returns:
+            _type_: function: the decorator
+        """
+
+        def decorator(build):
+            self.producers[name] = FeatureProducer(name, columns, build, depends_on)
+            return build
+
+        return decorator
+
+    def producer_of(self, column):
+        """producer_of returns the name of the producer of a column.
+
+        Raises:
+            KeyError: if no producer builds the column.
+        """
+        for name, producer in self.producers.items():
+            if producer.builds(column):
+                return name
+        raise KeyError(f"No feature producer builds the column {column!r}")
+
+    def plan(self, columns):
+        """plan returns the names of the producers needed to build the given columns, with the
+        producers they depend on, in the order they must run.
+
+        Args:
+            columns (_type_): names of the columns to build
+
+        Returns:
+            _type_: list: names of the producers
+        """
+        needed = {self.producer_of(column) for column in columns}
+        graph = {}
+        while needed:
+            name = needed.pop()
+            graph[name] = self.producers[name].depends_on
+            needed.update(set(graph[name]) - set(graph))
+        return list(graphlib.TopologicalSorter(graph).static_order())
+
+    def build(self, owner, columns):
+        """build runs the producers of the given columns on their owner, adding the columns every
+        producer builds to owner.df before the next one runs.
+
+        Args:
+            owner (_type_): object with a df the producers read from and add their columns to
+            columns (_type_): names of the columns to build
+
+        Returns:
+            _type_: list: names of the producers that ran
+        """
+        plan = self.plan(columns)
+        for name in plan:
+            owner.df = pd.concat([owner.df, self.producers[name].build(owner)], axis=1)
+        return plan
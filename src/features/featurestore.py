@@ -0,0 +1,121 @@
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from utilis.utilities import resolve_path
+
+
+class FeatureStore:
+    """FeatureStore keeps FeatureEngineering outputs, training and forecast matrices, as parquet
+    files in data/processed_datasets/features. Every file is named by the sha256 key of what
+    the features were built from: the data version, the entity, the date range, the holiday and
+    event calendar and the version of the feature code. Named references point to the keys of
+    the latest training matrices, which the forecasts of the trained models use as history.
+    """
+
+    REFS_FILE = "refs.json"
+
+    def __init__(self, path=None):
+        """__init__ initializes the store, creating its directory if needed.
+
+        Args:
+            path (_type_, optional): directory of the store. Defaults to data/processed_datasets/features.
+        """
+        self.path = (
+            path
+            if path is not None
+            else resolve_path("data", "processed_datasets", "features")
+        )
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(**parts):
+        """key returns the sha256 key of the given parts, in any order."""
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def frame_version(*frames):
+        """frame_version returns a hash of the contents of the given frames, None is allowed."""
+        digest = hashlib.sha256()
+        for frame in frames:
+            if frame is None:
+                digest.update(b"none")
+                continue
+            digest.update(",".join(map(str, frame.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(frame).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def code_version(*paths):
+        """code_version returns a hash of the source files that build the features.
+
+        Args:
+            paths (_type_): directories or files of the feature code
+
+        Returns:
+            _type_: str: the hash
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            files = (
+                sorted(glob.glob(os.path.join(path, "*.py")))
+                if os.path.isdir(path)
+                else [path]
+            )
+            for file_name in files:
+                with open(file_name, "rb") as file:
+                    digest.update(file.read())
+        return digest.hexdigest()
+
+    def file_path(self, key):
+        """file_path returns the path of the features of a key."""
+        return os.path.join(self.path, f"{key}.parquet")
+
+    def get(self, key):
+        """get returns the features stored under a key, or None if there are none.
+
+        Args:
+            key (_type_): key of the features, None is allowed
+
+        Returns:
+            _type_: DataFrame: the features indexed by Order Date
+        """
+        if key is None or not os.path.exists(self.file_path(key)):
+            return None
+        return pd.read_parquet(self.file_path(key))
+
+    def put(self, key, features):
+        """put stores features under a key.
+
+        Args:
+            key (_type_): key of the features
+            features (_type_): DataFrame of the features indexed by Order Date
+        """
+        temp_path = self.file_path(key) + ".tmp"
+        features.to_parquet(temp_path)
+        os.replace(temp_path, self.file_path(key))
+
+    def refs(self):
+        """refs returns the named references to keys."""
+        if not os.path.exists(os.path.join(self.path, self.REFS_FILE)):
+            return {}
+        with open(os.path.join(self.path, self.REFS_FILE)) as file:
+            return json.load(file)
+
+    def ref(self, name):
+        """ref returns the key a name points to, or None."""
+        return self.refs().get(name)
+
+    def set_ref(self, name, key):
+        """set_ref points a name to a key."""
+        refs = self.refs()
+        refs[name] = key
+        temp_path = os.path.join(self.path, self.REFS_FILE + ".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(refs, file, indent=2)
+        os.replace(temp_path, os.path.join(self.path, self.REFS_FILE))
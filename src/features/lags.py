@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+
+class LagEngine:
+    """LagEngine looks up the values of columns of a date indexed history on the same calendar
+    day N years earlier, for any set of lag years and columns in one indexer lookup. February 29th
+    looks up February 28th of non leap years. Dates without a history value get NaN.
+    A history indexed by entity and date holds a panel of entities, each looked up in its own rows.
+    """
+
+    # prefixes of the lag column names, other columns keep their own name
+    NAMES = {"total_sales": "Sales"}
+
+    def __init__(self, history, columns):
+        """__init__ keeps the values of the history columns to look up.
+
+        Args:
+            history (_type_): DataFrame indexed by date, or by entity and date, with one row per date and entity
+            columns (_type_): columns to compute the lags of
+        """
+        self.columns = list(columns)
+        self.is_panel = isinstance(history.index, pd.MultiIndex)
+        if self.is_panel:
+            self.index = pd.MultiIndex.from_arrays(
+                [
+                    history.index.get_level_values(0),
+                    pd.DatetimeIndex(history.index.get_level_values(1)).normalize(),
+                ]
+            )
+            self.ends = pd.Series(self.index.get_level_values(1)).groupby(
+                np.asarray(self.index.get_level_values(0))
+            ).max()
+        else:
+            self.index = pd.DatetimeIndex(history.index).normalize()
+            self.end = self.index.max()
+        self.values = history[self.columns].to_numpy(dtype=np.float64)
+
+    def lag_name(self, column, years):
+        """lag_name returns the name of the lag column, e.g. Sales 1YA or S1 2YA."""
+        return f"{self.NAMES.get(column, column)} {years}YA"
+
+    @staticmethod
+    def anchor_years(dates, ends):
+        """anchor_years returns, for every date, the number of years to go back to reach the
+        history, at least one.
+
+        Args:
+            dates (_type_): DatetimeIndex of the dates
+            ends (_type_): last day of the history, or of the history of the entity of every date
+
+        Returns:
+            _type_: array: years per date
+        """
+        ends = pd.DatetimeIndex(np.broadcast_to(np.asarray(ends), len(dates)))
+        years = dates.year - ends.year
+        later_in_year = (dates.month > ends.month) | (
+            (dates.month == ends.month) & (dates.day > ends.day)
+        )
+        return np.maximum(np.asarray(years + later_in_year, dtype=np.int64), 1)
+
+    @staticmethod
+    def source_dates(days, offsets):
+        """source_dates returns the dates whole years back on the same calendar day.
+
+        Args:
+            days (_type_): DatetimeIndex of the dates
+            offsets (_type_): array of lag years x dates
+
+        Returns:
+            _type_: array: datetime64[D] source dates, lag year by lag year
+        """
+        day_values = days.to_numpy().astype("datetime64[D]")
+        months = day_values.astype("datetime64[M]")
+        day_of_month = day_values - months.astype("datetime64[D]")
+        source_months = (months[None, :] - 12 * offsets).ravel()
+        source_starts = source_months.astype("datetime64[D]")
+        month_lengths = (source_months + 1).astype("datetime64[D]") - source_starts
+        return source_starts + np.minimum(
+            np.tile(day_of_month, len(offsets)), month_lengths - 1
+        )
+
+    def positions(self, source):
+        """positions returns the rows of the history of the source dates, -1 for the missing ones."""
+        return self.index.get_indexer(source)
+
+    def lags(self, dates, lag_years=(1, 2, 3), anchored=False, columns=None):
+        """lags returns the lag columns of the given dates.
+
+        Args:
+            dates (_type_): dates to compute the lags of, or entities and dates for a panel history
+            lag_years (tuple, optional): years to look back. Defaults to (1, 2, 3).
+            anchored (bool, optional): for forecasts past the end of the history, look back from the
+            latest year of the history that has the same calendar day, so the 1 year lag of a date
+            two years out is the last year of history. Defaults to False.
+            columns (_type_, optional): columns to look up, all the columns if None. Defaults to None.
+
+        Returns:
+            _type_: DataFrame: lag columns indexed by the dates, for every lag year and column
+        """
+        if self.is_panel:
+            index = pd.MultiIndex.from_arrays(
+                [dates.get_level_values(0), pd.DatetimeIndex(dates.get_level_values(1))]
+            )
+            entities = np.asarray(index.get_level_values(0))
+            days = index.get_level_values(1).normalize()
+            ends = self.ends.reindex(entities).to_numpy() if anchored else None
+        else:
+            index = pd.DatetimeIndex(dates)
+            days = index.normalize()
+            ends = self.end
+        offsets = np.asarray(lag_years, dtype=np.int64)[:, None]
+        if anchored:
+            offsets = offsets + self.anchor_years(days, ends)[None, :] - 1
+        else:
+            offsets = np.broadcast_to(offsets, (len(offsets), len(days)))
+        source = pd.DatetimeIndex(self.source_dates(days, offsets))
+        if self.is_panel:
+            source = pd.MultiIndex.from_arrays([np.tile(entities, len(lag_years)), source])
+        columns = self.columns if columns is None else list(columns)
+        history = self.values[:, [self.columns.index(column) for column in columns]]
+        positions = self.positions(source)
+        values = np.where(
+            (positions >= 0)[:, None], history[positions], np.nan
+        ).reshape(len(lag_years), len(days), len(columns))
+        return pd.DataFrame(
+            np.concatenate(list(values), axis=1),
+            index=index,
+            columns=[
+                self.lag_name(column, years)
+                for years in lag_years
+                for column in columns
+            ],
+        )
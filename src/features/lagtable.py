@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from features.featurestore import FeatureStore
+from features.lags import LagEngine
+from features.rolling import RollingSales
+
+
+class LagTable(LagEngine):
+    """LagTable is the compact history the forecast features of a trained entity are built from:
+    the daily total_sales, S1, S2 and S3 of its training features, their rolling features, and the
+    names of the features its models were trained on. It is saved at train time next to the training features, see
+    FeatureStore. The values are laid out one row per day from the first day of the history, so
+    the lags of a date are read at the offset of their source date, and building the features
+    of a forecast depends on the length of the forecast, not of the history.
+    """
+
+    # targets and PCA components of the training features
+    TARGETS = ["total_sales", "S1", "S2", "S3"]
+    # lagged columns
+    COLUMNS = TARGETS + RollingSales.COLUMNS
+
+    def __init__(self, history, feature_columns):
+        """__init__ lays out the history one row per day.
+
+        Args:
+            history (_type_): DataFrame indexed by Order Date with some of the COLUMNS
+            feature_columns (_type_): names of the features of the forecasts
+        """
+        self.frame = history[[column for column in self.COLUMNS if column in history.columns]]
+        self.feature_columns = list(feature_columns)
+        dates = pd.DatetimeIndex(self.frame.index).normalize()
+        daily = self.frame.set_axis(dates).reindex(
+            pd.date_range(dates.min(), dates.max(), name="Order Date")
+        )
+        super().__init__(daily, self.frame.columns)
+        self.start = self.index[0].to_datetime64().astype("datetime64[D]")
+
+    @staticmethod
+    def key(features_key):
+        """key returns the FeatureStore key of the lag table of the training features of a key."""
+        return FeatureStore.key(lags=features_key)
+
+    @classmethod
+    def from_features(cls, features, rolling=None):
+        """from_features returns the lag table of the training features of FeatureEngineering.
+
+        Args:
+            features (_type_): training features indexed by Order Date
+            rolling (_type_, optional): RollingSales of the entity, updated with the total_sales of the
+            features. Computed from them if None. Defaults to None.
+
+        Returns:
+            _type_: LagTable: the lag table
+        """
+        if rolling is None:
+            rolling = RollingSales()
+        rolling.update(features["total_sales"])
+        history = features[
+            [column for column in cls.TARGETS if column in features.columns]
+        ].join(rolling.features, how="outer")
+        return cls(
+            history,
+            sorted(column for column in features.columns if column not in cls.COLUMNS),
+        )
+
+    @classmethod
+    def from_frame(cls, frame):
+        """from_frame returns the lag table of a frame made by to_frame, e.g. read from the FeatureStore."""
+        return cls(frame, frame.attrs["feature_columns"])
+
+    def to_frame(self):
+        """to_frame returns the history of the lag table, with the feature names in its attrs.
+
+        Returns:
+            _type_: DataFrame: the history indexed by Order Date
+        """
+        frame = self.frame.copy()
+        frame.attrs["feature_columns"] = self.feature_columns
+        return frame
+
+    def positions(self, source):
+        """positions returns the rows of the source dates, the number of days since the first day
+        of the history, -1 for the dates outside of it."""
+        offsets = (
+            source.to_numpy().astype("datetime64[D]") - self.start
+        ).astype(np.int64)
+        return np.where((offsets >= 0) & (offsets < len(self.values)), offsets, -1)
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from features.calendarfeatures import CalendarFeatures
+from features.lags import LagEngine
+from features.rolling import RollingSales
+from utilis.utilities import TRAINING_CUTOFF
+
+
+class PanelFeatureEngineering:
+    """PanelFeatureEngineering builds the features of FeatureEngineering for many entities, every
+    state or every category, in one pass over a long frame of their sales. The calendar, holiday
+    and event features are built once per distinct date and broadcast to the rows of every entity,
+    the lags of all entities are looked up at once by a LagEngine over the (entity, date) panel.
+    The output is a single matrix indexed by entity and Order Date.
+    """
+
+    # years the sales and PCA lag features look back
+    LAG_YEARS = (1, 2, 3)
+    # targets and PCA components, which are lagged but are not features of a forecast
+    TARGETS = ["total_sales", "S1", "S2", "S3"]
+
+    def __init__(
+        self,
+        data,
+        holidays_2021,
+        events,
+        holidays=None,
+        entity_column="Shipping Address State",
+        start=None,
+        end=None,
+        is_train=True,
+        components=None,
+        entities=None,
+        cutoff=TRAINING_CUTOFF,
+    ):
+        """__init__ builds the features of the sales of every entity.
+
+        Args:
+            data (_type_): for training, the long sales frame indexed by Order Date with the entity_column
+            and total_sales columns. For forecasting, the training output of the panel, used as history.
+            holidays_2021 (_type_): holidays for 2022 and beyond
+            events (_type_): Amazon event days
+            holidays (_type_, optional): holidays up to 2021, used for training. Defaults to None.
+            entity_column (str, optional): column of the entities in data. Defaults to "Shipping Address State".
+            start (_type_, optional): start date of the forecast. Defaults to None.
+            end (_type_, optional): end date of the forecast. Defaults to None.
+            is_train (bool, optional): build training features, forecast features otherwise. Defaults to True.
+            components (_type_, optional): S1, S2 and S3 of every entity indexed by entity and Order Date,
+            e.g. from the SalesProjection of each entity, added with their lags. Defaults to None.
+            entities (_type_, optional): entities to forecast, all the entities of the history if None.
+            Defaults to None.
+            cutoff (_type_, optional): first day left out of the training features, e.g.
+            SalesStore.training_cutoff. Defaults to TRAINING_CUTOFF.
+        """
+        self.data = data
+        self.holidays = holidays
+        self.holidays_2021 = holidays_2021
+        self.events = events
+        self.entity_column = entity_column
+        self.is_train = is_train
+        if is_train:
+            self.df = (
+                data.groupby([entity_column, "Order Date"], observed=True)["total_sales"]
+                .sum()
+                .to_frame()
+            )
+            self.df.index.names = [entity_column, "Order Date"]
+            self.df = self.df[self.df.index.get_level_values(1) < pd.Timestamp(cutoff)]
+            if components is not None:
+                self.df[["S1", "S2", "S3"]] = (
+                    components[["S1", "S2", "S3"]].reindex(self.df.index).to_numpy()
+                )
+        else:
+            if entities is None:
+                entities = data.index.get_level_values(0).unique()
+            self.df = pd.DataFrame(
+                index=pd.MultiIndex.from_product(
+                    [entities, pd.date_range(start, end)],
+                    names=[data.index.names[0], "Order Date"],
+                )
+            )
+
+        self.add_date_features()
+        self.add_previous_sales()
+
+    def date_features(self, dates):
+        """date_features returns the calendar, Amazon event and holiday features of the given dates.
+
+        Args:
+            dates (_type_): distinct dates
+
+        Returns:
+            _type_: DataFrame: features indexed by Order Date
+        """
+        features = CalendarFeatures.build(dates)
+        event_days = self.events[~self.events.index.duplicated()]
+        events = (
+            event_days["Amazon Events"]
+            .reindex(features.index)
+            .fillna("No Events")
+            .rename("Amazon Events")
+        )
+        features = pd.concat(
+            [features, pd.get_dummies(events, prefix="Amazon Events", drop_first=True)],
+            axis=1,
+        )
+        holiday = features.index.isin(
+            self.holidays_2021.index[self.holidays_2021["holiday"].fillna(False)]
+        )
+        if self.is_train:
+            holiday = holiday | features.index.isin(pd.to_datetime(self.holidays["Date"]))
+        features["fedral_holiday"] = holiday
+        return features
+
+    def add_date_features(self):
+        """add_date_features adds the features of the dates to every row, building them once per distinct date."""
+        codes, dates = pd.factorize(self.df.index.get_level_values(1))
+        features = self.date_features(pd.DatetimeIndex(dates))
+        features = features.take(codes)
+        features.index = self.df.index
+        self.df = pd.concat([self.df, features], axis=1)
+
+    def get_feature_columns(self):
+        """get_feature_columns returns the sorted list of feature columns, the targets included for training."""
+        if self.is_train:
+            return sorted(self.df.columns)
+        return sorted(
+            column for column in self.data.columns if column not in self.TARGETS
+        )
+
+    @staticmethod
+    def rolling_sales(sales):
+        """rolling_sales returns the RollingSales features of every entity, computed for all of them
+        at once on a matrix of entities x days in which every entity starts on its first day.
+
+        Args:
+            sales (_type_): Series of total_sales indexed by entity and Order Date
+
+        Returns:
+            _type_: DataFrame: features of every day from the first to the last day of each entity
+        """
+        codes, entities = pd.factorize(sales.index.get_level_values(0))
+        days = (
+            pd.DatetimeIndex(sales.index.get_level_values(1))
+            .to_numpy()
+            .astype("datetime64[D]")
+            .astype(np.int64)
+        )
+        starts = np.full(len(entities), days.max())
+        ends = np.full(len(entities), days.min())
+        np.minimum.at(starts, codes, days)
+        np.maximum.at(ends, codes, days)
+        lengths = ends - starts + 1
+        matrix = np.zeros((len(entities), lengths.max()))
+        np.add.at(matrix, (codes, days - starts[codes]), sales.to_numpy(dtype=np.float64))
+        features, _, _ = RollingSales.kernel(matrix, np.zeros((len(entities), 0)))
+        rows, offsets = np.nonzero(np.arange(lengths.max())[None, :] < lengths[:, None])
+        return pd.DataFrame(
+            features[rows, offsets],
+            index=pd.MultiIndex.from_arrays(
+                [
+                    entities[rows],
+                    pd.DatetimeIndex((starts[rows] + offsets).astype("datetime64[D]")),
+                ],
+                names=sales.index.names,
+            ),
+            columns=RollingSales.COLUMNS,
+        )
+
+    def add_previous_sales(self):
+        """add_previous_sales adds the values of the sales, and of the PCA components if any, of each
+        entity on the same calendar day 1, 2 and 3 years earlier, and the rolling sales features of
+        each entity one year earlier. Forecasts look back from the last year of the history of each
+        entity, see LagEngine.
+        """
+        if self.is_train:
+            history = self.df
+        else:
+            history = self.data
+        columns = [column for column in self.TARGETS if column in history.columns]
+        lags = LagEngine(history, columns).lags(
+            self.df.index, self.LAG_YEARS, anchored=not self.is_train
+        )
+        rolling = LagEngine(
+            self.rolling_sales(history["total_sales"]), RollingSales.COLUMNS
+        ).lags(self.df.index, (1,), anchored=not self.is_train)
+        lags.index = self.df.index
+        rolling.index = self.df.index
+        self.df = pd.concat([self.df, lags, rolling], axis=1)
+        self.df = self.df.reindex(self.get_feature_columns(), axis=1)
+
+    def entity(self, entity_name):
+        """entity returns the features of one entity indexed by Order Date.
+
+        Args:
+            entity_name (_type_): state or category
+
+        Returns:
+            _type_: DataFrame: features of the entity
+        """
+        return self.df.xs(entity_name, level=0)
+
+    def output(self):
+        """output returns the features of every entity indexed by entity and Order Date.
+
+        Returns:
+            _type_: DataFrame: features, and total_sales for training
+        """
+        return self.df
@@ -0,0 +1,230 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.linalg import subspace_angles
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from features.sparsepivot import SparsePivot
+from utilis.utilities import resolve_path
+
+
+class SalesProjection:
+    """SalesProjection reduces the daily sales pivot of an entity (by state, or by category for a
+    state) to the S1, S2 and S3 PCA features. The column ranges and the PCA basis are saved next
+    to the models of the entity, with the components of every projected day.
+    Days added later are projected on the saved basis, so only the new rows are transformed.
+    The days already projected are checked against the pivot, and the basis is refitted when their
+    sales changed, e.g. when a delta replaced a day of the daily sales store.
+    An IncrementalPCA, started from the basis, is updated with the new days, and the basis is
+    refitted on the full pivot once the principal angle between the two passes DRIFT_DEGREES.
+    Wide pivots are given as a SparsePivot and reduced without being made dense: columns are
+    divided by their range, which gives the same components as min max scaling since PCA
+    centers the data, and the PCA runs with the arpack solver on the sparse matrix.
+    """
+
+    N_COMPONENTS = 3
+    COMPONENTS = ["S1", "S2", "S3"]
+    # largest principal angle between the saved and the updated basis before a refit
+    DRIFT_DEGREES = 10.0
+
+    def __init__(self, entity_name=""):
+        """__init__ initializes an unfitted projection of an entity.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to '' for the overall sales.
+        """
+        self.entity_name = entity_name
+        self.scale_ = None
+        self.pca = None
+        self.tracker = None
+        self.columns = None
+        self.pending = None
+        self.projected = pd.DataFrame(columns=self.COMPONENTS, dtype=np.float64)
+        self.refits = 0
+
+    @staticmethod
+    def path(entity_name=""):
+        """path returns the file the projection of an entity is saved to, next to its models."""
+        prefix = "" if entity_name == "" else f"{entity_name}_"
+        return resolve_path("models", "saves", f"{prefix}projection.joblib")
+
+    @classmethod
+    def load(cls, entity_name=""):
+        """load returns the saved projection of an entity, or None if there is none.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to '' for the overall sales.
+
+        Returns:
+            _type_: SalesProjection: the saved projection
+        """
+        path = cls.path(entity_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            projection = joblib.load(path)
+        except Exception as e:
+            print(f"Error loading projection: {e}")
+            return None
+        # projections saved with a MinMaxScaler are refitted
+        return projection if hasattr(projection, "scale_") else None
+
+    def save(self):
+        """save writes the projection next to the models of its entity."""
+        path = self.path(self.entity_name)
+        temp_path = path + ".tmp"
+        joblib.dump(self, temp_path)
+        os.replace(temp_path, path)
+
+    def is_fitted(self):
+        """is_fitted checks if the column ranges and the PCA basis have been fitted."""
+        return self.pca is not None
+
+    def scale(self, pivot):
+        """scale aligns the pivot on the fitted columns and divides every column by its range.
+
+        Args:
+            pivot (_type_): DataFrame or SparsePivot of daily sales
+
+        Returns:
+            _type_: array or csr_matrix: the scaled days x columns
+        """
+        if isinstance(pivot, SparsePivot):
+            return (pivot.reindex_columns(self.columns) @ sparse.diags(self.scale_)).tocsr()
+        values = pivot.reindex(columns=self.columns, fill_value=0).to_numpy(
+            dtype=np.float64
+        )
+        return values * self.scale_
+
+    def fit(self, pivot):
+        """fit fits the column ranges and the PCA basis on the full pivot and projects every day of it.
+
+        Args:
+            pivot (_type_): DataFrame or SparsePivot of daily sales by state or category, indexed by Order Date
+
+        Returns:
+            _type_: SalesProjection: the fitted projection
+        """
+        self.columns = list(pivot.columns)
+        if isinstance(pivot, SparsePivot):
+            values = pivot.matrix
+            data_range = (values.max(axis=0) - values.min(axis=0)).toarray().ravel()
+        else:
+            values = pivot.to_numpy(dtype=np.float64)
+            data_range = values.max(axis=0) - values.min(axis=0)
+        # constant columns are left unscaled, as MinMaxScaler does
+        data_range[data_range == 0] = 1
+        self.scale_ = 1 / data_range
+        scaled = self.scale(pivot)
+        # auto picks arpack for sparse input
+        self.pca = PCA(n_components=self.N_COMPONENTS, random_state=101).fit(scaled)
+        self.tracker = self.start_tracker(scaled)
+        self.pending = None
+        self.projected = pd.DataFrame(
+            self.pca.transform(scaled), index=pivot.index, columns=self.COMPONENTS
+        )
+        self.refits += 1
+        return self
+
+    def start_tracker(self, scaled):
+        """start_tracker returns an IncrementalPCA in the state it would have after fitting the
+        scaled pivot, taken from the fitted basis, so that it can be updated with new days.
+
+        Args:
+            scaled (_type_): scaled days x columns the basis was fitted on
+
+        Returns:
+            _type_: IncrementalPCA: the tracker
+        """
+        if sparse.issparse(scaled):
+            mean_of_squares = np.asarray(scaled.multiply(scaled).mean(axis=0)).ravel()
+        else:
+            mean_of_squares = (scaled**2).mean(axis=0)
+        tracker = IncrementalPCA(n_components=self.N_COMPONENTS)
+        tracker.n_components_ = self.N_COMPONENTS
+        tracker.n_features_in_ = scaled.shape[1]
+        tracker.n_samples_seen_ = scaled.shape[0]
+        tracker.components_ = self.pca.components_.copy()
+        tracker.singular_values_ = self.pca.singular_values_.copy()
+        tracker.mean_ = self.pca.mean_.copy()
+        tracker.var_ = mean_of_squares - self.pca.mean_**2
+        return tracker
+
+    def drift(self):
+        """drift returns the largest principal angle, in degrees, between the saved basis and the
+        basis updated with the days added since the last fit."""
+        return float(
+            np.degrees(
+                subspace_angles(self.pca.components_.T, self.tracker.components_.T).max()
+            )
+        )
+
+    def update(self, pivot):
+        """update projects the days of the pivot that have not been projected yet on the saved
+        basis and adds them to the updated basis. The basis is refitted on the full pivot when
+        it has drifted, when the pivot has columns the projection was not fitted on, or when
+        the sales of days already projected changed.
+
+        Args:
+            pivot (_type_): DataFrame or SparsePivot of daily sales by state or category, indexed by Order Date
+
+        Returns:
+            _type_: bool: whether the basis was refitted
+        """
+        if not self.is_fitted() or not set(pivot.columns).issubset(self.columns):
+            self.fit(pivot)
+            return True
+        seen = pivot.index.isin(self.projected.index)
+        seen_days = pivot.rows(seen) if isinstance(pivot, SparsePivot) else pivot[seen]
+        if len(seen_days) and not np.allclose(
+            self.pca.transform(self.scale(seen_days)),
+            self.projected.loc[seen_days.index].to_numpy(),
+        ):
+            print("Sales of projected days changed, refitting the projection...")
+            self.fit(pivot)
+            return True
+        new = ~seen
+        new_days = pivot.rows(new) if isinstance(pivot, SparsePivot) else pivot[new]
+        if len(new_days) == 0:
+            return False
+        new_scaled = self.scale(new_days)
+        scaled = new_scaled.toarray() if sparse.issparse(new_scaled) else new_scaled
+        if self.pending is not None:
+            scaled = np.vstack([self.pending, scaled])
+        # partial_fit needs at least as many rows as components
+        if len(scaled) >= self.N_COMPONENTS:
+            self.tracker.partial_fit(scaled)
+            self.pending = None
+        else:
+            self.pending = scaled
+        if self.drift() > self.DRIFT_DEGREES:
+            print(f"Projection drifted {self.drift():.1f} degrees, refitting...")
+            self.fit(pivot)
+            return True
+        self.projected = pd.concat(
+            [
+                self.projected,
+                pd.DataFrame(
+                    self.pca.transform(new_scaled),
+                    index=new_days.index,
+                    columns=self.COMPONENTS,
+                ),
+            ]
+        ).sort_index()
+        return False
+
+    def transform(self, pivot):
+        """transform returns the S1, S2 and S3 features of the days of the pivot, updating the
+        projection with the days it has not seen, see update.
+
+        Args:
+            pivot (_type_): DataFrame or SparsePivot of daily sales by state or category, indexed by Order Date
+
+        Returns:
+            _type_: DataFrame: S1, S2 and S3 indexed like the pivot
+        """
+        self.update(pivot)
+        return self.projected.reindex(pivot.index)
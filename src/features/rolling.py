@@ -0,0 +1,178 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from utilis.utilities import resolve_path
+
+
+class RollingSales:
+    """RollingSales computes the trailing 7, 28 and 91 day means and sums, and the exponentially
+    weighted means, of the daily total_sales of an entity, days without sales counting as 0.
+    Window sums are differences of a cumulative sum and the weighted means run through a
+    recursive filter, so every day is computed once: the state kept between updates, the last
+    91 days of sales and the last weighted means, is enough to advance the features by the days
+    added later. The state and the features of every day are saved next to the models of the entity.
+    The features are used one year later, see FeatureEngineering.add_rolling_sales.
+    """
+
+    WINDOWS = (7, 28, 91)
+    # spans of the exponentially weighted means, alpha = 2 / (span + 1)
+    SPANS = (7, 28)
+    COLUMNS = (
+        [f"Sales Mean {window}D" for window in WINDOWS]
+        + [f"Sales Sum {window}D" for window in WINDOWS]
+        + [f"Sales EWM {span}D" for span in SPANS]
+    )
+
+    def __init__(self, entity_name=""):
+        """__init__ initializes an empty state of an entity.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to '' for the overall sales.
+        """
+        self.entity_name = entity_name
+        self.sales = pd.Series(dtype=np.float64)
+        self.tail = np.zeros((1, 0))
+        self.ewm = None
+        self.features = pd.DataFrame(columns=self.COLUMNS, dtype=np.float64)
+        self.refits = 0
+
+    @staticmethod
+    def path(entity_name=""):
+        """path returns the file the rolling features of an entity are saved to, next to its models."""
+        prefix = "" if entity_name == "" else f"{entity_name}_"
+        return resolve_path("models", "saves", f"{prefix}rolling.joblib")
+
+    @classmethod
+    def load(cls, entity_name=""):
+        """load returns the saved rolling features of an entity, or None if there are none.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to '' for the overall sales.
+
+        Returns:
+            _type_: RollingSales: the saved rolling features
+        """
+        path = cls.path(entity_name)
+        if not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            print(f"Error loading rolling features: {e}")
+            return None
+
+    def save(self):
+        """save writes the rolling features next to the models of their entity."""
+        path = self.path(self.entity_name)
+        temp_path = path + ".tmp"
+        joblib.dump(self, temp_path)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def kernel(cls, values, tail, ewm=None):
+        """kernel advances the rolling features of one or more series by the given days.
+
+        Args:
+            values (_type_): array of series x new days of sales
+            tail (_type_): array of series x the last days of sales before the new days, up to the longest window
+            ewm (_type_, optional): array of series x the weighted means of the last day, None for new series,
+            which start from their first day. Defaults to None.
+
+        Returns:
+            _type_: tuple: array of series x new days x COLUMNS, the new tail and the new weighted means
+        """
+        rows, days = values.shape
+        extended = np.concatenate([tail, values], axis=1)
+        cumulative = np.concatenate(
+            [np.zeros((rows, 1)), np.cumsum(extended, axis=1)], axis=1
+        )
+        ends = tail.shape[1] + 1 + np.arange(days)
+        sums = []
+        for window in cls.WINDOWS:
+            starts = ends - window
+            sums.append(
+                np.where(
+                    starts >= 0,
+                    cumulative[:, ends] - cumulative[:, np.maximum(starts, 0)],
+                    np.nan,
+                )
+            )
+        means = [total / window for total, window in zip(sums, cls.WINDOWS)]
+        weighted = []
+        last = []
+        for position, span in enumerate(cls.SPANS):
+            alpha = 2 / (span + 1)
+            previous = values[:, :1] if ewm is None else ewm[:, position : position + 1]
+            smoothed, _ = lfilter(
+                [alpha], [1, alpha - 1], values, axis=1, zi=(1 - alpha) * previous
+            )
+            weighted.append(smoothed)
+            last.append(smoothed[:, -1:])
+        features = np.stack(means + sums + weighted, axis=2)
+        return (
+            features,
+            extended[:, -max(cls.WINDOWS) :],
+            np.concatenate(last, axis=1),
+        )
+
+    @staticmethod
+    def daily(sales):
+        """daily returns the sales of every day from the first to the last day of the given sales, 0 when there are none."""
+        sales = sales.groupby(pd.DatetimeIndex(sales.index).normalize()).sum()
+        return sales.reindex(
+            pd.date_range(sales.index.min(), sales.index.max(), name="Order Date"),
+            fill_value=0,
+        ).astype(np.float64)
+
+    def fit(self, sales):
+        """fit computes the rolling features of every day of the sales, starting from an empty state.
+
+        Args:
+            sales (_type_): Series of total_sales indexed by Order Date
+        """
+        self.sales = pd.Series(dtype=np.float64)
+        self.tail = np.zeros((1, 0))
+        self.ewm = None
+        self.features = pd.DataFrame(columns=self.COLUMNS, dtype=np.float64)
+        self.advance(self.daily(sales))
+        self.refits += 1
+
+    def advance(self, daily):
+        """advance adds the features of days following the last day of the state."""
+        features, self.tail, self.ewm = self.kernel(
+            daily.to_numpy()[None, :], self.tail, self.ewm
+        )
+        new_features = pd.DataFrame(features[0], index=daily.index, columns=self.COLUMNS)
+        self.features = (
+            new_features if self.features.empty else pd.concat([self.features, new_features])
+        )
+        self.sales = daily if self.sales.empty else pd.concat([self.sales, daily])
+
+    def update(self, sales):
+        """update advances the rolling features by the days of the sales after the last day of the
+        state. They are computed again from the first day when days already seen have changed.
+
+        Args:
+            sales (_type_): Series of total_sales indexed by Order Date
+
+        Returns:
+            _type_: bool: whether every day was computed again
+        """
+        daily = self.daily(sales)
+        end = self.sales.index.max() if len(self.sales) else None
+        if (
+            end is None
+            or daily.index[0] < self.sales.index[0]
+            or daily.index[-1] < end
+            or not np.allclose(daily.loc[:end], self.sales.loc[daily.index[0] :])
+        ):
+            self.fit(sales)
+            return True
+        new_days = daily.loc[end + pd.Timedelta(days=1) :]
+        if len(new_days):
+            self.advance(new_days)
+        return False
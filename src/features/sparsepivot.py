@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class SparsePivot:
+    """SparsePivot is a days x states or days x categories sales pivot stored as a scipy CSR
+    matrix, with its Order Date index and its columns. Wide pivots, such as the daily sales of
+    a state by category, are mostly zero, so they are built and reduced in this form instead of
+    a dense frame. See SalesProjection.
+    """
+
+    # pivots with more columns than this are built sparse
+    DENSE_COLUMNS = 512
+    # rows converted at a time when a dense array is made sparse
+    CHUNK_ROWS = 4096
+
+    def __init__(self, matrix, index, columns):
+        """__init__ wraps a sparse matrix with its index and columns.
+
+        Args:
+            matrix (_type_): scipy sparse matrix of days x columns
+            index (_type_): Order Date of every row
+            columns (_type_): state or category of every column
+        """
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.index = pd.DatetimeIndex(index, name="Order Date")
+        self.columns = pd.Index(columns)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def shape(self):
+        """shape returns the number of days and columns."""
+        return self.matrix.shape
+
+    @classmethod
+    def from_sales(cls, sales):
+        """from_sales builds the pivot of daily sales grouped by date and state or category.
+
+        Args:
+            sales (_type_): total sales Series indexed by Order Date and a state or category level
+
+        Returns:
+            _type_: SparsePivot: the pivot, with sorted dates and columns
+        """
+        day_codes, days = pd.factorize(sales.index.get_level_values(0), sort=True)
+        column_codes, columns = pd.factorize(
+            sales.index.get_level_values(1), sort=True
+        )
+        matrix = sparse.csr_matrix(
+            (sales.to_numpy(dtype=np.float64), (day_codes, column_codes)),
+            shape=(len(days), len(columns)),
+        )
+        matrix.sum_duplicates()
+        return cls(matrix, days, columns)
+
+    @classmethod
+    def from_dense(cls, values, index, columns):
+        """from_dense builds the pivot from a dense days x columns array, e.g. a memmap slice,
+        CHUNK_ROWS rows at a time so that no second dense copy is made.
+
+        Returns:
+            _type_: SparsePivot: the pivot
+        """
+        chunks = [
+            sparse.csr_matrix(np.asarray(values[start : start + cls.CHUNK_ROWS]))
+            for start in range(0, len(values), cls.CHUNK_ROWS)
+        ]
+        if len(chunks) == 0:
+            return cls(sparse.csr_matrix((0, len(columns))), index, columns)
+        return cls(sparse.vstack(chunks, format="csr"), index, columns)
+
+    def rows(self, mask):
+        """rows returns the pivot of the rows selected by a boolean mask."""
+        mask = np.asarray(mask)
+        return SparsePivot(self.matrix[mask], self.index[mask], self.columns)
+
+    def reindex_columns(self, columns):
+        """reindex_columns returns the matrix with the given columns, zero for the columns the pivot
+        does not have, dropping the columns that are not given.
+
+        Returns:
+            _type_: csr_matrix: days x columns
+        """
+        positions = pd.Index(columns).get_indexer(self.columns)
+        known = positions >= 0
+        selection = sparse.csr_matrix(
+            (np.ones(known.sum()), (np.flatnonzero(known), positions[known])),
+            shape=(len(self.columns), len(columns)),
+        )
+        return (self.matrix @ selection).tocsr()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.calendarfeatures import CalendarFeatures
+
+import numpy as np
+import pandas as pd
+
+
+class TestCalendarFeatures(unittest.TestCase):
+    """TestCalendarFeatures is a test case for the CalendarFeatures class."""
+
+    def test_matches_datetime_accessors(self):
+        """Test that the features match the pandas datetime accessors over leap and non leap years"""
+        dates = pd.date_range("2019-12-25", "2024-03-05", name="Order Date")
+        features = CalendarFeatures.build(dates)
+        expected = {
+            "day": dates.day,
+            "month": dates.month,
+            "year": dates.year,
+            "is_weekend": dates.weekday > 5,
+            "day_of_week": dates.day_of_week,
+            "day_of_year": dates.day_of_year,
+            "quarter": dates.quarter,
+            "is_month_start": dates.is_month_start,
+            "is_month_end": dates.is_month_end,
+            "is_year_start": dates.is_year_start,
+            "is_year_end": dates.is_year_end,
+        }
+        self.assertEqual(list(features.columns), CalendarFeatures.COLUMNS)
+        for column, values in expected.items():
+            np.testing.assert_array_equal(features[column].to_numpy(), values, column)
+        self.assertEqual(features["day"].dtype, np.int8)
+        self.assertEqual(features["year"].dtype, np.int16)
+
+    def test_cached(self):
+        """Test that a date range is built once and its features are returned as copies"""
+        first = CalendarFeatures.cached("2023-01-01", "2023-12-31")
+        first["day"] = 0
+        second = CalendarFeatures.cached(pd.Timestamp("2023-01-01"), "2023-12-31")
+        self.assertEqual(len(second), 365)
+        self.assertEqual(second["day"].iloc[-1], 31)
+        self.assertGreaterEqual(CalendarFeatures.date_range_features.cache_info().hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.featureengineering import FeatureEngineering
+from features.featureregistry import FeatureRegistry
+from features.lagtable import LagTable
+
+import numpy as np
+import pandas as pd
+
+
+class TestFeatureRegistry(unittest.TestCase):
+    """TestFeatureRegistry is a test case for the FeatureRegistry class and the forecast features built with it."""
+
+    def test_plan(self):
+        """Test that the plan runs only the needed producers, after the producers they depend on"""
+        registry = FeatureRegistry()
+        for name, columns, depends_on in [
+            ("base", ["day"], ()),
+            ("ratio", ["ratio_*"], ("base", "scale")),
+            ("scale", ["scale"], ("base",)),
+            ("unused", ["other"], ()),
+        ]:
+            registry.register(name, columns, depends_on)(lambda owner: None)
+        self.assertEqual(registry.plan(["ratio_1", "ratio_2"]), ["base", "scale", "ratio"])
+        self.assertEqual(registry.plan(["day"]), ["base"])
+        with self.assertRaises(KeyError):
+            registry.plan(["missing"])
+
+    def test_forecast_features(self):
+        """Test that forecast features of a subset of the features are those of all the features"""
+        dates = pd.date_range("2019-01-01", "2022-12-31", name="Order Date")
+        history = pd.DataFrame(
+            np.random.default_rng(19).random((len(dates), 4)),
+            index=dates,
+            columns=LagTable.TARGETS,
+        )
+        lag_table = LagTable(
+            history,
+            ["Amazon Events_Prime Day", "S1 1YA", "Sales 1YA", "day", "fedral_holiday"],
+        )
+        holidays_2021 = pd.DataFrame(
+            {"holiday": True}, index=pd.DatetimeIndex(["2023-07-04"])
+        )
+        events = pd.DataFrame(
+            {"Amazon Events": ["Prime Day"]},
+            index=pd.DatetimeIndex(["2023-07-11"], name="Event Date"),
+        )
+        arguments = dict(is_train=False, start="2023-01-01", end="2023-12-31")
+        features = FeatureEngineering(lag_table, holidays_2021, events, **arguments)
+        self.assertEqual(list(features.output().columns), lag_table.feature_columns)
+        self.assertEqual(
+            sorted(features.feature_producers),
+            ["amazon_events", "calendar", "holidays", "lag_table", "lags"],
+        )
+        selected = FeatureEngineering(
+            lag_table,
+            holidays_2021,
+            events,
+            feature_columns=["Sales 1YA", "day"],
+            **arguments,
+        )
+        self.assertLess(
+            selected.feature_producers.index("lag_table"),
+            selected.feature_producers.index("lags"),
+        )
+        self.assertEqual(
+            sorted(selected.feature_producers), ["calendar", "lag_table", "lags"]
+        )
+        pd.testing.assert_frame_equal(
+            selected.output(), features.output()[["Sales 1YA", "day"]]
+        )
+
+        # the lag table of training features is only built for the producers reading it
+        training_features = history.assign(day=dates.day)
+        calendar = FeatureEngineering(
+            training_features,
+            holidays_2021,
+            events,
+            feature_columns=["day"],
+            **arguments,
+        )
+        self.assertIsNone(calendar.lag_table)
+        self.assertEqual(calendar.feature_producers, ["calendar"])
+        pd.testing.assert_frame_equal(calendar.output(), features.output()[["day"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
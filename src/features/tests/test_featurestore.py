@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.featureengineering import FeatureEngineering
+from features.featurestore import FeatureStore
+
+import pandas as pd
+
+
+class TestFeatureStore(unittest.TestCase):
+    """TestFeatureStore is a test case for the FeatureStore class."""
+
+    def test_put_get_and_refs(self):
+        """Test that features are read back by key and that references point to keys"""
+        features = pd.DataFrame(
+            {"total_sales": [1.0, 2.0], "fedral_holiday": [True, False]},
+            index=pd.DatetimeIndex(["2022-01-01", "2022-01-02"], name="Order Date"),
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = FeatureStore(tmp_dir)
+            key = FeatureStore.key(entity="CA", data="v1")
+            self.assertEqual(key, FeatureStore.key(data="v1", entity="CA"))
+            self.assertIsNone(store.get(key))
+            store.put(key, features)
+            store.set_ref("train:CA", key)
+            pd.testing.assert_frame_equal(
+                FeatureStore(tmp_dir).get(store.ref("train:CA")), features
+            )
+            self.assertIsNone(store.ref("train:NY"))
+
+    def test_frame_version(self):
+        """Test that the calendar version changes with the contents of the frames"""
+        events = pd.DataFrame({"Amazon Events": ["Prime Day"]})
+        changed = pd.DataFrame({"Amazon Events": ["Black Friday"]})
+        self.assertEqual(
+            FeatureStore.frame_version(events, None),
+            FeatureStore.frame_version(events.copy(), None),
+        )
+        self.assertNotEqual(
+            FeatureStore.frame_version(events, None),
+            FeatureStore.frame_version(changed, None),
+        )
+
+    def test_cached_features(self):
+        """Test that FeatureEngineering.cached builds the features once per key"""
+        history = pd.DataFrame(
+            {"total_sales": [1.0]}, index=pd.DatetimeIndex(["2022-01-01"], name="Order Date")
+        )
+        features = pd.DataFrame({"day": [1]}, index=history.index)
+        holidays = pd.DataFrame({"holiday": [True]})
+        events = pd.DataFrame({"Amazon Events": ["Prime Day"]})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = FeatureStore(tmp_dir)
+            with mock.patch.object(
+                FeatureEngineering, "__init__", return_value=None
+            ), mock.patch.object(
+                FeatureEngineering, "output", return_value=features
+            ) as output:
+                keys = [
+                    FeatureEngineering.cached(
+                        store,
+                        "history",
+                        "CA",
+                        history,
+                        holidays,
+                        events,
+                        is_train=False,
+                        start=start,
+                        end="2023-12-31",
+                    )[1]
+                    for start in ["2023-01-01", pd.Timestamp("2023-01-01"), "2023-06-01"]
+                ]
+            self.assertEqual(output.call_count, 2)
+            self.assertEqual(keys[0], keys[1])
+            self.assertNotEqual(keys[0], keys[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.lags import LagEngine
+
+import numpy as np
+import pandas as pd
+
+
+class TestLagEngine(unittest.TestCase):
+    """TestLagEngine is a test case for the LagEngine class."""
+
+    def setUp(self):
+        dates = pd.date_range("2019-01-01", "2022-12-31", name="Order Date")
+        self.history = pd.DataFrame(
+            {"total_sales": np.arange(len(dates), dtype=float), "S1": -1.0},
+            index=dates,
+        )
+
+    def value(self, date):
+        return self.history.loc[date, "total_sales"]
+
+    def test_lags(self):
+        """Test that the lags are the values on the same calendar day, NaN before the history"""
+        lags = LagEngine(self.history, ["total_sales", "S1"]).lags(
+            pd.DatetimeIndex(["2022-03-01", "2020-02-29", "2019-06-01"])
+        )
+        self.assertEqual(
+            list(lags.columns),
+            ["Sales 1YA", "S1 1YA", "Sales 2YA", "S1 2YA", "Sales 3YA", "S1 3YA"],
+        )
+        self.assertEqual(lags.loc["2022-03-01", "Sales 3YA"], self.value("2019-03-01"))
+        self.assertEqual(lags.loc["2020-02-29", "Sales 1YA"], self.value("2019-02-28"))
+        self.assertTrue(np.isnan(lags.loc["2019-06-01", "Sales 1YA"]))
+
+    def test_anchored_lags(self):
+        """Test that forecasts past the history look back from its last year"""
+        lags = LagEngine(self.history, ["total_sales"]).lags(
+            pd.DatetimeIndex(["2023-04-04", "2024-04-04", "2022-06-01"]), anchored=True
+        )
+        self.assertEqual(lags.loc["2023-04-04", "Sales 1YA"], self.value("2022-04-04"))
+        self.assertEqual(lags.loc["2024-04-04", "Sales 1YA"], self.value("2022-04-04"))
+        self.assertEqual(lags.loc["2024-04-04", "Sales 3YA"], self.value("2020-04-04"))
+        self.assertEqual(lags.loc["2022-06-01", "Sales 1YA"], self.value("2021-06-01"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.featurestore import FeatureStore
+from features.lags import LagEngine
+from features.lagtable import LagTable
+from features.rolling import RollingSales
+
+import numpy as np
+import pandas as pd
+
+
+class TestLagTable(unittest.TestCase):
+    """TestLagTable is a test case for the LagTable class."""
+
+    def setUp(self):
+        rng = np.random.default_rng(18)
+        dates = pd.date_range("2019-01-01", "2022-12-31", name="Order Date")
+        # a history with missing days, as the sales of a rare category
+        dates = dates[rng.random(len(dates)) < 0.7]
+        self.features = pd.DataFrame(
+            rng.random((len(dates), 6)),
+            index=dates,
+            columns=["total_sales", "S1", "S2", "S3", "month", "day"],
+        )
+
+    def test_lags_match_lag_engine(self):
+        """Test that the lags read at the day offsets are the lags of the LagEngine"""
+        lag_table = LagTable.from_features(self.features)
+        self.assertEqual(lag_table.feature_columns, ["day", "month"])
+        dates = pd.date_range("2023-01-01", "2024-12-31")
+        engine = LagEngine(self.features, LagTable.TARGETS)
+        for anchored in (True, False):
+            pd.testing.assert_frame_equal(
+                lag_table.lags(dates, anchored=anchored, columns=LagTable.TARGETS),
+                engine.lags(dates, anchored=anchored),
+            )
+
+    def test_store_round_trip(self):
+        """Test that the lag table is read back from the FeatureStore with its feature names"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = FeatureStore(tmp_dir)
+            store.put(LagTable.key("train"), LagTable.from_features(self.features).to_frame())
+            lag_table = LagTable.from_frame(store.get(LagTable.key("train")))
+        self.assertEqual(lag_table.feature_columns, ["day", "month"])
+        frame = lag_table.to_frame()
+        pd.testing.assert_frame_equal(
+            frame[LagTable.TARGETS].dropna(), self.features[LagTable.TARGETS]
+        )
+        rolling = RollingSales()
+        rolling.update(self.features["total_sales"])
+        pd.testing.assert_frame_equal(
+            frame[RollingSales.COLUMNS], rolling.features, check_freq=False
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.featureengineering import FeatureEngineering
+from features.panelfeatureengineering import PanelFeatureEngineering
+
+import numpy as np
+import pandas as pd
+
+
+class TestPanelFeatureEngineering(unittest.TestCase):
+    """TestPanelFeatureEngineering is a test case for the PanelFeatureEngineering class.
+    The features of every entity must be the features FeatureEngineering builds for it alone.
+    """
+
+    STATES = ["CA", "NY", "TX"]
+
+    def setUp(self):
+        rng = np.random.default_rng(17)
+        dates = pd.date_range("2019-01-01", "2022-12-31")
+        rows = len(dates) * 6
+        self.data = pd.DataFrame(
+            {
+                "Order Date": dates[np.arange(rows) % len(dates)],
+                "Shipping Address State": np.array(self.STATES)[
+                    (np.arange(rows) // len(dates)) % len(self.STATES)
+                ],
+                "Category": rng.choice(["A", "B", "C", "D"], rows),
+                "total_sales": rng.uniform(1, 100, rows),
+            }
+        ).set_index("Order Date")
+        self.holidays_2021 = pd.DataFrame(
+            {"holiday": True}, index=pd.DatetimeIndex(["2022-01-17", "2023-07-04"])
+        )
+        self.events = pd.DataFrame(
+            {"Amazon Events": ["Prime Day", "Prime Day", "Black Friday"]},
+            index=pd.DatetimeIndex(
+                ["2021-06-21", "2022-07-12", "2022-11-25"], name="Event Date"
+            ),
+        )
+        self.holidays = pd.DataFrame(
+            {"Date": ["2019-07-04", "2021-12-24"], "Holiday": ["Independence Day", "Christmas Day"]}
+        )
+
+    def entity_features(self, state):
+        """entity_features returns the FeatureEngineering training features of a state."""
+        return FeatureEngineering(
+            self.data[self.data["Shipping Address State"] == state],
+            self.holidays_2021,
+            self.events,
+            holidays=self.holidays.copy(),
+            state_forcast=True,
+        ).output()
+
+    def test_matches_feature_engineering(self):
+        """Test that the training and forecast features of every state match FeatureEngineering"""
+        features = {state: self.entity_features(state) for state in self.STATES}
+        components = pd.concat(
+            {state: df[["S1", "S2", "S3"]] for state, df in features.items()}
+        )
+        panel = PanelFeatureEngineering(
+            self.data,
+            self.holidays_2021,
+            self.events,
+            holidays=self.holidays,
+            components=components,
+        )
+        self.assertEqual(
+            list(panel.output().index.names), ["Shipping Address State", "Order Date"]
+        )
+        for state in self.STATES:
+            pd.testing.assert_frame_equal(
+                panel.entity(state), features[state], check_dtype=False, check_names=False
+            )
+
+        forecast = PanelFeatureEngineering(
+            panel.output(),
+            self.holidays_2021,
+            self.events,
+            start="2023-01-01",
+            end="2023-12-31",
+            is_train=False,
+        )
+        for state in self.STATES:
+            expected = FeatureEngineering(
+                features[state],
+                self.holidays_2021,
+                self.events,
+                start="2023-01-01",
+                end="2023-12-31",
+                is_train=False,
+            ).output()
+            pd.testing.assert_frame_equal(
+                forecast.entity(state), expected, check_dtype=False, check_names=False
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
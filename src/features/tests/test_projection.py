@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.projection import SalesProjection
+
+import numpy as np
+import pandas as pd
+
+
+def sample_pivot(start, days, seed, weights=(1.0, 2.0, 3.0, 4.0, 5.0)):
+    """sample_pivot returns random daily sales by state, scaled by the weights."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        rng.random((days, len(weights))) * np.asarray(weights) * 100,
+        index=pd.date_range(start, periods=days, name="Order Date"),
+        columns=["CA", "FL", "NY", "TX", "WA"],
+    )
+
+
+class TestSalesProjection(unittest.TestCase):
+    """TestSalesProjection is a test case for the SalesProjection class."""
+
+    def test_update_projects_new_days_only(self):
+        """Test that new days are projected on the saved basis while it has not drifted"""
+        pivot = sample_pivot("2020-01-01", 700, seed=1)
+        projection = SalesProjection()
+        first = projection.transform(pivot).copy()
+        new_days = sample_pivot("2021-12-01", 30, seed=2)
+        features = projection.transform(pd.concat([pivot, new_days]))
+
+        self.assertEqual(projection.refits, 1)
+        pd.testing.assert_frame_equal(features.loc[pivot.index], first)
+        np.testing.assert_allclose(
+            features.loc[new_days.index].to_numpy(),
+            projection.pca.transform(projection.scale(new_days)),
+        )
+        self.assertLess(projection.drift(), SalesProjection.DRIFT_DEGREES)
+
+    def test_refit_on_drift(self):
+        """Test that the basis is refitted once new days have drifted it"""
+        pivot = sample_pivot("2020-01-01", 100, seed=1)
+        projection = SalesProjection()
+        projection.transform(pivot)
+        drifted = sample_pivot("2020-04-10", 400, seed=3, weights=(50, 1, 1, 1, 1))
+        projection.transform(pd.concat([pivot, drifted]))
+        self.assertEqual(projection.refits, 2)
+
+    def test_refit_on_changed_days(self):
+        """Test that a replaced day is projected again from its new sales"""
+        pivot = sample_pivot("2020-01-01", 700, seed=1)
+        projection = SalesProjection()
+        first = projection.transform(pivot).copy()
+        self.assertFalse(projection.update(pivot))
+
+        changed = pivot.copy()
+        day = pivot.index[-1]
+        changed.loc[day] = changed.loc[day] * 3
+        features = projection.transform(changed)
+
+        self.assertEqual(projection.refits, 2)
+        self.assertFalse(np.allclose(features.loc[day], first.loc[day]))
+        np.testing.assert_allclose(
+            features.to_numpy(), projection.pca.transform(projection.scale(changed))
+        )
+
+    def test_save_and_load(self):
+        """Test that a saved projection is loaded back with its projected days"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "CA_projection.joblib")
+            with mock.patch.object(SalesProjection, "path", return_value=path):
+                self.assertIsNone(SalesProjection.load("CA"))
+                projection = SalesProjection("CA")
+                projection.transform(sample_pivot("2020-01-01", 50, seed=1))
+                projection.save()
+                loaded = SalesProjection.load("CA")
+        pd.testing.assert_frame_equal(loaded.projected, projection.projected)
+        self.assertEqual(loaded.entity_name, "CA")
+
+
+if __name__ == "__main__":
+    unittest.main()
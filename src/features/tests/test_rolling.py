@@ -0,0 +1,54 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.rolling import RollingSales
+
+import numpy as np
+import pandas as pd
+
+
+class TestRollingSales(unittest.TestCase):
+    """TestRollingSales is a test case for the RollingSales class."""
+
+    def setUp(self):
+        rng = np.random.default_rng(20)
+        dates = pd.date_range("2020-01-01", periods=400, name="Order Date")
+        # days without sales count as 0
+        self.sales = pd.Series(rng.random(400) * 100, index=dates)[rng.random(400) < 0.8]
+        daily = self.sales.reindex(
+            pd.date_range(self.sales.index[0], self.sales.index[-1]), fill_value=0
+        )
+        self.expected = pd.concat(
+            [daily.rolling(window).mean() for window in RollingSales.WINDOWS]
+            + [daily.rolling(window).sum() for window in RollingSales.WINDOWS]
+            + [daily.ewm(span=span, adjust=False).mean() for span in RollingSales.SPANS],
+            axis=1,
+            keys=RollingSales.COLUMNS,
+        )
+
+    def test_features(self):
+        """Test that the features are the pandas rolling and ewm features of the daily sales"""
+        rolling = RollingSales()
+        self.assertTrue(rolling.update(self.sales))
+        np.testing.assert_allclose(rolling.features, self.expected, rtol=1e-9, atol=1e-9)
+
+    def test_incremental_update(self):
+        """Test that advancing by new days gives the features of the full history, without computing it again"""
+        rolling = RollingSales()
+        rolling.update(self.sales.iloc[:100])
+        for end in (101, 250, len(self.sales)):
+            self.assertFalse(rolling.update(self.sales.iloc[:end]))
+        self.assertEqual(rolling.refits, 1)
+        np.testing.assert_allclose(rolling.features, self.expected, rtol=1e-9, atol=1e-9)
+
+        changed = self.sales.copy()
+        changed.iloc[10] += 1
+        self.assertTrue(rolling.update(changed))
+        self.assertEqual(rolling.refits, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
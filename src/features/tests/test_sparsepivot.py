@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.projection import SalesProjection
+from features.sparsepivot import SparsePivot
+
+import numpy as np
+import pandas as pd
+
+
+def wide_sales(days=400, categories=800, seed=5):
+    """wide_sales returns daily sales by category where most categories sell on few days."""
+    rng = np.random.default_rng(seed)
+    rows = days * 6
+    dates = pd.date_range("2020-01-01", periods=days, name="Order Date")
+    sales = pd.DataFrame(
+        {
+            "Order Date": dates[rng.integers(0, days, rows)],
+            "Category": [f"CAT_{i}" for i in rng.zipf(1.3, rows) % categories],
+            "total_sales": rng.random(rows) * 100,
+        }
+    )
+    return sales.groupby(["Order Date", "Category"])["total_sales"].sum()
+
+
+class TestSparsePivot(unittest.TestCase):
+    """TestSparsePivot is a test case for the SparsePivot class and the sparse SalesProjection."""
+
+    def test_from_sales(self):
+        """Test that the sparse pivot holds the same values as the dense pivot"""
+        sales = wide_sales(days=50, categories=30)
+        pivot = SparsePivot.from_sales(sales)
+        dense = sales.unstack(fill_value=0)
+        np.testing.assert_array_equal(pivot.matrix.toarray(), dense.to_numpy())
+        self.assertTrue(pivot.index.equals(dense.index))
+        np.testing.assert_array_equal(
+            pivot.reindex_columns(["CAT_9", "NEW", "CAT_1"]).toarray(),
+            dense.reindex(columns=["CAT_9", "NEW", "CAT_1"], fill_value=0).to_numpy(),
+        )
+
+    def test_projection_matches_dense(self):
+        """Test that the sparse projection gives the dense S1, S2 and S3 up to their sign"""
+        sales = wide_sales()
+        dense = SalesProjection().transform(sales.unstack(fill_value=0))
+        pivot = SparsePivot.from_sales(sales)
+        self.assertGreater(pivot.shape[1], 100)
+        projection = SalesProjection()
+        reduced = projection.transform(pivot)
+        for component in SalesProjection.COMPONENTS:
+            sign = np.sign(np.dot(reduced[component], dense[component]))
+            np.testing.assert_allclose(
+                reduced[component] * sign, dense[component], rtol=1e-5, atol=1e-8
+            )
+
+        new_days = SparsePivot(
+            pivot.matrix[:20],
+            pd.date_range(pivot.index[-1] + pd.Timedelta(days=1), periods=20),
+            pivot.columns,
+        )
+        self.assertFalse(projection.update(new_days))
+        self.assertEqual(len(projection.projected), len(pivot) + len(new_days))
+        self.assertEqual(projection.refits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
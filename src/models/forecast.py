@@ -1,3 +1,7 @@
+import json
+import os
+import uuid
+
 from sklearn.model_selection import TimeSeriesSplit
 import xgboost as xgb
 from catboost import CatBoostRegressor
@@ -5,7 +9,8 @@ from sklearn.metrics import mean_squared_error
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import os
+
+from utilis.utilities import resolve_path
 
 
 class SalesForecaster:
@@ -13,6 +18,18 @@ class SalesForecaster:
     It also provides methods for cross-validation and feature importance extraction.
     """
 
+    # targets and PCA components of the training data, which are not features
+    TARGETS = ["total_sales", "S1", "S2", "S3"]
+
+    # incremental training: rounds and trees added by a warm start, and the days of history it replays
+    WARM_ROUNDS = 40
+    WARM_TREES = 100
+    REPLAY_DAYS = 365
+    # a full refit is forced when the days added since the last full refit exceed this fraction of
+    # its days, or after this many warm starts in a row
+    MAX_NEW_FRACTION = 0.1
+    MAX_INCREMENTS = 30
+
     def __init__(self, entity_name=""):
         """__init__ initializes the SalesForecaster class with empty models list and loads pre-trained models if available.
         It also sets the entity name for the model, if provided.
@@ -24,22 +41,30 @@ class SalesForecaster:
         self.models = []
         self.models.append(xgb.XGBRegressor())
         self.models.append(CatBoostRegressor())
-        models_path = os.path.join(os.getcwd(), "models", "saves")
-        if not "src" in models_path:
-            models_path = os.path.join(os.getcwd(), "src", "models", "saves")
-        if not entity_name == "":
-            entity_name = f"{entity_name}_"
+        xgb_path, cat_path = self.model_paths(entity_name)
         try:
-            self.models[0].load_model(
-                os.path.join(models_path, f"{entity_name}xgb.json")
-            )
-            self.models[1].load_model(
-                os.path.join(models_path, f"{entity_name}cat.cbm")
-            )
+            self.models[0].load_model(xgb_path)
+            self.models[1].load_model(cat_path)
         except Exception as e:
             print(f"Error loading model: {e}")
             self.models = []
 
+    @staticmethod
+    def model_paths(entity_name=""):
+        """model_paths returns the files the XGBoost and CatBoost models of an entity are saved to.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to ''.
+
+        Returns:
+            _type_: tuple: paths of the XGBoost and CatBoost models
+        """
+        prefix = "" if entity_name == "" else f"{entity_name}_"
+        return (
+            resolve_path("models", "saves", f"{prefix}xgb.json"),
+            resolve_path("models", "saves", f"{prefix}cat.cbm"),
+        )
+
     def is_trained(self):
         """is_trained checks if the model has been trained by checking if the models list is empty.
         If the list is not empty, it means the model has been trained and loaded successfully.
@@ -56,9 +81,27 @@ class SalesForecaster:
             _type_: list: list of feature columns to be used for training the model.
         """
 
-        salesdf_columns = list(df.columns)
-        [salesdf_columns.remove(column) for column in ["total_sales", "S1", "S2", "S3"]]
-        return sorted(salesdf_columns)
+        return sorted(column for column in df.columns if column not in self.TARGETS)
+
+    def model_feature_names(self):
+        """model_feature_names returns the names of the features each loaded model was trained on, in their order.
+
+        Returns:
+            _type_: tuple: feature names of the XGBoost and CatBoost models.
+        """
+        return (
+            list(self.models[0].get_booster().feature_names),
+            list(self.models[1].feature_names_),
+        )
+
+    def feature_names(self):
+        """feature_names returns the names of the features the loaded models need, see FeatureEngineering.FEATURES.
+
+        Returns:
+            _type_: list: feature names used by either model.
+        """
+        xgb_names, cat_names = self.model_feature_names()
+        return xgb_names + [name for name in cat_names if name not in xgb_names]
 
     def cross_validate(self, df, forcastdf, salesdf_columns):
         """cross_validate performs cross-validation on the given dataframe using TimeSeriesSplit.
@@ -126,43 +169,145 @@ class SalesForecaster:
 
         return preds, scores, feature_importances
 
-    def train(self, df, entity_name=""):
-        """train trains the XGBoost and CatBoost models on the given dataframe.
-        It also saves the trained models to disk.
+    def xgb_regressor(self, n_estimators, n_threads=None):
+        """xgb_regressor returns an untrained XGBoost model with the parameters of the forecasts.
 
         Args:
-            df (_type_): full dataframe to train the model on.
-            entity_name (str, optional): state or category to forecast. Defaults to ''.
-        """
-
-        salesdf_columns = self.get_feature_columns(df)
-        X_train = df[salesdf_columns]
-        y_train = df["total_sales"]
+            n_estimators (_type_): boosting rounds
+            n_threads (int, optional): threads of the model, every core if None. Defaults to None.
 
-        xgb_model = xgb.XGBRegressor(
+        Returns:
+            _type_: XGBRegressor: the model
+        """
+        return xgb.XGBRegressor(
             base_score=0.5,
             booster="gblinear",
-            n_estimators=400,
+            n_estimators=n_estimators,
             early_stopping_rounds=50,
             objective="reg:squarederror",
             learning_rate=0.01,
             reg_alph= 0, 
-            reg_lambda= 0
+            reg_lambda= 0,
+            n_jobs=n_threads,
         )
 
-        cat_model = CatBoostRegressor(
+    def cat_regressor(self, n_estimators, n_threads=None):
+        """cat_regressor returns an untrained CatBoost model with the parameters of the forecasts.
+
+        Args:
+            n_estimators (_type_): trees
+            n_threads (int, optional): threads of the model, every core if None. Defaults to None.
+
+        Returns:
+            _type_: CatBoostRegressor: the model
+        """
+        return CatBoostRegressor(
             depth=3,
             l2_leaf_reg=2,
             learning_rate=0.01,
-            n_estimators=1000,
+            n_estimators=n_estimators,
             silent=True,
+            thread_count=-1 if n_threads is None else n_threads,
         )
 
+    @staticmethod
+    def meta_path(entity_name=""):
+        """meta_path returns the file the training metadata of an entity is saved to, next to its models."""
+        xgb_path, _ = SalesForecaster.model_paths(entity_name)
+        return xgb_path[: -len("xgb.json")] + "meta.json"
+
+    @staticmethod
+    def load_meta(entity_name=""):
+        """load_meta reads the training metadata of an entity, None if there is none."""
+        try:
+            with open(SalesForecaster.meta_path(entity_name)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def history_hash(y):
+        """history_hash returns a hash of the sales of the trained days, to detect history changed after training."""
+        return str(int(pd.util.hash_pandas_object(y, index=True).sum()))
+
+    def refit_reason(self, df, meta):
+        """refit_reason returns why the models of an entity have to be trained from scratch on the given
+        dataframe instead of continuing from the saved models, None if they can be warm started.
+
+        Args:
+            df (_type_): full dataframe to train the model on, indexed by Order Date
+            meta (_type_): training metadata of the saved models, see load_meta
+
+        Returns:
+            _type_: str: reason of the full refit, None for a warm start
+        """
+        if not self.is_trained() or meta is None:
+            return "no saved models"
+        if self.get_feature_columns(df) != meta["features"]:
+            return "the features changed"
+        trained = df.index <= pd.Timestamp(meta["trained_until"])
+        if trained.sum() != meta["rows"] or self.history_hash(
+            df.loc[trained, "total_sales"]
+        ) != meta["history_hash"]:
+            return "the sales of trained days changed"
+        if len(df) - meta["refit_rows"] > self.MAX_NEW_FRACTION * meta["refit_rows"]:
+            return "too many days since the last full refit"
+        if meta["increments"] >= self.MAX_INCREMENTS:
+            return "too many warm starts since the last full refit"
+        return None
+
+    def train(self, df, entity_name="", n_threads=None, incremental=False):
+        """train trains the XGBoost and CatBoost models on the given dataframe.
+        It also saves the trained models to disk, with their training metadata.
+
+        In incremental mode, the saved models continue training on the days appended since they were
+        trained, with the last REPLAY_DAYS of history so a few new days do not pull the models toward
+        them, for WARM_ROUNDS more XGBoost rounds and WARM_TREES more CatBoost trees. The models are
+        trained from scratch instead when refit_reason gives a reason.
+
+        Args:
+            df (_type_): full dataframe to train the model on.
+            entity_name (str, optional): state or category to forecast. Defaults to ''.
+            n_threads (int, optional): threads of each model, set when models are trained in parallel
+            processes so they do not oversubscribe the cores. Every core if None. Defaults to None.
+            incremental (bool, optional): warm start from the saved models. Defaults to False.
+
+        Returns:
+            _type_: bool: whether the models were trained, False when they are up to date
+        """
+
+        salesdf_columns = self.get_feature_columns(df)
+        meta = self.load_meta(entity_name) if incremental else None
+        reason = self.refit_reason(df, meta) if incremental else "full training"
+        if reason is None:
+            trained_until = pd.Timestamp(meta["trained_until"])
+            if not (df.index > trained_until).any():
+                print(f"Model of {entity_name!r} is up to date.")
+                return False
+            print(f"Warm starting the model of {entity_name!r}")
+            window = df[df.index > trained_until - pd.Timedelta(days=self.REPLAY_DAYS)]
+            X_train = window[salesdf_columns]
+            y_train = window["total_sales"]
+            xgb_model = self.xgb_regressor(self.WARM_ROUNDS, n_threads)
+            cat_model = self.cat_regressor(self.WARM_TREES, n_threads)
+            init_models = self.models
+            meta["increments"] += 1
+        else:
+            if incremental:
+                print(f"Full refit of the model of {entity_name!r}: {reason}")
+            X_train = df[salesdf_columns]
+            y_train = df["total_sales"]
+            xgb_model = self.xgb_regressor(400, n_threads)
+            cat_model = self.cat_regressor(1000, n_threads)
+            init_models = [None, None]
+            meta = {"refit_rows": len(df), "increments": 0}
+
         xgb_model.fit(
             X_train,
             y_train,
             eval_set=[(X_train[salesdf_columns], y_train)],
             verbose=False,
+            xgb_model=None if init_models[0] is None else init_models[0].get_booster(),
         )
 
         cat_model.fit(
@@ -170,19 +315,32 @@ class SalesForecaster:
             y_train,
             early_stopping_rounds=50,
             verbose=False,
+            init_model=init_models[1],
+        )
+        self.models = [xgb_model, cat_model]
+        xgb_path, cat_path = self.model_paths(entity_name)
+        print("saves: ", xgb_path)
+        xgb_model.save_model(xgb_path)
+        cat_model.save_model(cat_path)
+
+        trained_until = df.index.max()
+        meta.update(
+            features=salesdf_columns,
+            trained_until=str(trained_until),
+            rows=len(df),
+            history_hash=self.history_hash(df["total_sales"]),
         )
-        self.models.append(xgb_model)
-        self.models.append(cat_model)
-        save_file_name = "" if entity_name == "" else f"{entity_name}_"
-        save_path = os.path.join(os.getcwd(), "models", "saves")
-        if not "src" in save_path:
-            save_path = os.path.join(os.getcwd(), "src", "models", "saves")
-        print("saves: ", os.path.join(save_path, f"{save_file_name}xgb.json"))
-        xgb_model.save_model(os.path.join(save_path, f"{save_file_name}xgb.json"))
-        cat_model.save_model(os.path.join(save_path, f"{save_file_name}cat.cbm"))
+        # written to a file of this training and swapped in, readers never see a partial file
+        meta_path = self.meta_path(entity_name)
+        temp_path = f"{meta_path}.{uuid.uuid4().hex[:12]}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(meta, file)
+        os.replace(temp_path, meta_path)
+        return True
 
     def predict(self, df):
         """predict predicts the sales using the trained models on the given dataframe.
+        Each model reads the features it was trained on, in their order.
         It returns the predictions from both models.
 
         Args:
@@ -191,11 +349,9 @@ class SalesForecaster:
         Returns:
             _type_: tuple: predictions from XGBoost and CatBoost models.
         """
-        salesdf_columns = sorted(df.columns)
-        X_test = df[salesdf_columns]
-
-        xgb_preds = self.models[0].predict(X_test)
-        cat_preds = self.models[1].predict(X_test)
+        xgb_names, cat_names = self.model_feature_names()
+        xgb_preds = self.models[0].predict(df[xgb_names])
+        cat_preds = self.models[1].predict(df[cat_names])
         return xgb_preds, cat_preds
 
     def get_feature_importance(self):
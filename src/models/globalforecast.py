@@ -0,0 +1,162 @@
+import json
+import os
+
+import xgboost as xgb
+from catboost import CatBoostRegressor
+import pandas as pd
+
+from utilis.utilities import resolve_path
+
+
+class GlobalSalesForecaster:
+    """GlobalSalesForecaster trains one XGBoost and one CatBoost model on the stacked features of
+    every state, or of every category, built by PanelFeatureEngineering, with the entity as a
+    categorical feature. Any entity of the panel is forecast by the same pair of models, so the
+    number of training runs, model files and loaded models does not grow with the entities.
+    The names of the entities and the features are saved with the models.
+    """
+
+    # categorical feature of the entity
+    ENTITY = "entity"
+    TARGETS = ["total_sales", "S1", "S2", "S3"]
+
+    # loaded forecasters by kind, with the signature of their files
+    cache = {}
+
+    def __init__(self, is_state=True):
+        """__init__ loads the global models of the states or of the categories if they are saved.
+
+        Args:
+            is_state (bool, optional): whether the entities are the states or the categories. Defaults to True.
+        """
+        self.is_state = is_state
+        self.models = []
+        self.entities = []
+        self.feature_columns = []
+        xgb_path, cat_path, meta_path = self.model_paths(is_state)
+        try:
+            with open(meta_path) as file:
+                meta = json.load(file)
+            models = [xgb.XGBRegressor(), CatBoostRegressor()]
+            models[0].load_model(xgb_path)
+            models[1].load_model(cat_path)
+            self.models = models
+            self.entities = meta["entities"]
+            self.feature_columns = meta["features"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading global model: {e}")
+
+    @staticmethod
+    def model_paths(is_state=True):
+        """model_paths returns the files the XGBoost and CatBoost models, and the names of the entities and
+        features, of the global model of the states or of the categories are saved to."""
+        kind = "states" if is_state else "categories"
+        return tuple(
+            resolve_path("models", "saves", f"global_{kind}_{file_name}")
+            for file_name in ["xgb.json", "cat.cbm", "meta.json"]
+        )
+
+    @classmethod
+    def signature(cls, is_state=True):
+        """signature returns the size and modification time of the files of a global model, None if one is missing."""
+        try:
+            return tuple(
+                (stat.st_size, stat.st_mtime_ns)
+                for stat in map(os.stat, cls.model_paths(is_state))
+            )
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def cached(cls, is_state=True):
+        """cached returns the global forecaster of the states or of the categories, loading it only once per
+        process and again when its files change."""
+        signature = cls.signature(is_state)
+        entry = cls.cache.get(is_state)
+        if entry is None or entry[0] != signature:
+            entry = (signature, cls(is_state))
+            cls.cache[is_state] = entry
+        return entry[1]
+
+    def is_trained(self):
+        """is_trained checks if the global models have been loaded or trained."""
+        return not len(self.models) == 0
+
+    def get_feature_columns(self, df):
+        """get_feature_columns returns the feature columns of the panel, the entity last."""
+        return sorted(
+            column for column in df.columns if column not in self.TARGETS
+        ) + [self.ENTITY]
+
+    def features(self, df):
+        """features returns the model inputs of a panel of features indexed by entity and Order Date, the
+        entity as a categorical of the entities the models were trained on.
+
+        Args:
+            df (_type_): features indexed by entity and Order Date
+
+        Returns:
+            _type_: DataFrame: inputs of the models
+        """
+        X = df.reindex(columns=[c for c in self.feature_columns if c != self.ENTITY])
+        X[self.ENTITY] = pd.Categorical(
+            df.index.get_level_values(0).astype(str), categories=self.entities
+        )
+        return X
+
+    def train(self, df, n_threads=None):
+        """train trains the global XGBoost and CatBoost models on the panel and saves them to disk.
+
+        Args:
+            df (_type_): training output of PanelFeatureEngineering, indexed by entity and Order Date
+            n_threads (int, optional): threads of each model, every core if None. Defaults to None.
+        """
+        self.entities = sorted(df.index.get_level_values(0).astype(str).unique())
+        self.feature_columns = self.get_feature_columns(df)
+        X_train = self.features(df)
+        y_train = df["total_sales"]
+
+        # gblinear has no categorical support, the global model uses histogram trees
+        xgb_model = xgb.XGBRegressor(
+            base_score=0.5,
+            tree_method="hist",
+            enable_categorical=True,
+            n_estimators=400,
+            max_depth=6,
+            objective="reg:squarederror",
+            learning_rate=0.05,
+            n_jobs=n_threads,
+        )
+        cat_model = CatBoostRegressor(
+            depth=6,
+            l2_leaf_reg=2,
+            learning_rate=0.05,
+            n_estimators=1000,
+            silent=True,
+            cat_features=[self.ENTITY],
+            thread_count=-1 if n_threads is None else n_threads,
+        )
+        xgb_model.fit(X_train, y_train, verbose=False)
+        cat_model.fit(X_train, y_train, verbose=False)
+        self.models = [xgb_model, cat_model]
+
+        xgb_path, cat_path, meta_path = self.model_paths(self.is_state)
+        print("saves: ", xgb_path)
+        xgb_model.save_model(xgb_path)
+        cat_model.save_model(cat_path)
+        with open(meta_path, "w") as file:
+            json.dump({"entities": self.entities, "features": self.feature_columns}, file)
+
+    def predict(self, df):
+        """predict predicts the sales of the rows of a panel of forecast features.
+
+        Args:
+            df (_type_): forecast output of PanelFeatureEngineering, indexed by entity and Order Date
+
+        Returns:
+            _type_: tuple: predictions from XGBoost and CatBoost models.
+        """
+        X_test = self.features(df)
+        return self.models[0].predict(X_test), self.models[1].predict(X_test)
@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+
+from models.forecast import SalesForecaster
+
+
+class ModelRegistry:
+    """ModelRegistry keeps the loaded SalesForecaster of recently forecast entities in memory, so
+    repeated forecasts of an entity do not load its XGBoost and CatBoost models again. The
+    registry holds at most max_models entities and, if set, max_bytes of models, measured by
+    the size of their files, evicting the least recently used first. Whether an entity is
+    trained is checked with a stat of its model files, and an entry is loaded again when the
+    size or modification time of its files changes, e.g. after the entity is retrained.
+    The registry is shared by the threads of the app sessions, its entries are read and written
+    under a lock, and an entity is loaded once even when several threads ask for it together.
+    """
+
+    MAX_MODELS = 64
+    MAX_BYTES = None
+
+    shared_registry = None
+    shared_lock = threading.Lock()
+
+    def __init__(self, max_models=MAX_MODELS, max_bytes=MAX_BYTES):
+        """__init__ initializes an empty registry.
+
+        Args:
+            max_models (int, optional): number of entities kept in memory. Defaults to MAX_MODELS.
+            max_bytes (_type_, optional): size of the model files kept in memory, no limit if None.
+            Defaults to MAX_BYTES.
+        """
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        # entity name -> (file signature, SalesForecaster), least recently used first
+        self.entries = OrderedDict()
+        self.loads = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def shared(cls):
+        """shared returns the registry of the process, creating it on first use."""
+        if cls.shared_registry is None:
+            with cls.shared_lock:
+                if cls.shared_registry is None:
+                    cls.shared_registry = cls()
+        return cls.shared_registry
+
+    @staticmethod
+    def signature(entity_name=""):
+        """signature returns the size and modification time of the model files of an entity.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to ''.
+
+        Returns:
+            _type_: tuple: size and modification time of every file, None if a file is missing
+        """
+        try:
+            return tuple(
+                (stat.st_size, stat.st_mtime_ns)
+                for stat in map(os.stat, SalesForecaster.model_paths(entity_name))
+            )
+        except FileNotFoundError:
+            return None
+
+    def is_trained(self, entity_name=""):
+        """is_trained checks if the models of an entity are saved, without loading them."""
+        return self.signature(entity_name) is not None
+
+    def size(self):
+        """size returns the size of the model files of the entities in memory."""
+        with self.lock:
+            return sum(
+                file_size
+                for signature, _ in self.entries.values()
+                for file_size, _ in signature
+            )
+
+    def get(self, entity_name=""):
+        """get returns the loaded SalesForecaster of an entity, loading it if it is not in memory or if its
+        files have changed since it was loaded.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to ''.
+
+        Returns:
+            _type_: SalesForecaster: the trained forecaster, None if the entity is not trained
+        """
+        signature = self.signature(entity_name)
+        with self.lock:
+            if signature is None:
+                self.invalidate(entity_name)
+                return None
+            entry = self.entries.get(entity_name)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(entity_name)
+                return entry[1]
+            forecaster = SalesForecaster(entity_name)
+            self.loads += 1
+            if not forecaster.is_trained():
+                self.invalidate(entity_name)
+                return None
+            self.entries[entity_name] = (signature, forecaster)
+            self.entries.move_to_end(entity_name)
+            self.evict()
+            return forecaster
+
+    def evict(self):
+        """evict drops the least recently used entities until the registry is within its budget,
+        keeping at least the most recent one."""
+        with self.lock:
+            while len(self.entries) > 1 and (
+                len(self.entries) > self.max_models
+                or (self.max_bytes is not None and self.size() > self.max_bytes)
+            ):
+                self.entries.popitem(last=False)
+
+    def invalidate(self, entity_name=None):
+        """invalidate drops an entity from memory, every entity if None."""
+        with self.lock:
+            if entity_name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(entity_name, None)
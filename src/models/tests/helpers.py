@@ -0,0 +1,30 @@
+import os
+import tempfile
+from unittest import mock
+
+from models.forecast import SalesForecaster
+
+
+def patch_model_paths(test_case):
+    """patch_model_paths saves the SalesForecaster models of a test case to a temporary directory,
+    removed with the patch when the test case is cleaned up.
+
+    Args:
+        test_case (_type_): unittest.TestCase the patch is started for
+
+    Returns:
+        _type_: str: path of the temporary directory
+    """
+    tmp_dir = tempfile.TemporaryDirectory()
+    test_case.addCleanup(tmp_dir.cleanup)
+    patcher = mock.patch.object(
+        SalesForecaster,
+        "model_paths",
+        side_effect=lambda entity_name="": (
+            os.path.join(tmp_dir.name, f"{entity_name}_xgb.json"),
+            os.path.join(tmp_dir.name, f"{entity_name}_cat.cbm"),
+        ),
+    )
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return tmp_dir.name
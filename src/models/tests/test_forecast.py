@@ -5,6 +5,10 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 from models.forecast import SalesForecaster
+from models.tests.helpers import patch_model_paths
+
+import numpy as np
+import pandas as pd
 
 class TestSalesForecaster(unittest.TestCase):
     """TestSalesForecaster is a test case for the SalesForecaster class.
@@ -24,8 +28,71 @@ class TestSalesForecaster(unittest.TestCase):
             # Assuming that the model is not trained yet
             sales_forecaster = SalesForecaster(entity_name="dummy_entity")
             sales_forecaster.get_feature_importance()
-            
+
+
+class TestIncrementalTraining(unittest.TestCase):
+    """TestIncrementalTraining is a test case for the warm start of SalesForecaster.train."""
+
+    def setUp(self):
+        self.tmp_dir = patch_model_paths(self)
+        rng = np.random.default_rng(25)
+        dates = pd.date_range("2020-01-01", periods=1200, name="Order Date")
+        self.df = pd.DataFrame(
+            {"dayofweek": dates.dayofweek, "month": dates.month, "Sales 1YA": rng.random(1200)},
+            index=dates,
+        )
+        self.df["total_sales"] = 10 * self.df["dayofweek"] + rng.random(1200)
+
+    def train(self, df):
+        """train warm starts the models of CA from their saved files, and returns their training metadata."""
+        SalesForecaster("CA").train(df, entity_name="CA", n_threads=1, incremental=True)
+        return SalesForecaster.load_meta("CA")
+
+    def test_warm_start(self):
+        """Test that new days warm start the saved models, and that a refit is forced when it is due"""
+        meta = self.train(self.df.iloc[:1000])
+        self.assertEqual((meta["refit_rows"], meta["increments"]), (1000, 0))
+        self.assertEqual(SalesForecaster("CA").models[1].tree_count_, 1000)
+
+        meta = self.train(self.df.iloc[:1030])
+        self.assertEqual((meta["refit_rows"], meta["increments"], meta["rows"]), (1000, 1, 1030))
+        self.assertEqual(meta["trained_until"], str(self.df.index[1029]))
+        model = SalesForecaster("CA")
+        self.assertEqual(model.models[1].tree_count_, 1000 + SalesForecaster.WARM_TREES)
+        xgb_preds, _ = model.predict(self.df.iloc[1030:])
+        self.assertLess(np.abs(xgb_preds - self.df["total_sales"].iloc[1030:]).mean(), 10)
+
+        # no new days, nothing is trained
+        signature = os.stat(SalesForecaster.model_paths("CA")[1]).st_mtime_ns
+        self.train(self.df.iloc[:1030])
+        self.assertEqual(os.stat(SalesForecaster.model_paths("CA")[1]).st_mtime_ns, signature)
+
+        # more days since the last full refit than MAX_NEW_FRACTION of its days
+        self.assertEqual(self.train(self.df)["increments"], 0)
+        self.assertEqual(
+            sorted(os.listdir(self.tmp_dir)), ["CA_cat.cbm", "CA_meta.json", "CA_xgb.json"]
+        )
+
+    def test_refit_reason(self):
+        """Test the reasons of a full refit"""
+        self.train(self.df.iloc[:1000])
+        model = SalesForecaster("CA")
+        meta = SalesForecaster.load_meta("CA")
+        self.assertIsNone(model.refit_reason(self.df.iloc[:1010], meta))
+        self.assertEqual(SalesForecaster("NY").refit_reason(self.df, None), "no saved models")
+        changed = self.df.iloc[:1010].copy()
+        changed.iloc[5, changed.columns.get_loc("total_sales")] += 1
+        self.assertEqual(model.refit_reason(changed, meta), "the sales of trained days changed")
+        self.assertEqual(
+            model.refit_reason(self.df.iloc[:1010].drop(columns="month"), meta),
+            "the features changed",
+        )
+        meta["increments"] = SalesForecaster.MAX_INCREMENTS
+        self.assertEqual(
+            model.refit_reason(self.df.iloc[:1010], meta),
+            "too many warm starts since the last full refit",
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
-            
-        
\ No newline at end of file
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from features.panelfeatureengineering import PanelFeatureEngineering
+from models.globalforecast import GlobalSalesForecaster
+
+import numpy as np
+import pandas as pd
+
+
+class TestGlobalSalesForecaster(unittest.TestCase):
+    """TestGlobalSalesForecaster is a test case for the GlobalSalesForecaster class."""
+
+    def test_train_and_predict(self):
+        """Test that one saved model pair forecasts every entity of the panel"""
+        rng = np.random.default_rng(23)
+        dates = pd.date_range("2020-01-01", "2022-12-31")
+        levels = {"CA": 100.0, "NY": 50.0, "TX": 10.0}
+        sales = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "Shipping Address State": state,
+                        "total_sales": level + rng.random(len(dates)),
+                    },
+                    index=pd.DatetimeIndex(dates, name="Order Date"),
+                )
+                for state, level in levels.items()
+            ]
+        )
+        holidays_2021 = pd.DataFrame(
+            {"holiday": True}, index=pd.DatetimeIndex(["2022-07-04", "2023-07-04"])
+        )
+        events = pd.DataFrame(
+            {"Amazon Events": ["Prime Day", "Prime Day"]},
+            index=pd.DatetimeIndex(["2022-07-12", "2023-07-11"], name="Event Date"),
+        )
+        holidays = pd.DataFrame({"Date": ["2021-07-05"]})
+        train = PanelFeatureEngineering(
+            sales, holidays_2021, events, holidays=holidays
+        ).output()
+        forecast = PanelFeatureEngineering(
+            train,
+            holidays_2021,
+            events,
+            start="2023-01-01",
+            end="2023-03-31",
+            is_train=False,
+            entities=["TX", "CA"],
+        ).output()
+
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(
+            GlobalSalesForecaster,
+            "model_paths",
+            side_effect=lambda is_state=True: tuple(
+                os.path.join(tmp_dir, file_name)
+                for file_name in ["xgb.json", "cat.cbm", "meta.json"]
+            ),
+        ):
+            self.assertFalse(GlobalSalesForecaster().is_trained())
+            model = GlobalSalesForecaster()
+            model.train(train, n_threads=1)
+            xgb_preds, cat_preds = model.predict(forecast)
+            loaded = GlobalSalesForecaster.cached()
+            self.assertEqual(loaded.entities, ["CA", "NY", "TX"])
+            self.assertIs(GlobalSalesForecaster.cached(), loaded)
+            np.testing.assert_allclose(loaded.predict(forecast)[0], xgb_preds, rtol=1e-5)
+            np.testing.assert_allclose(loaded.predict(forecast)[1], cat_preds, rtol=1e-5)
+        GlobalSalesForecaster.cache.clear()
+
+        self.assertEqual(len(xgb_preds), len(forecast))
+        # the entity feature separates the sales levels of the states
+        for preds in (xgb_preds, cat_preds):
+            by_state = pd.Series(preds, index=forecast.index).groupby(level=0).mean()
+            self.assertLess(abs(by_state["CA"] - 100.5), 5)
+            self.assertLess(abs(by_state["TX"] - 10.5), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
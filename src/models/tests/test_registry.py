@@ -0,0 +1,88 @@
+import unittest
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from models.forecast import SalesForecaster
+from models.registry import ModelRegistry
+from models.tests.helpers import patch_model_paths
+
+import numpy as np
+import xgboost as xgb
+from catboost import CatBoostRegressor
+
+
+class TestModelRegistry(unittest.TestCase):
+    """TestModelRegistry is a test case for the ModelRegistry class."""
+
+    def setUp(self):
+        patch_model_paths(self)
+
+    def save_models(self, entity_name, n_estimators=5):
+        """save_models saves small XGBoost and CatBoost models of an entity."""
+        rng = np.random.default_rng(21)
+        X, y = rng.random((50, 3)), rng.random(50)
+        xgb_path, cat_path = SalesForecaster.model_paths(entity_name)
+        xgb.XGBRegressor(n_estimators=n_estimators).fit(X, y).save_model(xgb_path)
+        CatBoostRegressor(iterations=n_estimators, silent=True).fit(X, y).save_model(
+            cat_path
+        )
+
+    def test_get(self):
+        """Test that models are loaded once, and again when their files change"""
+        registry = ModelRegistry()
+        self.assertFalse(registry.is_trained("CA"))
+        self.assertIsNone(registry.get("CA"))
+        self.save_models("CA")
+        self.assertTrue(registry.is_trained("CA"))
+        model = registry.get("CA")
+        self.assertIs(registry.get("CA"), model)
+        self.assertEqual(registry.loads, 1)
+        self.save_models("CA", n_estimators=10)
+        self.assertIsNot(registry.get("CA"), model)
+        self.assertEqual(registry.loads, 2)
+
+    def test_eviction(self):
+        """Test that the least recently used entities are evicted beyond the budget"""
+        for entity_name in ["CA", "NY", "TX"]:
+            self.save_models(entity_name)
+        registry = ModelRegistry(max_models=2)
+        registry.get("CA")
+        registry.get("NY")
+        registry.get("CA")
+        registry.get("TX")
+        self.assertEqual(list(registry.entries), ["CA", "TX"])
+
+        registry = ModelRegistry(max_bytes=1)
+        registry.get("CA")
+        registry.get("NY")
+        self.assertEqual(list(registry.entries), ["NY"])
+
+    def test_threads(self):
+        """Test that threads sharing the registry load an entity once and evict without errors"""
+        for entity_name in ["CA", "NY", "TX"]:
+            self.save_models(entity_name)
+        registry = ModelRegistry(max_models=2)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(executor.map(lambda _: registry.get("CA"), range(16)))
+        self.assertEqual(registry.loads, 1)
+        self.assertTrue(all(model is models[0] for model in models))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            models = list(
+                executor.map(registry.get, ["CA", "NY", "TX"] * 10)
+            )
+        self.assertTrue(all(model is not None for model in models))
+        self.assertEqual(len(registry.entries), 2)
+
+        with mock.patch.object(ModelRegistry, "shared_registry", None):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                shared = list(executor.map(lambda _: ModelRegistry.shared(), range(16)))
+            self.assertTrue(all(registry is shared[0] for registry in shared))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from data.salesstore import SalesStore
+from features.featurestore import FeatureStore
+from models.trainingqueue import TrainingJobQueue
+
+
+class TestTrainingJobQueue(unittest.TestCase):
+    """TestTrainingJobQueue is a test case for the TrainingJobQueue class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.release = threading.Event()
+        self.calls = []
+        for name, value in [
+            ("train_entity", self.train_entity),
+            ("FeatureStore", lambda: FeatureStore(self.tmp_dir.name)),
+            ("SalesStore", lambda: SalesStore(self.tmp_dir.name)),
+        ]:
+            patcher = mock.patch(f"models.trainingqueue.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.queue = TrainingJobQueue({})
+        # jobs run in threads of the test process, where the patches apply
+        self.queue.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.queue.executor.shutdown)
+
+    def train_entity(self, entity_name, is_state, n_threads, incremental):
+        """train_entity stands in for the training of an entity, until the test releases it."""
+        self.calls.append(entity_name)
+        self.release.wait(5)
+        if entity_name == "XX":
+            raise ValueError("no sales")
+        return f"key-{entity_name}", 0.5
+
+    def test_submit(self):
+        """Test that concurrent requests for an entity share one job, and its result is recorded"""
+        store = SalesStore(self.tmp_dir.name)
+        store.state["stale"]["CA"] = "state"
+        store.save_state()
+
+        job = self.queue.submit("CA", True)
+        self.assertIs(self.queue.submit("CA", True), job)
+        self.assertFalse(job.done())
+        self.assertLess(self.queue.progress(job), 1)
+        self.release.set()
+        job.future.result()
+        while not job.done():
+            time.sleep(0.01)
+
+        self.assertEqual(job.status(), "done")
+        self.assertEqual(self.calls, ["CA"])
+        self.assertEqual(self.queue.progress(job), 1)
+        self.assertEqual(FeatureStore(self.tmp_dir.name).ref("train:CA"), "key-CA")
+        self.assertFalse(SalesStore(self.tmp_dir.name).is_stale("CA"))
+        # a finished job is not reused, the entity is trained again on request
+        self.queue.submit("CA", True).future.result()
+        self.assertEqual(self.calls, ["CA", "CA"])
+
+    def test_failed(self):
+        """Test that a failed job reports its error and is only retried on request"""
+        self.release.set()
+        job = self.queue.submit("XX", True)
+        while not job.done():
+            time.sleep(0.01)
+        self.assertEqual(job.status(), "failed")
+        self.assertEqual(job.error, "ValueError: no sales")
+        self.assertIs(self.queue.submit("XX", True), job)
+        self.assertIsNot(self.queue.submit("XX", True, retry=True), job)
+        self.assertIsNone(FeatureStore(self.tmp_dir.name).ref("train:XX"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import time
+
+from preproccessing.datapreprocessing import StreamingPreprocessor
+from preproccessing.preprocessedpurchases import PreprocessedPurchases
+from features.featureengineering import FeatureEngineering
+from features.featurestore import FeatureStore
+from features.lagtable import LagTable
+from features.projection import SalesProjection
+from features.rolling import RollingSales
+from data.dataloader import DataLoader
+from data.salesstore import SalesStore
+from data.salescube import SalesCube
+from models.forecast import SalesForecaster
+from utilis.utilities import TRAINING_CUTOFF
+
+
+# DataLoader of a training worker process, see PrimePredict.train_all and TrainingJobQueue
+worker_data = None
+
+
+def init_train_worker(loader_options):
+    """init_train_worker creates the DataLoader of a training worker process."""
+    global worker_data
+    worker_data = DataLoader(**loader_options)
+
+
+def train_entity(entity_name, is_state, n_threads, incremental=False):
+    """train_entity prepares the training data of an entity and trains its models in a training worker,
+    warm starting from its saved models if incremental, see SalesForecaster.train.
+
+    Returns:
+        _type_: tuple: FeatureStore key of the training data and the seconds it took
+    """
+    start = time.perf_counter()
+    df, key = train_features(worker_data, entity_name, is_state)
+    SalesForecaster(entity_name).train(
+        df, entity_name=entity_name, n_threads=n_threads, incremental=incremental
+    )
+    return key, time.perf_counter() - start
+
+
+def training_data_version(data, store, chunksize=None):
+    """training_data_version returns the version of the sales PrimePredict.prepare_train_data reads, None
+    while the raw datasets have not been downloaded.
+
+    Args:
+        data (_type_): DataLoader of the raw datasets
+        store (_type_): SalesStore of the daily sales
+        chunksize (int, optional): see train_features. Defaults to None.
+
+    Returns:
+        _type_: str: the version
+    """
+    if chunksize is None and store.exists():
+        return f"store:{store.version}"
+    if data.data_version() is None:
+        return None
+    source = "purchases" if chunksize is None else "stream"
+    return f"{source}:{data.data_version()}"
+
+
+def train_features(data, entity_name, is_state, chunksize=None):
+    """train_features prepares the data for training by preprocessing and feature engineering.
+    The features are kept in the FeatureStore, keyed by the version of the sales, the entity, the
+    calendar and the feature code, and are read back instead of being rebuilt when the key matches.
+    The PCA projection and the rolling sales features of the entity are saved next to its models and
+    advanced by the new days of later runs, see SalesProjection and RollingSales. The sales of the daily
+    sales store are trained on up to its training cutoff, so ingested days reach the models.
+
+    Args:
+        data (_type_): data object containing purchases, products, categories, holidays_past_2021, and amazon_events
+        entity_name (_type_): state or category name to forecast
+        is_state (bool): whether the entity to forecast is a state or a category
+        chunksize (int, optional): if set, purchases are streamed in chunks of this many rows
+        and aggregated into daily sales instead of being loaded at once. Defaults to None.
+        Otherwise the sales cube of the daily sales store is used when the store exists, see PrimePredict.ingest_delta,
+        and the preprocessed purchases artifact when it does not, see PreprocessedPurchases.
+
+    Returns:
+        _type_: tuple: DataFrame of the processed data ready for training and its FeatureStore key
+    """
+
+    store = SalesStore()
+    feature_store = FeatureStore()
+    from_store = chunksize is None and store.exists()
+    calendar = {
+        "holidays_2021": data.holidays_past_2021,
+        "events": data.amazon_events,
+        "holidays": data.holidays,
+        "state_forcast": is_state,
+        "cutoff": store.training_cutoff if from_store else TRAINING_CUTOFF,
+    }
+    version = training_data_version(data, store, chunksize)
+    key = FeatureEngineering.feature_key(version, entity_name, **calendar)
+    df = feature_store.get(key) if version is not None else None
+    if df is None:
+        pivot = None
+        if from_store:
+            preprocessed_data, pivot = SalesCube.open(store).output(
+                entity_name, is_state, cutoff=calendar["cutoff"]
+            )
+        elif chunksize is None:
+            preprocessed_data = PreprocessedPurchases.cached(data).output(
+                entity_name, is_state
+            )
+        else:
+            preprocessed_data = StreamingPreprocessor(
+                data.stream_purchases(chunksize), data.products, data.categories
+            ).output(entity_to_forcast=entity_name, is_state=is_state)
+
+        projection = SalesProjection.load(entity_name)
+        if projection is None:
+            projection = SalesProjection(entity_name)
+        rolling = RollingSales.load(entity_name)
+        if rolling is None:
+            rolling = RollingSales(entity_name)
+        df = FeatureEngineering(
+            preprocessed_data,
+            calendar["holidays_2021"],
+            calendar["events"],
+            holidays=calendar["holidays"],
+            state_forcast=is_state,
+            pivot=pivot,
+            projection=projection,
+            rolling=rolling,
+            cutoff=calendar["cutoff"],
+        ).output()
+        projection.save()
+        rolling.save()
+        if version is None:
+            version = training_data_version(data, store, chunksize)
+            key = FeatureEngineering.feature_key(version, entity_name, **calendar)
+        feature_store.put(key, df)
+        feature_store.put(
+            LagTable.key(key), LagTable.from_features(df, rolling).to_frame()
+        )
+        print("Data preprocessed and saved")
+    return df, key
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data.salesstore import SalesStore
+from features.featurestore import FeatureStore
+from models.training import init_train_worker, train_entity
+
+
+class TrainingJob:
+    """TrainingJob is the training of the models of one entity in the TrainingJobQueue."""
+
+    def __init__(self, entity_name, is_state, future):
+        """__init__ initializes a submitted job.
+
+        Args:
+            entity_name (_type_): state or category, '' for the overall sales
+            is_state (_type_): whether the entity is a state or a category, None for the overall sales
+            future (_type_): Future of the training in the worker process
+        """
+        self.entity_name = entity_name
+        self.is_state = is_state
+        self.future = future
+        self.submitted = time.time()
+        self.finished = None
+        self.seconds = None
+        self.error = None
+
+    def done(self):
+        """done checks if the job has finished, successfully or not."""
+        return self.finished is not None
+
+    def status(self):
+        """status returns queued, running, done or failed."""
+        if self.error is not None:
+            return "failed"
+        if self.done():
+            return "done"
+        return "running" if self.future.running() else "queued"
+
+    def elapsed(self):
+        """elapsed returns the seconds since the job was submitted, or that it took once finished."""
+        return (self.finished or time.time()) - self.submitted
+
+
+class TrainingJobQueue:
+    """TrainingJobQueue trains the models of entities in background worker processes, so the app
+    keeps serving forecasts while a model is trained. A request for an entity that is already
+    queued or training returns the same job. The FeatureStore reference and the stale mark of an
+    entity are updated here when its job finishes, and the ModelRegistry picks up the new models
+    from their files. The queue of the process is shared by every session of the app.
+    """
+
+    WORKERS = 1
+    # seconds a training is expected to take before any job has finished
+    EXPECTED_SECONDS = 60.0
+
+    shared_queue = None
+
+    def __init__(self, loader_options, workers=WORKERS):
+        """__init__ initializes the queue, the worker processes start with the first job.
+
+        Args:
+            loader_options (_type_): arguments of the DataLoader of the worker processes
+            workers (int, optional): number of worker processes, the cores are split across them.
+            With more than one worker, the shared datasets should be prepared before the first jobs,
+            see PrimePredict.train_all. Defaults to WORKERS.
+        """
+        self.loader_options = loader_options
+        self.workers = workers
+        self.n_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.executor = None
+        self.jobs = {}
+        self.durations = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, data):
+        """shared returns the queue of the process, creating it on first use.
+
+        Args:
+            data (_type_): DataLoader of the app, the workers create their own with the same options
+
+        Returns:
+            _type_: TrainingJobQueue: the queue
+        """
+        if cls.shared_queue is None:
+            cls.shared_queue = cls({"is_training": True, "compact": data.compact})
+        return cls.shared_queue
+
+    def submit(self, entity_name, is_state, retry=False):
+        """submit starts training the models of an entity, unless a job of the entity is queued or running.
+
+        Args:
+            entity_name (_type_): state or category, '' for the overall sales
+            is_state (_type_): whether the entity is a state or a category, None for the overall sales
+            retry (bool, optional): start again after a failed job, which is returned otherwise. Defaults to False.
+
+        Returns:
+            _type_: TrainingJob: the job of the entity
+        """
+        with self.lock:
+            job = self.jobs.get(entity_name)
+            if job is not None and (not job.done() or (job.error and not retry)):
+                return job
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_train_worker,
+                    initargs=(self.loader_options,),
+                )
+            print(f"Queued training of {entity_name!r}")
+            future = self.executor.submit(
+                train_entity, entity_name, is_state, self.n_threads, True
+            )
+            job = TrainingJob(entity_name, is_state, future)
+            self.jobs[entity_name] = job
+        future.add_done_callback(lambda future: self.finish(job))
+        return job
+
+    def finish(self, job):
+        """finish records the result of a finished job and points the FeatureStore to its training data."""
+        try:
+            key, job.seconds = job.future.result()
+            FeatureStore().set_ref(f"train:{job.entity_name}", key)
+            SalesStore().clear_stale(job.entity_name)
+            with self.lock:
+                self.durations.append(job.seconds)
+            print(f"Trained {job.entity_name!r} in {job.seconds:.1f} s")
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"Training {job.entity_name!r} failed: {job.error}")
+        job.finished = time.time()
+
+    def job(self, entity_name):
+        """job returns the last job of an entity, None if there is none."""
+        return self.jobs.get(entity_name)
+
+    def progress(self, job):
+        """progress returns an estimate of the fraction of a job done, from the durations of the finished jobs.
+
+        Args:
+            job (_type_): TrainingJob
+
+        Returns:
+            _type_: float: between 0 and 1, 1 once the job has finished
+        """
+        if job.done():
+            return 1.0
+        expected = (
+            sum(self.durations) / len(self.durations)
+            if self.durations
+            else self.EXPECTED_SECONDS
+        )
+        return min(job.elapsed() / expected, 0.95)
@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from utilis.utilities import compact_frame
+
 
 class DataPreprocessor:
     """
@@ -7,6 +10,15 @@ class DataPreprocessor:
     It handles the merging of product and category data, renames columns, and adds new features.
     """
 
+    # text columns stored as categoricals in compact mode
+    COMPACT_COLUMNS = [
+        "Shipping Address State",
+        "Category",
+        "ASIN/ISBN (Product Code)",
+        "product_code",
+        "Title",
+    ]
+
     def __init__(
         self,
         purchases,
@@ -14,6 +26,9 @@ class DataPreprocessor:
         categories=None,
         entity_to_forcast="",
         is_state=None,
+        compact=False,
+        cutoff_year=2023,
+        product_lookup=None,
     ):
         """
         Initializes the DataPreprocessor with purchases, products, categories, and entity to forecast.
@@ -24,11 +39,24 @@ class DataPreprocessor:
             categories (_type_, optional): categories data containing category information. Defaults to None.
             entity_to_forcast (str, optional): _description_. Defaults to ''.
             is_state (_type_, optional): state or category to forecast. Defaults to None.
+            compact (bool, optional): store text columns as categoricals and downcast integral
+            columns, the memory footprint before and after is kept in memory_report. Defaults to False.
+            cutoff_year (int, optional): purchases from this year on are dropped, None keeps them all. Defaults to 2023.
+            product_lookup (_type_, optional): titles and category names indexed by product code, see
+            build_product_lookup. Built from products and categories if None. Defaults to None.
         """
         self.purchases = purchases
+        self.product_lookup = product_lookup
+        self.memory_report = None
+        if compact:
+            self.purchases, self.memory_report = compact_frame(
+                self.purchases, self.COMPACT_COLUMNS
+            )
+            print(f"Purchases memory footprint (bytes):\n{self.memory_report}")
         self.products = products
         self.categories = categories
         self.entity_to_forcast = entity_to_forcast
+        self.cutoff_year = cutoff_year
         if "Shipping Address State" in purchases.columns:
             self.rename_columns()
             self.add_missing_data()
@@ -48,69 +76,97 @@ class DataPreprocessor:
         self.set_index()
 
     def rename_columns(self):
-        """rename_columns renames the columns in the purchases and products dataframes to standardize them."""
+        """rename_columns renames the columns in the purchases dataframe to standardize them.
+        The renamed frame is a copy, so the purchases given to the preprocessor are left unchanged.
+        """
 
-        self.purchases.rename(
-            columns={"ASIN/ISBN (Product Code)": "product_code"}, inplace=True
+        self.purchases = self.purchases.rename(
+            columns={"ASIN/ISBN (Product Code)": "product_code"}
         )
-        self.products.rename(columns={"asin": "product_code"}, inplace=True)
 
     def add_total_sales(self):
         """add_total_sales calculates the total sales for each purchase and adds it to the purchases dataframe."""
 
+        # computed in float64, the quantities of compacted purchases are small integers
         self.purchases["total_sales"] = (
-            self.purchases["Purchase Price Per Unit"] * self.purchases["Quantity"]
+            self.purchases["Purchase Price Per Unit"].astype("float64")
+            * self.purchases["Quantity"]
         )
 
     def set_index(self):
-        """set_index sets the index of the purchases dataframe to the order date and filters out data from 2023."""
+        """set_index sets the index of the purchases dataframe to the order date and filters out data from the cutoff year (2023) on."""
 
-        self.purchases["Order Date"] = pd.to_datetime(self.purchases["Order Date"])
-        self.purchases.set_index("Order Date", inplace=True)
-        self.purchases = self.purchases[self.purchases.index.year < 2023]
+        self.purchases = self.purchases.set_index(
+            pd.DatetimeIndex(pd.to_datetime(self.purchases["Order Date"]))
+        ).drop(columns="Order Date")
+        if self.cutoff_year is not None:
+            self.purchases = self.purchases[
+                self.purchases.index.year < self.cutoff_year
+            ]
 
-    def add_missing_data(self):
-        """add_missing_data merges the products and categories dataframes with the purchases dataframe to fill in missing data.
-        It also handles null values in the Category and Title columns.
-        """
-        self.products = pd.merge(
-            self.products,
-            self.categories,
-            how="inner",
-            left_on="category_id",
-            right_on="id",
-        ).drop("id", axis=1)
-        product_codes_category_null = self.purchases[
-            self.purchases["Category"].isnull()
-        ]["product_code"]
-
-        data_replacements = self.products[
-            self.products["product_code"].isin(product_codes_category_null.unique())
-        ][["product_code", "title", "category_name"]]
-
-        self.purchases = pd.merge(
-            self.purchases, data_replacements, on="product_code", how="left"
-        )
+    @staticmethod
+    def build_product_lookup(products, categories=None, product_codes=None):
+        """build_product_lookup joins products to their categories and indexes the titles and
+        category names by product code. The first product is kept for a duplicated product code.
 
-        self.purchases.loc[
-            (self.purchases["Category"].isnull())
-            & (self.purchases["category_name"].notnull()),
-            "Category",
-        ] = self.purchases.loc[
-            (self.purchases["Category"].isnull())
-            & (self.purchases["category_name"].notnull()),
-            "category_name",
-        ]
+        Args:
+            products (_type_): products data containing product information.
+            categories (_type_, optional): categories data, None if products are merged with their categories already. Defaults to None.
+            product_codes (_type_, optional): only keep these product codes. Defaults to None for all products.
 
-        self.purchases.loc[
-            (self.purchases["Title"].isnull()) & (self.purchases["title"].notnull()),
-            "Title",
-        ] = self.purchases.loc[
-            (self.purchases["Title"].isnull()) & (self.purchases["title"].notnull()),
-            "title",
+        Returns:
+            _type_: DataFrame: title and category_name indexed by product_code
+        """
+        if "asin" in products.columns:
+            products = products.rename(columns={"asin": "product_code"})
+        if product_codes is not None:
+            products = products[products["product_code"].isin(product_codes)]
+        if categories is not None:
+            products = pd.merge(
+                products,
+                categories,
+                how="inner",
+                left_on="category_id",
+                right_on="id",
+            )
+        return products.drop_duplicates("product_code").set_index("product_code")[
+            ["title", "category_name"]
         ]
 
-        self.purchases.drop(["title", "category_name"], axis=1, inplace=True)
+    def add_missing_data(self):
+        """add_missing_data fills in missing Category and Title values from the products and categories data.
+        Categories are filled for purchases without a category, titles for purchases of the same products.
+        Only the rows to fill are looked up, through a product code index, so no full size merge is made.
+        """
+        category_missing = self.purchases["Category"].isnull().to_numpy()
+        product_codes = self.purchases["product_code"]
+        null_codes = product_codes[category_missing].unique()
+        lookup = self.product_lookup
+        if lookup is None:
+            lookup = self.build_product_lookup(
+                self.products, self.categories, null_codes
+            )
+        title_missing = self.purchases["Title"].isnull().to_numpy()
+        title_missing[title_missing] = product_codes[title_missing].isin(null_codes)
+
+        for column, replacement, missing in [
+            ("Category", "category_name", category_missing),
+            ("Title", "title", title_missing),
+        ]:
+            positions = lookup.index.get_indexer(np.asarray(product_codes[missing]))
+            values = lookup[replacement].to_numpy()[positions]
+            found = (positions >= 0) & pd.notnull(values)
+            fill = missing.copy()
+            fill[missing] = found
+            values = values[found]
+            if isinstance(self.purchases[column].dtype, pd.CategoricalDtype):
+                new_categories = pd.Index(pd.unique(values)).difference(
+                    self.purchases[column].cat.categories
+                )
+                self.purchases[column] = self.purchases[column].cat.add_categories(
+                    new_categories
+                )
+            self.purchases.loc[fill, column] = values
 
     def remove_null_values(self):
         """remove_null_values removes rows with null values in the Shipping Address State and Category columns."""
@@ -124,3 +180,88 @@ class DataPreprocessor:
         """output returns the processed purchases dataframe."""
         # Output the processed data
         return self.purchases
+
+
+class StreamingPreprocessor:
+    """StreamingPreprocessor preprocesses purchases chunk by chunk and adds each chunk into
+    a daily sales table grouped by order date, state and category. Only one chunk of raw
+    purchases is held in memory at a time, so peak memory is bounded by the chunk size.
+    The daily, daily by state and daily by category sales are sums over this table.
+    """
+
+    GROUPS = ["Shipping Address State", "Category"]
+
+    def __init__(self, chunks, products, categories, cutoff_year=2023):
+        """__init__ builds the product lookup once and aggregates every chunk.
+
+        Args:
+            chunks (_type_): iterable of raw purchases dataframes, e.g. DataLoader.stream_purchases().
+            products (_type_): products data containing product information.
+            categories (_type_): categories data containing category information.
+            cutoff_year (int, optional): purchases from this year on are dropped, None keeps them all. Defaults to 2023.
+        """
+        self.cutoff_year = cutoff_year
+        self.product_lookup = DataPreprocessor.build_product_lookup(
+            products, categories
+        )
+        self.sales = None
+        for chunk in chunks:
+            self.add_chunk(chunk)
+
+    def add_chunk(self, chunk):
+        """add_chunk renames, fills, drops nulls and computes total sales on a chunk of
+        purchases, then adds its daily sales into the running table.
+
+        Args:
+            chunk (_type_): raw purchases dataframe.
+        """
+        purchases = DataPreprocessor(
+            chunk, cutoff_year=self.cutoff_year, product_lookup=self.product_lookup
+        ).output()
+        sales = purchases.groupby([purchases.index] + self.GROUPS, observed=True)[
+            "total_sales"
+        ].sum()
+        if self.sales is None:
+            self.sales = sales
+        else:
+            self.sales = self.sales.add(sales, fill_value=0)
+
+    def output(self, entity_to_forcast="", is_state=None):
+        """output returns the daily sales table indexed by order date, in the same layout as
+        DataPreprocessor.output() so that it can be passed to FeatureEngineering.
+
+        Args:
+            entity_to_forcast (str, optional): state or category to keep. Defaults to ''.
+            is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+
+        Returns:
+            _type_: DataFrame: daily sales by state and category
+        """
+        if self.sales is None:
+            return pd.DataFrame(
+                columns=self.GROUPS + ["total_sales"],
+                index=pd.DatetimeIndex([], name="Order Date"),
+            )
+        sales = self.sales.reset_index(level=self.GROUPS)
+        if not entity_to_forcast == "":
+            column = "Shipping Address State" if is_state else "Category"
+            sales = sales[sales[column] == entity_to_forcast]
+        return sales
+
+    def daily_sales(self):
+        """daily_sales returns the total sales per day."""
+        return self.output().groupby(level=0)["total_sales"].sum()
+
+    def daily_sales_by_state(self):
+        """daily_sales_by_state returns the total sales per day and state."""
+        sales = self.output()
+        return sales.groupby([sales.index, "Shipping Address State"], observed=True)[
+            "total_sales"
+        ].sum()
+
+    def daily_sales_by_category(self):
+        """daily_sales_by_category returns the total sales per day and category."""
+        sales = self.output()
+        return sales.groupby([sales.index, "Category"], observed=True)[
+            "total_sales"
+        ].sum()
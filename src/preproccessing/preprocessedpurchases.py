@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from preproccessing.datapreprocessing import DataPreprocessor
+from utilis.utilities import frequency_ranking, resolve_path
+
+
+class PreprocessedPurchases:
+    """PreprocessedPurchases is the canonical output of DataPreprocessor over the full raw
+    purchases, written once per data version of the raw datasets to data/processed_datasets.
+    Only the columns the forecasts use are kept. It is a parquet dataset hive partitioned by
+    state and year, with the Category column dictionary encoded and sorted within each file,
+    so the purchases of one entity are read with partition pruning and row group filters
+    instead of being filtered in pandas. A partition index in the json metadata lists the
+    files each category has purchases in, so a category only opens those files.
+    The states and categories ranked by purchase frequency are kept in the metadata too.
+    Every build writes to a new directory named in the metadata, and the metadata is replaced
+    atomically, so concurrent or interrupted builds never leave a partly written dataset.
+    """
+
+    DATASET_DIR = "preprocessed_purchases"
+    META_FILE = "preprocessed_purchases.json"
+    GROUPS = ["Shipping Address State", "Category"]
+    COLUMNS = GROUPS + ["total_sales"]
+    PARTITIONING = ds.partitioning(
+        pa.schema([("Shipping Address State", pa.string()), ("year", pa.int16())]),
+        flavor="hive",
+    )
+    # rows per row group, small enough for the Category statistics to skip row groups
+    ROW_GROUP_ROWS = 64_000
+
+    cache = {}
+
+    def __init__(self, path):
+        """__init__ opens a built dataset, no purchases are read here.
+
+        Args:
+            path (_type_): directory of the dataset and its metadata
+        """
+        self.path = path
+        with open(os.path.join(path, self.META_FILE)) as file:
+            self.meta = json.load(file)
+        # datasets built before the directories were named in the metadata
+        self.dataset_path = os.path.join(path, self.meta.get("dataset", self.DATASET_DIR))
+
+    @property
+    def version(self):
+        """version returns the data version of the raw datasets the dataset was built from."""
+        return self.meta["version"]
+
+    @classmethod
+    def build(cls, data, path):
+        """build preprocesses the full purchases, keeping every year, and writes the dataset
+        and its partition index.
+
+        Args:
+            data (_type_): DataLoader with purchases, products and categories
+            path (_type_): directory to write the dataset to
+
+        Returns:
+            _type_: PreprocessedPurchases: the built dataset
+        """
+        print("Preprocessing purchases...")
+        purchases = DataPreprocessor(
+            data.purchases, data.products, data.categories, cutoff_year=None
+        ).output()[cls.COLUMNS]
+        purchases = purchases.reset_index().astype(
+            {column: str for column in cls.GROUPS}
+        )
+        purchases["year"] = purchases["Order Date"].dt.year.astype("int16")
+        purchases = purchases.sort_values(
+            ["Shipping Address State", "year", "Category", "Order Date"],
+            kind="stable",
+        )
+        table = pa.Table.from_pandas(purchases, preserve_index=False)
+        table = table.set_column(
+            table.schema.get_field_index("Category"),
+            "Category",
+            pc.dictionary_encode(table["Category"]),
+        )
+
+        dataset_path = tempfile.mkdtemp(prefix=f"{cls.DATASET_DIR}.", dir=path)
+        # single threaded, so the rows of every file keep their sorted order
+        ds.write_dataset(
+            table,
+            dataset_path,
+            format="parquet",
+            partitioning=cls.PARTITIONING,
+            use_threads=False,
+            max_partitions=100_000,
+            max_rows_per_group=cls.ROW_GROUP_ROWS,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+        files = {}
+        for fragment in ds.dataset(
+            dataset_path, format="parquet", partitioning=cls.PARTITIONING
+        ).get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            files.setdefault(
+                (keys["Shipping Address State"], keys["year"]), []
+            ).append(os.path.relpath(fragment.path, dataset_path))
+        partitions = {}
+        for (category, state, year), _ in purchases.groupby(
+            ["Category", "Shipping Address State", "year"], sort=True
+        ):
+            for file in files[(state, year)]:
+                partitions.setdefault(category, []).append([file, int(year)])
+
+        frequencies = {
+            column: frequency_ranking(purchases["Order Date"], purchases[column])
+            for column in cls.GROUPS
+        }
+        meta_path = os.path.join(path, cls.META_FILE)
+        previous = cls.DATASET_DIR
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                previous = json.load(file).get("dataset", cls.DATASET_DIR)
+        handle, temp_path = tempfile.mkstemp(
+            prefix=f"{cls.META_FILE}.", suffix=".tmp", dir=path
+        )
+        with os.fdopen(handle, "w") as file:
+            json.dump(
+                {
+                    "version": data.data_version(),
+                    "dataset": os.path.basename(dataset_path),
+                    "rows": len(purchases),
+                    "categories": partitions,
+                    "frequencies": frequencies,
+                },
+                file,
+            )
+        os.replace(temp_path, meta_path)
+        # only the dataset this one replaces, a concurrent build may be writing others
+        if os.path.exists(os.path.join(path, previous)):
+            shutil.rmtree(os.path.join(path, previous))
+        return cls(path)
+
+    @classmethod
+    def open(cls, data, path=None):
+        """open returns the dataset of the raw datasets of a DataLoader, building it when it
+        is missing or was built from another data version. The raw purchases are not loaded
+        when the dataset is up to date.
+
+        Args:
+            data (_type_): DataLoader with purchases, products and categories
+            path (_type_, optional): directory of the dataset. Defaults to data/processed_datasets.
+
+        Returns:
+            _type_: PreprocessedPurchases: the dataset
+        """
+        path = path if path is not None else resolve_path("data", "processed_datasets")
+        version = data.data_version()
+        if version is not None and os.path.exists(os.path.join(path, cls.META_FILE)):
+            with open(os.path.join(path, cls.META_FILE)) as file:
+                if json.load(file)["version"] == version:
+                    return cls(path)
+        return cls.build(data, path)
+
+    @classmethod
+    def cached(cls, data, path=None):
+        """cached returns the dataset of a DataLoader, opening it only once per process and data version.
+
+        Args:
+            data (_type_): DataLoader with purchases, products and categories
+            path (_type_, optional): directory of the dataset. Defaults to data/processed_datasets.
+
+        Returns:
+            _type_: PreprocessedPurchases: the dataset
+        """
+        key = (path, data.data_version())
+        if key[1] is None or key not in cls.cache:
+            purchases = cls.open(data, path)
+            key = (path, purchases.version)
+            cls.cache[key] = purchases
+        return cls.cache[key]
+
+    def dataset(self, files=None):
+        """dataset returns the pyarrow dataset of the purchases, or of the given files of it."""
+        if files is None:
+            return ds.dataset(
+                self.dataset_path, format="parquet", partitioning=self.PARTITIONING
+            )
+        return ds.dataset(
+            [os.path.join(self.dataset_path, file) for file in files],
+            format="parquet",
+            partitioning=self.PARTITIONING,
+            partition_base_dir=self.dataset_path,
+        )
+
+    def read(self, columns, entity_to_forcast="", is_state=None, cutoff_year=2023):
+        """read reads columns of the purchases of an entity. A state is read from its own
+        directory only, a category from the files the partition index lists for it.
+
+        Args:
+            columns (_type_): columns to read
+            entity_to_forcast (str, optional): state or category. Defaults to '' for every purchase.
+            is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+            cutoff_year (int, optional): purchases from this year on are left out, None keeps them all. Defaults to 2023.
+
+        Returns:
+            _type_: DataFrame: the columns of the purchases
+        """
+        files = None
+        filters = []
+        if cutoff_year is not None:
+            filters.append(ds.field("year") < cutoff_year)
+        if not entity_to_forcast == "" and is_state:
+            filters.append(ds.field("Shipping Address State") == entity_to_forcast)
+        elif not entity_to_forcast == "":
+            files = [
+                file
+                for file, year in self.meta["categories"].get(entity_to_forcast, [])
+                if cutoff_year is None or year < cutoff_year
+            ]
+            if len(files) == 0:
+                return pd.DataFrame(
+                    {column: pd.Series(dtype=object) for column in columns}
+                )
+            filters.append(ds.field("Category") == entity_to_forcast)
+        expression = None
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+        return (
+            self.dataset(files).to_table(columns=columns, filter=expression).to_pandas()
+        )
+
+    def output(self, entity_to_forcast="", is_state=None, cutoff_year=2023):
+        """output returns the preprocessed purchases of an entity, in the layout of DataPreprocessor.output().
+
+        Args:
+            entity_to_forcast (str, optional): state or category. Defaults to '' for every purchase.
+            is_state (_type_, optional): whether the entity is a state or a category. Defaults to None.
+            cutoff_year (int, optional): purchases from this year on are left out, None keeps them all. Defaults to 2023.
+
+        Returns:
+            _type_: DataFrame: purchases indexed by Order Date
+        """
+        purchases = self.read(
+            ["Order Date"] + self.COLUMNS, entity_to_forcast, is_state, cutoff_year
+        )
+        purchases["Order Date"] = pd.to_datetime(purchases["Order Date"])
+        return purchases.set_index("Order Date").sort_index(kind="stable")
+
+    def frequencies(self, column):
+        """frequencies returns the states or the categories ordered by the number of days before
+        2023 they have purchases on, as ranked when the dataset was built.
+
+        Args:
+            column (_type_): Shipping Address State or Category
+
+        Returns:
+            _type_: list: names ordered by frequency, descending
+        """
+        return self.meta["frequencies"][column]
@@ -5,54 +5,59 @@ import numpy as np
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from preproccessing.datapreprocessing import DataPreprocessor
+from preproccessing.datapreprocessing import DataPreprocessor, StreamingPreprocessor
 import pandas as pd
 
 
+def sample_data():
+    """sample_data returns sample purchases, products and categories for testing."""
+    purchases = pd.DataFrame(
+        {
+            "Shipping Address State": ["CA", "NY", "TX", "CA", "NY"],
+            "Category": ["A", "B", np.nan, np.nan, "E"],
+            "ASIN/ISBN (Product Code)": ["P1", "P2", "P3", "P4", "P5"],
+            "Purchase Price Per Unit": [10, 20, 30, 40, 50],
+            "Title": ["Product 1", "Product 2", np.nan, np.nan, "Product 5"],
+            "Quantity": [1, 2, 3, 4, 5],
+            "Order Date": [
+                "2018-01-01",
+                "2019-01-01",
+                "2020-01-01",
+                "2021-01-02",
+                "2022-01-03",
+            ],
+        }
+    )
+    products = pd.DataFrame(
+        {
+            "Category": ["A", "B", "C", "D", "E"],
+            "asin": ["P1", "P2", "P3", "P4", "P5"],
+            "title": [
+                "Product 1",
+                "Product 2",
+                "Product 3",
+                "Product 4",
+                "Product 5",
+            ],
+            "category_name": ["X", "Y", "Z", "X", "Y"],
+            "category_id": [1, 2, 3, 4, 5],
+        }
+    )
+    categories = pd.DataFrame(
+        {
+            "Category": ["A", "B", "C", "D", "E"],
+            "Subcategory": ["X", "Y", "Z", "X", "Y"],
+            "id": [1, 2, 3, 4, 5],
+        }
+    )
+    return purchases, products, categories
+
+
 class TestDataPreprocessor(unittest.TestCase):
 
     def runTest(self):
         """Test to check the functionality of DataPreprocessor class for the state CA"""
-        # Sample data for testing
-        purchases = pd.DataFrame(
-            {
-                "Shipping Address State": ["CA", "NY", "TX", "CA", "NY"],
-                "Category": ["A", "B", np.nan, np.nan, "E"],
-                "ASIN/ISBN (Product Code)": ["P1", "P2", "P3", "P4", "P5"],
-                "Purchase Price Per Unit": [10, 20, 30, 40, 50],
-                "Title": ["Product 1", "Product 2", np.nan, np.nan, "Product 5"],
-                "Quantity": [1, 2, 3, 4, 5],
-                "Order Date": [
-                    "2018-01-01",
-                    "2019-01-01",
-                    "2020-01-01",
-                    "2021-01-02",
-                    "2022-01-03",
-                ],
-            }
-        )
-        products = pd.DataFrame(
-            {
-                "Category": ["A", "B", "C", "D", "E"],
-                "asin": ["P1", "P2", "P3", "P4", "P5"],
-                "title": [
-                    "Product 1",
-                    "Product 2",
-                    "Product 3",
-                    "Product 4",
-                    "Product 5",
-                ],
-                "category_name": ["X", "Y", "Z", "X", "Y"],
-                "category_id": [1, 2, 3, 4, 5],
-            }
-        )
-        categories = pd.DataFrame(
-            {
-                "Category": ["A", "B", "C", "D", "E"],
-                "Subcategory": ["X", "Y", "Z", "X", "Y"],
-                "id": [1, 2, 3, 4, 5],
-            }
-        )
+        purchases, products, categories = sample_data()
 
         # Create an instance of DataPreprocessor
         processed_data = DataPreprocessor(
@@ -71,5 +76,72 @@ class TestDataPreprocessor(unittest.TestCase):
         )  # No missing categories
 
 
+class TestAddMissingData(unittest.TestCase):
+    """TestAddMissingData checks which categories and titles are filled from the products data."""
+
+    def test_fills_titles_of_products_with_missing_categories(self):
+        purchases, products, categories = sample_data()
+        purchases.loc[1, "ASIN/ISBN (Product Code)"] = "P3"
+        purchases.loc[1, "Title"] = np.nan
+        purchases.loc[0, "Title"] = np.nan
+
+        processed_data = DataPreprocessor(purchases, products, categories).output()
+
+        self.assertEqual(list(processed_data["Category"]), ["A", "B", "Z", "X", "E"])
+        # P3 has a purchase without a category, so its other purchases get a title too
+        self.assertEqual(processed_data["Title"].iloc[1], "Product 3")
+        self.assertTrue(pd.isnull(processed_data["Title"].iloc[0]))
+
+
+class TestCompactDataPreprocessor(unittest.TestCase):
+    """TestCompactDataPreprocessor checks that compact mode gives the same data with smaller dtypes."""
+
+    def test_compact_matches_default(self):
+        purchases, products, categories = sample_data()
+        purchases["Purchase Price Per Unit"] = [19.99, 5.49, 30.0, 0.1, 12.35]
+        purchases = pd.concat([purchases] * 50, ignore_index=True)
+        expected = DataPreprocessor(
+            purchases.copy(), products.copy(), categories.copy()
+        ).output()
+        preprocessor = DataPreprocessor(
+            purchases.copy(), products.copy(), categories.copy(), compact=True
+        )
+        processed_data = preprocessor.output()
+
+        self.assertIsInstance(processed_data["Category"].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(processed_data["product_code"].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(processed_data["Category"]), list(expected["Category"]))
+        self.assertEqual(list(processed_data["Title"]), list(expected["Title"]))
+        # prices are not downcast, so the totals are exactly those of the default mode
+        np.testing.assert_array_equal(processed_data["total_sales"], expected["total_sales"])
+        self.assertEqual(preprocessor.purchases["Purchase Price Per Unit"].dtype, np.float64)
+        self.assertEqual(preprocessor.purchases["Quantity"].dtype, np.int8)
+        self.assertLess(
+            preprocessor.memory_report.loc["total", "after"],
+            preprocessor.memory_report.loc["total", "before"],
+        )
+
+
+class TestStreamingPreprocessor(unittest.TestCase):
+    """TestStreamingPreprocessor checks that chunked aggregation matches DataPreprocessor."""
+
+    def test_chunks_match_full_preprocessing(self):
+        purchases, products, categories = sample_data()
+        expected = DataPreprocessor(
+            purchases.copy(), products.copy(), categories.copy()
+        ).output()
+        expected = expected.groupby(expected.index)["total_sales"].sum()
+
+        chunks = [purchases.iloc[:2].copy(), purchases.iloc[2:].copy()]
+        streamed = StreamingPreprocessor(chunks, products, categories)
+
+        pd.testing.assert_series_equal(
+            streamed.daily_sales(), expected, check_dtype=False
+        )
+        self.assertEqual(
+            list(streamed.output("CA", is_state=True)["total_sales"]), [10, 160]
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import os
+import sys
+import tempfile
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from preproccessing.datapreprocessing import DataPreprocessor
+from preproccessing.preprocessedpurchases import PreprocessedPurchases
+from preproccessing.tests.test_datapreprocessing import sample_data
+import pandas as pd
+import pyarrow.dataset as ds
+
+
+def sample_loader(version="v1"):
+    """sample_loader returns a loader like object over the sample data."""
+    purchases, products, categories = sample_data()
+    purchases = pd.concat([purchases] * 3, ignore_index=True)
+    purchases["Order Date"] = (
+        pd.to_datetime(purchases["Order Date"])
+        + pd.to_timedelta(purchases.index, unit="D")
+    ).astype(str)
+    return types.SimpleNamespace(
+        purchases=purchases,
+        products=products,
+        categories=categories,
+        data_version=lambda: version,
+    )
+
+
+def sorted_purchases(purchases):
+    """sorted_purchases orders purchases by date, state and category."""
+    return purchases.reset_index().sort_values(
+        ["Order Date"] + PreprocessedPurchases.GROUPS, ignore_index=True
+    )
+
+
+class TestPreprocessedPurchases(unittest.TestCase):
+
+    def test_entity_output(self):
+        """Test that the partitioned reads match DataPreprocessor for every entity, without changing the purchases"""
+        data = sample_loader()
+        raw = data.purchases.copy()
+        with tempfile.TemporaryDirectory() as path:
+            purchases_dataset = PreprocessedPurchases.open(data, path)
+            pd.testing.assert_frame_equal(data.purchases, raw)
+            for entity, is_state in [("", None), ("CA", True), ("NY", True), ("E", False)]:
+                expected = DataPreprocessor(
+                    data.purchases,
+                    data.products,
+                    data.categories,
+                    entity_to_forcast=entity,
+                    is_state=is_state,
+                ).output()[PreprocessedPurchases.COLUMNS]
+                output = purchases_dataset.output(entity, is_state).astype(
+                    {"Shipping Address State": str, "Category": str}
+                )
+                pd.testing.assert_frame_equal(
+                    sorted_purchases(output), sorted_purchases(expected)
+                )
+            self.assertEqual(len(purchases_dataset.output("ZZ", True)), 0)
+
+    def test_partitions(self):
+        """Test that a state is read from its own files only"""
+        with tempfile.TemporaryDirectory() as path:
+            purchases_dataset = PreprocessedPurchases.open(sample_loader(), path)
+            state_files = purchases_dataset.dataset().get_fragments(
+                filter=ds.field("Shipping Address State") == "CA"
+            )
+            self.assertEqual(
+                sorted(os.path.dirname(fragment.path) for fragment in state_files),
+                sorted(
+                    os.path.join(
+                        purchases_dataset.dataset_path,
+                        "Shipping Address State=CA",
+                        f"year={year}",
+                    )
+                    for year in [2018, 2021]
+                ),
+            )
+            self.assertEqual(
+                [year for _, year in purchases_dataset.meta["categories"]["A"]],
+                [2018],
+            )
+
+    def test_version(self):
+        """Test that the dataset is read back for the same data version and rebuilt for a new one"""
+        with tempfile.TemporaryDirectory() as path:
+            PreprocessedPurchases.open(sample_loader(), path)
+            data = sample_loader()
+            data.purchases = None
+            self.assertEqual(PreprocessedPurchases.open(data, path).version, "v1")
+            purchases_dataset = PreprocessedPurchases.open(sample_loader("v2"), path)
+            self.assertEqual(purchases_dataset.version, "v2")
+            self.assertEqual(
+                purchases_dataset.frequencies("Shipping Address State"), ["CA", "NY", "TX"]
+            )
+
+    def test_concurrent_builds(self):
+        """Test that every build writes its own directory and that the replaced one is removed"""
+        with tempfile.TemporaryDirectory() as path:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                built = list(
+                    executor.map(
+                        lambda version: PreprocessedPurchases.build(
+                            sample_loader(version), path
+                        ),
+                        ["v1", "v2"],
+                    )
+                )
+            # whichever build finished last, its dataset is whole
+            opened = PreprocessedPurchases(path)
+            self.assertEqual(len(opened.output(cutoff_year=None)), opened.meta["rows"])
+            self.assertNotEqual(built[0].dataset_path, built[1].dataset_path)
+
+            first = PreprocessedPurchases.build(sample_loader(), path)
+            second = PreprocessedPurchases.build(sample_loader("v2"), path)
+            self.assertNotEqual(first.dataset_path, second.dataset_path)
+            self.assertFalse(os.path.exists(first.dataset_path))
+            self.assertTrue(os.path.exists(second.dataset_path))
+            opened = PreprocessedPurchases.open(sample_loader("v2"), path)
+            self.assertEqual(opened.dataset_path, second.dataset_path)
+            self.assertEqual(len(opened.output(cutoff_year=None)), second.meta["rows"])
+
+    def test_legacy_directory(self):
+        """Test that a dataset written before the directories were named in the metadata is replaced"""
+        with tempfile.TemporaryDirectory() as path:
+            legacy = os.path.join(path, PreprocessedPurchases.DATASET_DIR)
+            os.makedirs(legacy)
+            with open(os.path.join(path, PreprocessedPurchases.META_FILE), "w") as file:
+                file.write('{"version": "v0"}')
+            self.assertEqual(PreprocessedPurchases(path).dataset_path, legacy)
+            PreprocessedPurchases.open(sample_loader(), path)
+            self.assertFalse(os.path.exists(legacy))
+
+
+if __name__ == "__main__":
+    unittest.main()
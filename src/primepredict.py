@@ -1,9 +1,27 @@
-from preproccessing.datapreprocessing import DataPreprocessor
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from preproccessing.datapreprocessing import StreamingPreprocessor
+from preproccessing.preprocessedpurchases import PreprocessedPurchases
 from features.featureengineering import FeatureEngineering
+from features.featurestore import FeatureStore
+from features.lagtable import LagTable
+from features.panelfeatureengineering import PanelFeatureEngineering
 from data.dataloader import DataLoader
+from data.salesstore import SalesStore
+from data.salescube import SalesCube
 import pandas as pd
 from models.forecast import SalesForecaster
-import os
+from models.globalforecast import GlobalSalesForecaster
+from models.registry import ModelRegistry
+from utilis.utilities import TRAINING_CUTOFF
+from models.training import (
+    init_train_worker,
+    train_entity,
+    train_features,
+    training_data_version,
+)
 
 
 class PrimePredict:
@@ -14,54 +32,342 @@ class PrimePredict:
         """
         pass
 
-    def prepare_train_data(self, data, entity_name, is_state):
-        """prepare_train_data prepares the data for training by preprocessing and feature engineering.
-        It saves the processed data to a CSV file in the processed_datasets directory.
+    def training_data_version(self, data, store, chunksize=None):
+        """training_data_version returns the version of the sales prepare_train_data reads, see
+        models.training.training_data_version."""
+        return training_data_version(data, store, chunksize)
+
+    def prepare_train_data(self, data, entity_name, is_state, chunksize=None):
+        """prepare_train_data prepares the data for training, see train_features, and points the
+        FeatureStore to it as the history of the forecasts of the entity.
 
         Args:
             data (_type_): data object containing purchases, products, categories, holidays_past_2021, and amazon_events
             entity_name (_type_): state or category name to forecast
             is_state (bool): whether the entity to forecast is a state or a category
+            chunksize (int, optional): see train_features. Defaults to None.
 
         Returns:
             _type_: DataFrame: processed data ready for training
         """
+        df, key = self.train_features(data, entity_name, is_state, chunksize)
+        FeatureStore().set_ref(f"train:{entity_name}", key)
+        return df
 
-        processed_data_path = os.path.join(os.getcwd(), "data", "processed_datasets")
-        if not "src" in processed_data_path:
-            processed_data_path = os.path.join(
-                os.getcwd(), "src", "data", "processed_datasets"
-            )
+    def train_features(self, data, entity_name, is_state, chunksize=None):
+        """train_features prepares the data for training by preprocessing and feature engineering and
+        returns it with its FeatureStore key, see models.training.train_features."""
+        return train_features(data, entity_name, is_state, chunksize)
+
+    def build_sales_store(self, data, chunksize=500_000):
+        """build_sales_store builds the daily sales store from the full purchases data.
 
-        preprocessed_data = DataPreprocessor(
-            data.purchases,
+        Args:
+            data (_type_): data object containing purchases, products and categories
+            chunksize (int, optional): number of purchases preprocessed at a time. Defaults to 500_000.
+
+        Returns:
+            _type_: SalesStore: the built store
+        """
+        store = SalesStore()
+        sales = StreamingPreprocessor(
+            data.stream_purchases(chunksize),
             data.products,
             data.categories,
-            entity_to_forcast=entity_name,
-            is_state=is_state,
+            cutoff_year=None,
+        ).output()
+        store.write_sales(sales, sales.index.max())
+        SalesCube.open(store)
+        print(f"Sales store built up to {store.watermark}")
+        return store
+
+    def ingest_delta(self, delta_path, data, chunksize=500_000):
+        """ingest_delta adds a csv file of new purchases to the daily sales store.
+        Order Date has day granularity, so purchases of the watermark day are ingested again: when the file
+        holds purchases of that day, they replace the sales stored for it, and the file must hold every
+        purchase of the day. Purchases ordered before the watermark day are skipped, so ingesting a file
+        twice has no effect.
+        The overall model and the models of the states and categories the new purchases touch are
+        marked stale, the other models are left as they are. See refresh_stale.
+
+        Args:
+            delta_path (_type_): path of the csv file with new purchases, in the layout of amazon_purchases.csv
+            data (_type_): data object containing purchases, products and categories
+            chunksize (int, optional): number of purchases preprocessed at a time. Defaults to 500_000.
+
+        Returns:
+            _type_: dict: number of new purchases, watermark and the touched states and categories
+        """
+        store = SalesStore()
+        if not store.exists():
+            store = self.build_sales_store(data, chunksize)
+        watermark, version = store.watermark, store.version
+        ingested = {"rows": 0, "watermark": watermark}
+
+        def new_purchases():
+            for chunk in pd.read_csv(
+                delta_path, chunksize=chunksize, parse_dates=["Order Date"]
+            ):
+                chunk = chunk[chunk["Order Date"] >= watermark]
+                if len(chunk) > 0:
+                    ingested["rows"] += len(chunk)
+                    ingested["watermark"] = max(
+                        ingested["watermark"], chunk["Order Date"].max()
+                    )
+                    yield chunk
+
+        sales = StreamingPreprocessor(
+            new_purchases(), data.products, data.categories, cutoff_year=None
         ).output()
+        ingested["states"], ingested["categories"] = [], []
+        if len(sales) > 0:
+            ingested["states"], ingested["categories"] = store.add_sales(
+                sales,
+                ingested["watermark"],
+                replace_days=sales.index[sales.index <= watermark].unique(),
+            )
+            if store.version != version:
+                store.mark_stale(ingested["states"], ingested["categories"])
+                SalesCube.open(store)
+            else:
+                # the purchases of the watermark day were ingested already
+                ingested["rows"] = 0
+        print(
+            f"Ingested {ingested['rows']} purchases up to {ingested['watermark']}, "
+            f"{len(ingested['states'])} states and {len(ingested['categories'])} categories touched"
+        )
+        return ingested
+
+    def refresh_stale(self, data):
+        """refresh_stale retrains the stale models, the models of untouched entities are not retrained.
+        Stale entities without a trained model are cleared, they are trained on first use. Models
+        with no new days to train on are left stale.
+
+        Args:
+            data (_type_): data object containing purchases, products, categories, holidays_past_2021, and amazon_events
+
+        Returns:
+            _type_: list: names of the retrained entities
+        """
+        store = SalesStore()
+        retrained = []
+        stale_kinds = set(store.stale_entities().values())
+        for entity_name, kind in store.stale_entities().items():
+            if ModelRegistry.shared().is_trained(entity_name):
+                df = self.prepare_train_data(data, entity_name, kind == "state")
+                if not SalesForecaster(entity_name).train(
+                    df, entity_name=entity_name, incremental=True
+                ):
+                    continue
+                retrained.append(entity_name)
+            store.clear_stale(entity_name)
+        for is_state in (True, False):
+            kind = "state" if is_state else "category"
+            if kind in stale_kinds and GlobalSalesForecaster.cached(is_state).is_trained():
+                self.train_global(data, is_state)
+                retrained.append(f"global:{kind}")
+        return retrained
+
+    def lag_table(self, feature_store, key):
+        """lag_table returns the LagTable saved with the training features of a key, None if there are none.
+        Lag tables missing from older stores are built from the training features and saved.
+
+        Args:
+            feature_store (_type_): FeatureStore of the training features
+            key (_type_): key of the training features, None is allowed
+
+        Returns:
+            _type_: LagTable: the lag table
+        """
+        if key is None:
+            return None
+        frame = feature_store.get(LagTable.key(key))
+        if frame is not None:
+            return LagTable.from_frame(frame)
+        features = feature_store.get(key)
+        if features is None:
+            return None
+        lag_table = LagTable.from_features(features)
+        feature_store.put(LagTable.key(key), lag_table.to_frame())
+        return lag_table
+
+    def global_train_data(self, data, is_state):
+        """global_train_data prepares the stacked training features of every state, or of every category,
+        for the global model, see PanelFeatureEngineering. They are kept in the FeatureStore like the
+        features of a single entity.
+
+        Args:
+            data (_type_): data object containing purchases, products, categories, holidays_past_2021, and amazon_events
+            is_state (bool): whether the entities are the states or the categories
+
+        Returns:
+            _type_: tuple: DataFrame of the features indexed by entity and Order Date and its FeatureStore key
+        """
+        store = SalesStore()
+        feature_store = FeatureStore()
+        entity_column = "Shipping Address State" if is_state else "Category"
+        calendar = FeatureStore.frame_version(
+            data.holidays_past_2021, data.amazon_events, data.holidays
+        )
+        version = self.training_data_version(data, store)
+        key = FeatureStore.key(
+            kind="global",
+            data=version,
+            entity_column=entity_column,
+            calendar=calendar,
+            code=FeatureEngineering.code_version(),
+        )
+        df = feature_store.get(key) if version is not None else None
+        if df is None:
+            cutoff = TRAINING_CUTOFF
+            if store.exists():
+                cutoff = store.training_cutoff
+                sales = SalesCube.open(store).panel(is_state, cutoff=cutoff)
+            else:
+                sales = PreprocessedPurchases.cached(data).output()
+            df = PanelFeatureEngineering(
+                sales,
+                data.holidays_past_2021,
+                data.amazon_events,
+                holidays=data.holidays,
+                entity_column=entity_column,
+                cutoff=cutoff,
+            ).output()
+            df.index = df.index.set_levels(df.index.levels[0].astype(str), level=0)
+            if version is None:
+                key = FeatureStore.key(
+                    kind="global",
+                    data=self.training_data_version(data, store),
+                    entity_column=entity_column,
+                    calendar=calendar,
+                    code=FeatureEngineering.code_version(),
+                )
+            feature_store.put(key, df)
+            print("Panel data preprocessed and saved")
+        return df, key
+
+    def train_global(self, data, is_state, n_threads=None):
+        """train_global trains the global model of the states or of the categories, see GlobalSalesForecaster.
 
-        df = FeatureEngineering(
-            preprocessed_data,
+        Args:
+            data (_type_): data object containing purchases, products, categories, holidays_past_2021, and amazon_events
+            is_state (bool): whether the entities are the states or the categories
+            n_threads (int, optional): threads of each model, every core if None. Defaults to None.
+
+        Returns:
+            _type_: GlobalSalesForecaster: the trained forecaster
+        """
+        df, key = self.global_train_data(data, is_state)
+        model = GlobalSalesForecaster(is_state)
+        model.train(df, n_threads=n_threads)
+        FeatureStore().set_ref(f"global:{'state' if is_state else 'category'}", key)
+        return model
+
+    def forcast_global(self, start_date, end_date, data, entity_name, is_state):
+        """forcast_global forecasts the sales of a state or a category with the global model of the states
+        or of the categories, training it first if it is not trained.
+
+        Args:
+            start_date (_type_): start date for the forecast
+            end_date (_type_): end date for the forecast
+            data (_type_): datafrom DataLoader, a training loader is needed when the global model is not trained
+            entity_name (_type_): state or category
+            is_state (bool): whether the entity is a state or a category
+
+        Returns:
+            _type_: tuple: DataFrame with the predictions and actual sales, and the number of years of data
+        """
+        feature_store = FeatureStore()
+        ref = f"global:{'state' if is_state else 'category'}"
+        model = GlobalSalesForecaster.cached(is_state)
+        history = feature_store.get(feature_store.ref(ref))
+        if not model.is_trained() or history is None:
+            print("Global model not trained. Training now...")
+            model = self.train_global(data, is_state)
+            history = feature_store.get(feature_store.ref(ref))
+        if entity_name not in model.entities:
+            raise ValueError(f"{entity_name!r} is not in the global model")
+        if data is None:
+            data = DataLoader(is_training=False)
+        forcast_df = PanelFeatureEngineering(
+            history.loc[[entity_name]],
             data.holidays_past_2021,
             data.amazon_events,
-            holidays=data.holidays,
-            state_forcast=is_state,
+            start=start_date,
+            end=end_date,
+            is_train=False,
         ).output()
+        xgb_preds, cat_preds = model.predict(forcast_df)
+        return self.process_results(
+            pd.to_datetime(start_date).year,
+            pd.to_datetime(end_date).year,
+            forcast_df.xs(entity_name, level=0),
+            xgb_preds,
+            cat_preds,
+            history.xs(entity_name, level=0),
+        )
 
-        df.reset_index(inplace=True)
-        if entity_name == "":
-            df.to_csv(
-                os.path.join(processed_data_path, "overall_sales.csv"), index=False
-            )
-        else:
-            df.to_csv(
-                os.path.join(processed_data_path, f"{entity_name}_sales.csv"),
-                index=False,
+    def train_all(self, data, workers=None, entities=None):
+        """train_all trains the models of the overall sales, of every state and of every category ahead
+        of the first forecasts, in a pool of processes. The entities are submitted in order of frequency
+        and the cores are split across the workers, each XGBoost and CatBoost model using its share.
+        The shared datasets are prepared once before the workers start, and the FeatureStore
+        references and stale marks are updated here as the entities finish.
+
+        Args:
+            data (_type_): DataLoader of the raw datasets, the workers create their own with the same options
+            workers (int, optional): number of worker processes. Defaults to the number of cores.
+            entities (_type_, optional): (entity name, is_state) pairs to train, every entity if None. Defaults to None.
+
+        Returns:
+            _type_: DataFrame: entity, kind, seconds and error of every entity, the error is None on success
+        """
+        if entities is None:
+            states, categories = self.get_state_and_categories_by_frequency(data)
+            entities = (
+                [("", None)]
+                + [(state, True) for state in states]
+                + [(category, False) for category in categories]
             )
-        print("Data preprocessed and saved")
-        df.set_index("Order Date", inplace=True)
-        return df
+        store = SalesStore()
+        if not store.exists():
+            PreprocessedPurchases.cached(data)
+        cores = os.cpu_count() or 1
+        workers = min(workers or cores, len(entities)) or 1
+        n_threads = max(1, cores // workers)
+        print(f"Training {len(entities)} entities on {workers} workers, {n_threads} threads each")
+
+        feature_store = FeatureStore()
+        report = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_train_worker,
+            initargs=({"is_training": True, "compact": data.compact},),
+        ) as executor:
+            futures = {
+                executor.submit(train_entity, entity_name, is_state, n_threads): (
+                    entity_name,
+                    is_state,
+                )
+                for entity_name, is_state in entities
+            }
+            for future in as_completed(futures):
+                entity_name, is_state = futures[future]
+                kind = {None: "overall", True: "state", False: "category"}[is_state]
+                try:
+                    key, seconds = future.result()
+                    feature_store.set_ref(f"train:{entity_name}", key)
+                    store.clear_stale(entity_name)
+                    error = None
+                    print(f"Trained {kind} {entity_name!r} in {seconds:.1f} s")
+                except Exception as e:
+                    seconds, error = None, f"{type(e).__name__}: {e}"
+                    print(f"Training {kind} {entity_name!r} failed: {error}")
+                report.append(
+                    {"entity": entity_name, "kind": kind, "seconds": seconds, "error": error}
+                )
+        return pd.DataFrame(report, columns=["entity", "kind", "seconds", "error"])
 
     def process_results(
         self,
@@ -103,6 +409,8 @@ class PrimePredict:
 
     def get_state_and_categories_by_frequency(self, data):
         """get_state_and_categories_by_frequency gets the states and categories by frequency of purchases.
+        The rankings are computed when the purchases are preprocessed or ingested and stored with
+        their data version, see PreprocessedPurchases and SalesStore, so they are only read here.
 
         Args:
             data (_type_): data object containing purchases, products, categories
@@ -110,73 +418,85 @@ class PrimePredict:
         Returns:
             _type_: tuple: list of states and categories ordered by frequency
         """
-        preprocessed_data = DataPreprocessor(
-            data.purchases, data.products, data.categories
-        ).output()
-        states_frequencies = (
-            preprocessed_data.groupby(
-                [preprocessed_data.index, "Shipping Address State"]
-            )["total_sales"]
-            .sum()
-            .reset_index()["Shipping Address State"]
-            .value_counts()
-            .sort_values(ascending=False)
-            .index
-        )
-        category_frequencies = (
-            preprocessed_data.groupby([preprocessed_data.index, "Category"])[
-                "total_sales"
-            ]
-            .sum()
-            .reset_index()["Category"]
-            .value_counts()
-            .sort_values(ascending=False)
-            .index
-        )
+        store = SalesStore()
+        if store.exists():
+            ranking = store
+        else:
+            ranking = PreprocessedPurchases.cached(data)
+        states_frequencies = ranking.frequencies("Shipping Address State")
+        category_frequencies = ranking.frequencies("Category")
         return list(states_frequencies), list(category_frequencies)
 
-    def forcast(self, start_date, end_date, data, entity_name="", is_state=None):
+    def is_ready(self, entity_name=""):
+        """is_ready checks, without loading anything, whether forcast can forecast an entity right away:
+        its models are saved, they are not stale and its training features are in the FeatureStore.
+
+        Args:
+            entity_name (str, optional): state or category. Defaults to "".
+
+        Returns:
+            _type_: bool: whether the entity is ready to forecast
+        """
+        feature_store = FeatureStore()
+        history_key = feature_store.ref(f"train:{entity_name}")
+        return (
+            history_key is not None
+            and ModelRegistry.shared().is_trained(entity_name)
+            and not SalesStore().is_stale(entity_name)
+            and any(
+                os.path.exists(feature_store.file_path(key))
+                for key in (LagTable.key(history_key), history_key)
+            )
+        )
+
+    def forcast(
+        self, start_date, end_date, data, entity_name="", is_state=None, use_global=False
+    ):
         """forcast function to forecast sales for a given date range and entity (state or category).
 
         Args:
             start_date (_type_): start date for the forecast
             end_date (_type_): end date for the forecast
-            data (_type_): datafrom DataLoader
+            data (_type_): datafrom DataLoader, only the tables the forecast uses are loaded from it
             entity_name (str, optional): state or category Defaults to "".
             is_state (_type_, optional): whether the entity to forecast is a state or a category, Defaults to None.
+            use_global (bool, optional): forecast a state or a category with the global model of all the states
+            or all the categories instead of its own models, see forcast_global. Defaults to False.
 
         Returns:
             _type_: tuple: DataFrame with the predictions and actual sales, and the number of years of data
         """
 
+        if use_global and is_state is not None:
+            return self.forcast_global(start_date, end_date, data, entity_name, is_state)
+
         cross_validate = False
-        processed_data_path = os.path.join(os.getcwd(), "data", "processed_datasets")
-        if not "src" in processed_data_path:
-            processed_data_path = os.path.join(
-                os.getcwd(), "src", "data", "processed_datasets"
-            )
-        if SalesForecaster(entity_name).is_trained():
+        store = SalesStore()
+        feature_store = FeatureStore()
+        history_key = feature_store.ref(f"train:{entity_name}")
+        lag_table = self.lag_table(feature_store, history_key)
+        model = ModelRegistry.shared().get(entity_name)
+        if (
+            model is not None
+            and not store.is_stale(entity_name)
+            and lag_table is not None
+        ):
             print("Model already trained.")
-            data = DataLoader(is_training=False)
-            model = SalesForecaster(entity_name)
-            if entity_name == "":
-                overall_sales = DataPreprocessor(
-                    pd.read_csv(os.path.join(processed_data_path, "overall_sales.csv"))
-                ).output()
-            else:
-                overall_sales = DataPreprocessor(
-                    pd.read_csv(
-                        os.path.join(processed_data_path, f"{entity_name}_sales.csv")
-                    )
-                ).output()
-            forcast_df = FeatureEngineering(
-                overall_sales,
+            if data is None:
+                data = DataLoader(is_training=False)
+            overall_sales = lag_table.to_frame().dropna(subset=["total_sales"])
+            forcast_df, _ = FeatureEngineering.cached(
+                feature_store,
+                history_key,
+                entity_name,
+                lag_table,
                 data.holidays_past_2021,
                 data.amazon_events,
                 is_train=False,
                 start=start_date,
                 end=end_date,
-            ).output()
+                feature_columns=model.feature_names(),
+            )
             xgb_preds, cat_preds = model.predict(forcast_df)
             # ca_xgb_preds, ca_cat_preds = model.predict(ca_forcast_df, state_name="CA")
             # ga_xgb_preds, ga_cat_preds = model.predict(ga_forcast_df, state_name="GA")
@@ -195,7 +515,7 @@ class PrimePredict:
 
             if cross_validate:
                 forcast_df = FeatureEngineering(
-                    DataPreprocessor(pd.read_csv("overall_sales.csv")).output(),
+                    df,
                     data.holidays_past_2021,
                     data.amazon_events,
                     is_train=False,
@@ -204,7 +524,10 @@ class PrimePredict:
                 ).output()
                 SalesForecaster().cross_validate(df, forcast_df, forcast_df.columns)
 
-            SalesForecaster(entity_name).train(df, entity_name=entity_name)
+            SalesForecaster(entity_name).train(
+                df, entity_name=entity_name, incremental=True
+            )
+            store.clear_stale(entity_name)
             print("Model trained and saved to model.json")
             return None, None, None
 
@@ -0,0 +1,129 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data.salesstore import SalesStore
+from features.featurestore import FeatureStore
+from models.trainingqueue import TrainingJobQueue
+from primepredict import PrimePredict
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "app.py")
+
+
+class TestApp(unittest.TestCase):
+    """TestApp is a smoke test of the Streamlit app, training a model in the background and showing its forecast."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.release = threading.Event()
+        self.queue = TrainingJobQueue({})
+        # jobs run in threads of the test process, where the patches apply
+        self.queue.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.queue.executor.shutdown)
+        forecast = pd.DataFrame(
+            {
+                "dates": pd.date_range("2023-01-01", periods=3),
+                "Sales Prediction - xbg": [100.0, 200.0, 300.0],
+                "Sales Prediction - cat": [110.0, 210.0, 310.0],
+            }
+        )
+        patches = [
+            mock.patch("models.trainingqueue.train_entity", self.train_entity),
+            mock.patch(
+                "models.trainingqueue.FeatureStore",
+                lambda: FeatureStore(self.tmp_dir.name),
+            ),
+            mock.patch(
+                "models.trainingqueue.SalesStore",
+                lambda: SalesStore(self.tmp_dir.name),
+            ),
+            mock.patch.object(TrainingJobQueue, "shared", return_value=self.queue),
+            mock.patch.object(
+                PrimePredict,
+                "get_state_and_categories_by_frequency",
+                return_value=(["CA", "NY"], ["CAT_1"]),
+            ),
+            mock.patch.object(PrimePredict, "is_ready", self.is_ready),
+            mock.patch.object(
+                PrimePredict,
+                "forcast",
+                side_effect=lambda *args, **kwargs: (
+                    forecast.copy(),
+                    pd.Series([50.0, 70.0]),
+                    0,
+                ),
+            ),
+            # the en_US.UTF-8 locale of the app is not installed everywhere the tests run
+            mock.patch("locale.setlocale"),
+            mock.patch(
+                "locale.currency", side_effect=lambda value, grouping: f"${value:,}"
+            ),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def train_entity(self, entity_name, is_state, n_threads, incremental):
+        """train_entity stands in for the training of an entity, until the test releases it."""
+        self.release.wait(5)
+        if entity_name == "NY":
+            raise ValueError("no sales")
+        return f"key-{entity_name}", 0.5
+
+    def is_ready(self, entity_name=""):
+        """is_ready stands in for PrimePredict.is_ready, an entity is ready once its job has trained it."""
+        job = self.queue.job(entity_name)
+        return job is not None and job.status() == "done"
+
+    def wait(self, entity_name):
+        """wait waits for the job of an entity to finish."""
+        while not self.queue.job(entity_name).done():
+            time.sleep(0.01)
+
+    def test_train_then_forecast(self):
+        """Test that the forecast of an untrained entity shows the training progress, then the forecast"""
+        at = AppTest.from_file(APP_PATH, default_timeout=30).run()
+        self.assertFalse(at.exception)
+        at.button[0].click().run()
+        self.assertFalse(at.exception)
+        progress = at.get("progress")
+        self.assertEqual(len(progress), 1)
+        self.assertIn("Training the model of overall sales", progress[0].proto.text)
+        self.assertEqual(len(at.subheader), 0)
+
+        self.release.set()
+        self.wait("")
+        at.run()
+        self.assertFalse(at.exception)
+        self.assertEqual(len(at.get("progress")), 0)
+        self.assertEqual([subheader.value for subheader in at.subheader], ["$600", "$120"])
+
+    def test_failed_training(self):
+        """Test that a failed training shows its error and a retry button"""
+        self.release.set()
+        at = AppTest.from_file(APP_PATH, default_timeout=30).run()
+        at.selectbox[0].select("NY").run()
+        at.button[1].click().run()
+        self.wait("NY")
+        at.run()
+        self.assertFalse(at.exception)
+        self.assertIn("ValueError: no sales", at.error[0].value)
+        failed = self.queue.job("NY")
+        at.button(key="retry:NY").click().run()
+        self.assertFalse(at.exception)
+        self.assertIsNot(self.queue.job("NY"), failed)
+
+
+if __name__ == "__main__":
+    unittest.main()
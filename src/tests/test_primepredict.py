@@ -0,0 +1,301 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from data.dataloader import DataLoader
+from data.salesstore import SalesStore
+from features.featurestore import FeatureStore
+from models.forecast import SalesForecaster
+from models.registry import ModelRegistry
+from primepredict import PrimePredict
+
+import numpy as np
+import pandas as pd
+
+
+def work_in_tmp_dir(test_case):
+    """work_in_tmp_dir runs a test case in a temporary working directory with the layout of src, as the
+    stores and the models are resolved from the working directory, see resolve_path.
+
+    Returns:
+        _type_: str: path of the temporary directory
+    """
+    tmp_dir = tempfile.TemporaryDirectory()
+    test_case.addCleanup(tmp_dir.cleanup)
+    cwd = os.getcwd()
+    os.chdir(tmp_dir.name)
+    test_case.addCleanup(os.chdir, cwd)
+    for parts in [("data", "processed_datasets"), ("models", "saves")]:
+        os.makedirs(os.path.join(tmp_dir.name, "src", *parts))
+    return tmp_dir.name
+
+
+def write_purchases(tmp_dir, rows):
+    """write_purchases writes purchases of the given date, state, category and price to a csv file
+    in the layout of amazon_purchases.csv, and returns its path."""
+    path = os.path.join(tmp_dir, f"delta_{len(rows)}.csv")
+    pd.DataFrame(
+        rows,
+        columns=[
+            "Order Date",
+            "Shipping Address State",
+            "Category",
+            "Purchase Price Per Unit",
+        ],
+    ).assign(
+        **{
+            "Quantity": 1.0,
+            "Title": "x",
+            "ASIN/ISBN (Product Code)": "P1",
+            "Survey ResponseID": "r",
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+def write_sales_history(states, categories, seed=22):
+    """write_sales_history writes daily sales of every state and category from 2019 to 2022 to the
+    SalesStore of the working directory, and returns the store."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2019-01-01", "2022-12-31", name="Order Date")
+    sales = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "Shipping Address State": state,
+                    "Category": category,
+                    "total_sales": 10 + 5 * dates.dayofweek + rng.random(len(dates)),
+                },
+                index=dates,
+            )
+            for state in states
+            for category in categories
+        ]
+    )
+    store = SalesStore()
+    store.write_sales(sales, dates[-1])
+    return store
+
+
+def thread_pool(max_workers, mp_context, initializer, initargs):
+    """thread_pool stands in for the process pool of train_all, running its workers as threads of the test."""
+    return ThreadPoolExecutor(
+        max_workers=max_workers, initializer=initializer, initargs=initargs
+    )
+
+
+class TestTrainAll(unittest.TestCase):
+    """TestTrainAll is a test case for PrimePredict.train_all on a small daily sales store."""
+
+    def setUp(self):
+        self.tmp_dir = work_in_tmp_dir(self)
+
+        store = write_sales_history(["CA", "NY", "TX", "WA"], ["A", "B", "C", "D"])
+        store.mark_stale(["CA"], ["A"])
+
+    def test_train_all(self):
+        """Test that every entity is trained with its share of the cores and that failures are reported"""
+        entities = [("", None), ("CA", True), ("A", False), ("ZZ", True)]
+        # the workers are threads, so the calls are recorded under a lock and not by a mock
+        calls, lock = [], threading.Lock()
+        train = SalesForecaster.train
+
+        def record_train(model, *args, **kwargs):
+            with lock:
+                calls.append(kwargs)
+            return train(model, *args, **kwargs)
+
+        with mock.patch("primepredict.ProcessPoolExecutor", thread_pool), mock.patch(
+            "primepredict.os.cpu_count", return_value=4
+        ), mock.patch.object(SalesForecaster, "train", record_train):
+            report = PrimePredict().train_all(
+                DataLoader(is_training=True), workers=2, entities=entities
+            )
+
+        self.assertEqual(
+            sorted(report["entity"]), sorted(entity for entity, _ in entities)
+        )
+        report = report.set_index("entity")
+        # 4 cores on 2 workers, 2 threads for each model
+        self.assertEqual({call["n_threads"] for call in calls}, {2})
+        self.assertEqual(len(calls), 3)
+
+        failed = report.loc["ZZ"]
+        self.assertEqual(failed["kind"], "state")
+        self.assertTrue(failed["error"].startswith("KeyError"))
+        self.assertTrue(pd.isnull(failed["seconds"]))
+
+        store = SalesStore()
+        feature_store = FeatureStore()
+        for entity_name in ["", "CA", "A"]:
+            self.assertIsNone(report.loc[entity_name, "error"])
+            self.assertGreater(report.loc[entity_name, "seconds"], 0)
+            self.assertFalse(store.is_stale(entity_name))
+            self.assertIsNotNone(feature_store.ref(f"train:{entity_name}"))
+            self.assertTrue(PrimePredict().is_ready(entity_name))
+        self.assertIsNone(feature_store.ref("train:ZZ"))
+
+
+class TestIngestDelta(unittest.TestCase):
+    """TestIngestDelta is a test case for PrimePredict.ingest_delta on a small daily sales store."""
+
+    def setUp(self):
+        self.tmp_dir = work_in_tmp_dir(self)
+        self.data = SimpleNamespace(
+            products=pd.DataFrame(
+                {"asin": ["P1"], "title": ["x"], "category_id": [1]}
+            ),
+            categories=pd.DataFrame({"id": [1], "category_name": ["A"]}),
+        )
+        sales = pd.DataFrame(
+            {
+                "Shipping Address State": ["CA", "NY"],
+                "Category": ["A", "B"],
+                "total_sales": [10.0, 20.0],
+            },
+            index=pd.DatetimeIndex(["2023-03-30", "2023-03-31"], name="Order Date"),
+        )
+        store = SalesStore()
+        store.write_sales(sales, sales.index.max())
+        store.clear_stale("")
+
+    def test_late_purchases_of_the_watermark_day(self):
+        """Test that a delta re-issuing the watermark day with a late purchase replaces the day"""
+        delta_path = write_purchases(
+            self.tmp_dir,
+            [
+                ("2023-03-30", "CA", "A", 99.0),
+                ("2023-03-31", "NY", "B", 20.0),
+                ("2023-03-31", "TX", "A", 5.0),
+                ("2023-04-01", "CA", "A", 7.0),
+            ]
+        )
+        ingested = PrimePredict().ingest_delta(delta_path, self.data)
+
+        self.assertEqual(ingested["rows"], 3)
+        self.assertEqual(ingested["watermark"], pd.Timestamp("2023-04-01"))
+        self.assertEqual(ingested["states"], ["CA", "NY", "TX"])
+        store = SalesStore()
+        self.assertTrue(store.is_stale("TX"))
+        # the purchase before the watermark day is skipped
+        self.assertEqual(
+            list(store.read_sales("CA", True, cutoff=None)["total_sales"]),
+            [10.0, 7.0],
+        )
+        self.assertEqual(
+            list(store.read_sales("NY", True, cutoff=None)["total_sales"]), [20.0]
+        )
+        self.assertEqual(
+            list(store.read_sales("TX", True, cutoff=None)["total_sales"]), [5.0]
+        )
+
+        version = store.version
+        store.clear_stale("TX")
+        ingested = PrimePredict().ingest_delta(delta_path, self.data)
+        self.assertEqual(ingested["rows"], 0)
+        self.assertEqual(SalesStore().version, version)
+        self.assertFalse(SalesStore().is_stale("TX"))
+
+
+class TestRefreshStale(unittest.TestCase):
+    """TestRefreshStale is a test case for PrimePredict.refresh_stale."""
+
+    def setUp(self):
+        self.tmp_dir = work_in_tmp_dir(self)
+        store = SalesStore()
+        store.mark_stale(["CA", "NY"], overall=False)
+
+    def test_up_to_date_models_stay_stale(self):
+        """Test that only the models that were trained are reported and cleared"""
+        with mock.patch.object(
+            ModelRegistry, "is_trained", return_value=True
+        ), mock.patch.object(
+            PrimePredict, "prepare_train_data", return_value=pd.DataFrame()
+        ), mock.patch.object(
+            SalesForecaster,
+            "train",
+            autospec=True,
+            side_effect=lambda model, df, entity_name="", **kwargs: entity_name == "CA",
+        ):
+            retrained = PrimePredict().refresh_stale(None)
+
+        self.assertEqual(retrained, ["CA"])
+        store = SalesStore()
+        self.assertFalse(store.is_stale("CA"))
+        self.assertTrue(store.is_stale("NY"))
+
+
+class TestTrainFeatures(unittest.TestCase):
+    """TestTrainFeatures is a test case for the FeatureStore keys of the training features."""
+
+    def setUp(self):
+        self.tmp_dir = work_in_tmp_dir(self)
+        write_sales_history(["CA", "NY", "TX"], ["A", "B", "C"])
+
+    def test_second_call_hits_the_store(self):
+        """Test that the training features of the same inputs are built once in a process"""
+        data = DataLoader(is_training=True)
+        holidays = data.holidays.copy()
+        _, key = PrimePredict().train_features(data, "CA", True)
+        pd.testing.assert_frame_equal(data.holidays, holidays)
+        with mock.patch(
+            "models.training.SalesCube.open",
+            side_effect=AssertionError("the features are built again"),
+        ):
+            df, second_key = PrimePredict().train_features(data, "CA", True)
+        self.assertEqual(second_key, key)
+        pd.testing.assert_frame_equal(df, FeatureStore().get(key))
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+    """TestIncrementalRefresh checks that ingested days reach the models through refresh_stale."""
+
+    def setUp(self):
+        self.tmp_dir = work_in_tmp_dir(self)
+        write_sales_history(["CA", "NY", "TX"], ["A", "B", "C"])
+        loader = DataLoader(is_training=True)
+        self.data = SimpleNamespace(
+            products=pd.DataFrame(
+                {"asin": ["P1"], "title": ["x"], "category_id": [1]}
+            ),
+            categories=pd.DataFrame({"id": [1], "category_name": ["A"]}),
+            holidays=loader.holidays,
+            holidays_past_2021=loader.holidays_past_2021,
+            amazon_events=loader.amazon_events,
+        )
+
+    def test_ingest_then_refresh(self):
+        """Test that refresh_stale warm starts a model on the days of a delta"""
+        df = PrimePredict().prepare_train_data(self.data, "CA", True)
+        self.assertEqual(df.index.max(), pd.Timestamp("2022-12-31"))
+        SalesForecaster("CA").train(df, entity_name="CA", n_threads=1)
+        self.assertEqual(SalesForecaster.load_meta("CA")["increments"], 0)
+
+        days = pd.date_range("2023-01-01", "2023-01-20")
+        delta_path = write_purchases(
+            self.tmp_dir,
+            [(str(day.date()), "CA", "A", 10 + 5 * day.dayofweek) for day in days],
+        )
+        PrimePredict().ingest_delta(delta_path, self.data)
+        self.assertTrue(SalesStore().is_stale("CA"))
+        retrained = PrimePredict().refresh_stale(self.data)
+
+        self.assertIn("CA", retrained)
+        self.assertFalse(SalesStore().is_stale("CA"))
+        meta = SalesForecaster.load_meta("CA")
+        self.assertEqual(meta["increments"], 1)
+        self.assertEqual(meta["refit_rows"], len(df))
+        self.assertEqual(meta["rows"], len(df) + len(days))
+        self.assertEqual(pd.Timestamp(meta["trained_until"]), days[-1])
+        self.assertTrue(PrimePredict().is_ready("CA"))
+
+
+if __name__ == "__main__":
+    unittest.main()
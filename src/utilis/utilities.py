@@ -0,0 +1,68 @@
+import os
+import pandas as pd
+
+# first day left out of the training data, sales from it on are held out for the forecasts. The daily
+# sales store moves it past the days it ingests, see SalesStore.training_cutoff
+TRAINING_CUTOFF = "2023-01-01"
+
+
+def compact_frame(df, categorical_columns=()):
+    """compact_frame stores the given text columns as pandas categoricals and downcasts integral
+    columns to the smallest integer dtype that holds their values. Float columns holding only whole
+    numbers become integers, other float columns, e.g. prices, are kept in float64 so no value changes.
+
+    Args:
+        df (_type_): dataframe to compact
+        categorical_columns (tuple, optional): columns to store as categoricals, missing ones are skipped. Defaults to ().
+
+    Returns:
+        _type_: tuple: compacted dataframe and its per column memory footprint in bytes before and after
+    """
+    before = df.memory_usage(deep=True)
+    df = df.copy(deep=False)
+    for column in categorical_columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+    for column in df.select_dtypes("number").columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values) and values.notnull().all() and (
+            values % 1 == 0
+        ).all():
+            df[column] = pd.to_numeric(values, downcast="integer")
+        elif not pd.api.types.is_float_dtype(values):
+            df[column] = pd.to_numeric(values, downcast="integer")
+    report = pd.DataFrame({"before": before, "after": df.memory_usage(deep=True)})
+    report.loc["total"] = report.sum()
+    return df, report
+
+
+def resolve_path(*parts):
+    """resolve_path returns the absolute path of a file or directory inside src, whether
+    the app runs from the project root or from src.
+
+    Returns:
+        _type_: str: absolute path
+    """
+    path = os.path.join(os.getcwd(), *parts)
+    if not "src" in path:
+        path = os.path.join(os.getcwd(), "src", *parts)
+    return path
+
+
+def frequency_ranking(dates, values, cutoff_year=2023):
+    """frequency_ranking orders states or categories by the number of days they have purchases on.
+
+    Args:
+        dates (_type_): order date of every purchase or daily sale
+        values (_type_): state or category of every purchase or daily sale
+        cutoff_year (int, optional): days from this year on are left out, None keeps them all. Defaults to 2023.
+
+    Returns:
+        _type_: list: names ordered by frequency, descending
+    """
+    days = pd.DataFrame(
+        {"day": pd.DatetimeIndex(dates), "name": pd.Series(values).astype(str).to_numpy()}
+    )
+    if cutoff_year is not None:
+        days = days[days["day"].dt.year < cutoff_year]
+    return days.drop_duplicates()["name"].value_counts().index.tolist()